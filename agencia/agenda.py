@@ -0,0 +1,228 @@
+import math
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from agencia.models import Reservacion, ServicioReservado, ServicioTaller
+from users.models import Usuario
+
+
+# Horario y capacidad del taller (sobrescribibles en settings)
+BAHIAS = getattr(settings, 'TALLER_BAHIAS', 6)
+APERTURA = getattr(settings, 'TALLER_APERTURA', time(8, 0))
+CIERRE = getattr(settings, 'TALLER_CIERRE', time(18, 0))
+DIAS_HABILES = getattr(settings, 'TALLER_DIAS_HABILES', (0, 1, 2, 3, 4, 5))  # lunes a sábado
+PASO_MINUTOS = getattr(settings, 'AGENDA_PASO_MINUTOS', 30)
+DURACION_DEFAULT = getattr(settings, 'AGENDA_DURACION_DEFAULT', 60)  # minutos
+VENTANA_DIAS = getattr(settings, 'AGENDA_VENTANA_DIAS', 14)
+
+
+class AgendaTaller:
+    """
+    Calendario de capacidad del taller en memoria para una ventana de fechas.
+
+    Las jornadas hábiles se dividen en franjas de PASO_MINUTOS. Por franja se
+    guarda un entero con un bit por técnico ocupado (índice de intervalos
+    discretizado) y cuántas reservaciones la ocupan (bahías). Buscar horarios
+    es recorrer franjas haciendo OR de unos cuantos enteros, sin tocar la
+    base de datos; marcar un intervalo conservadoramente ocupa toda franja
+    con la que se traslapa.
+    """
+
+    def __init__(self, desde, hasta, tecnicos, ocupaciones=(), reservaciones=(),
+                 bahias=BAHIAS, paso_minutos=PASO_MINUTOS):
+        """
+        tecnicos: ids de los técnicos que pueden recibir trabajo.
+        ocupaciones: (tecnico_id, inicio, fin) con datetimes aware.
+        reservaciones: (inicio, fin) de cada reservación; cuentan contra las bahías.
+        """
+        self.desde = desde
+        self.hasta = hasta
+        self.bahias = bahias
+        self.paso = paso_minutos * 60
+
+        self.tecnicos = list(tecnicos)
+        self._bit = {tecnico: 1 << i for i, tecnico in enumerate(self.tecnicos)}
+        self._todos = (1 << len(self.tecnicos)) - 1
+
+        # Franjas de todas las jornadas hábiles, en orden
+        self._aperturas, self._cierres = [], []
+        self._franjas, self._fin_jornada = [], []
+        dia, ultimo = timezone.localdate(desde), timezone.localdate(hasta)
+        while dia <= ultimo:
+            if dia.weekday() in DIAS_HABILES:
+                apertura, cierre = self._instante(dia, APERTURA), self._instante(dia, CIERRE)
+                self._aperturas.append(apertura)
+                self._cierres.append(cierre)
+                inicios = range(int(apertura), int(cierre) - self.paso + 1, self.paso)
+                self._franjas.extend(inicios)
+                self._fin_jornada.extend([len(self._franjas)] * len(inicios))
+            dia += timedelta(days=1)
+
+        self._ocupados = [0] * len(self._franjas)
+        self._reservas = [0] * len(self._franjas)
+        for tecnico, inicio, fin in ocupaciones:
+            bit = self._bit.get(tecnico)
+            if bit is not None:
+                for franja in self._franjas_entre(inicio.timestamp(), fin.timestamp()):
+                    self._ocupados[franja] |= bit
+        for inicio, fin in reservaciones:
+            for franja in self._franjas_entre(inicio.timestamp(), fin.timestamp()):
+                self._reservas[franja] += 1
+
+    @staticmethod
+    def _instante(dia, hora):
+        return timezone.make_aware(datetime.combine(dia, hora)).timestamp()
+
+    def _franjas_entre(self, inicio, fin):
+        """Índices de las franjas que se traslapan con [inicio, fin)"""
+        primera = bisect_right(self._franjas, inicio) - 1
+        if primera < 0 or self._franjas[primera] + self.paso <= inicio:
+            primera += 1
+        return range(primera, bisect_left(self._franjas, fin))
+
+    # ==========================================
+    # CARGA DESDE LA BASE DE DATOS
+    # ==========================================
+
+    @classmethod
+    def cargar(cls, desde, hasta=None):
+        """Construye la agenda de [desde, hasta) con tres consultas"""
+        hasta = hasta or desde + timedelta(days=VENTANA_DIAS)
+        # Margen hacia atrás para trabajos que empezaron antes y siguen abiertos
+        margen = desde - timedelta(days=1)
+        vigentes = Reservacion.objects.exclude(estado_global='cancelada').filter(
+            Q(fecha_inicio__gte=margen, fecha_inicio__lt=hasta)
+            | Q(fecha_inicio__isnull=True, fecha__gte=margen, fecha__lt=hasta)
+        )
+
+        tecnicos = list(
+            Usuario.objects.filter(id_tipo__cve='TALLER', is_active=True)
+            .values_list('pk', flat=True)
+        )
+        inicios, fines = {}, {}
+        for r in vigentes.values('pk', 'fecha', 'hora', 'fecha_inicio', 'fecha_fin'):
+            inicio = inicio_reservacion(r)
+            if inicio is not None:
+                inicios[r['pk']] = inicio
+                fines[r['pk']] = r['fecha_fin'] or inicio + timedelta(minutes=DURACION_DEFAULT)
+
+        # Los servicios de una reservación con el mismo técnico van uno tras otro
+        ocupaciones, cursores = [], {}
+        servicios = ServicioReservado.objects.filter(
+            id_reservacion__in=vigentes, id_usuario_taller__isnull=False
+        ).exclude(estado='completado').order_by('id_reservacion', 'pk').values_list(
+            'id_reservacion', 'id_usuario_taller', 'fecha_inicio', 'fecha_fin',
+            'id_servicio__duracion_estimada',
+        )
+        for reservacion, tecnico, inicio, fin, duracion in servicios:
+            if reservacion not in inicios:
+                continue
+            inicio = inicio or cursores.get((reservacion, tecnico), inicios[reservacion])
+            fin = fin or inicio + timedelta(minutes=duracion or DURACION_DEFAULT)
+            cursores[(reservacion, tecnico)] = fin
+            fines[reservacion] = max(fines[reservacion], fin)
+            ocupaciones.append((tecnico, inicio, fin))
+
+        reservaciones = [(inicio, fines[pk]) for pk, inicio in inicios.items()]
+        return cls(desde, hasta, tecnicos, ocupaciones, reservaciones)
+
+    # ==========================================
+    # CONSULTAS
+    # ==========================================
+
+    def huecos_libres(self, duracion_minutos, n=5, desde=None, tecnicos=None):
+        """
+        Los siguientes `n` horarios de inicio con al menos un técnico libre
+        durante `duracion_minutos`, bahía disponible y dentro de una sola
+        jornada. Cada hueco lista todos los técnicos libres en ese horario.
+        """
+        largo = max(1, math.ceil(duracion_minutos * 60 / self.paso))
+        candidatos = self._todos if tecnicos is None else self._mascara(tecnicos)
+        zona = timezone.get_current_timezone()
+
+        huecos = []
+        franja = bisect_left(self._franjas, max(desde or self.desde, self.desde).timestamp())
+        while franja < len(self._franjas) and len(huecos) < n:
+            ultima = franja + largo
+            if ultima > self._fin_jornada[franja]:
+                franja = self._fin_jornada[franja]
+                continue
+            llena = self._bahia_llena(franja, ultima)
+            if llena is not None:
+                franja = llena + 1
+                continue
+            ocupados = 0
+            for i in range(franja, ultima):
+                ocupados |= self._ocupados[i]
+            libres = candidatos & ~ocupados
+            if libres:
+                inicio = self._franjas[franja]
+                huecos.append({
+                    'inicio': datetime.fromtimestamp(inicio, tz=zona),
+                    'fin': datetime.fromtimestamp(inicio + duracion_minutos * 60, tz=zona),
+                    'tecnicos': self._tecnicos_en(libres),
+                })
+            franja += 1
+        return huecos
+
+    def hay_capacidad(self, inicio, duracion_minutos):
+        """El taller abre y tiene una bahía libre durante todo el intervalo"""
+        t, fin = inicio.timestamp(), inicio.timestamp() + duracion_minutos * 60
+        j = bisect_right(self._aperturas, t) - 1
+        if j < 0 or fin > self._cierres[j]:
+            return False
+        franjas = self._franjas_entre(t, fin)
+        return self._bahia_llena(franjas.start, franjas.stop) is None
+
+    def tecnicos_libres(self, inicio, duracion_minutos):
+        """Técnicos sin trabajo comprometido en [inicio, inicio + duración)"""
+        ocupados = 0
+        for franja in self._franjas_entre(inicio.timestamp(), inicio.timestamp() + duracion_minutos * 60):
+            ocupados |= self._ocupados[franja]
+        return self._tecnicos_en(self._todos & ~ocupados)
+
+    def _bahia_llena(self, primera, ultima):
+        """Última franja de [primera, ultima) sin bahías libres, o None"""
+        for franja in range(ultima - 1, primera - 1, -1):
+            if self._reservas[franja] >= self.bahias:
+                return franja
+        return None
+
+    def _mascara(self, tecnicos):
+        mascara = 0
+        for tecnico in tecnicos:
+            mascara |= self._bit.get(tecnico, 0)
+        return mascara
+
+    def _tecnicos_en(self, mascara):
+        tecnicos = []
+        while mascara:
+            bit = mascara & -mascara
+            tecnicos.append(self.tecnicos[bit.bit_length() - 1])
+            mascara ^= bit
+        return tecnicos
+
+
+def inicio_reservacion(datos):
+    """
+    Inicio efectivo de una reservación a partir de sus campos (dict):
+    fecha_inicio, o fecha con la hora si se capturó por separado.
+    """
+    if datos.get('fecha_inicio'):
+        return datos['fecha_inicio']
+    fecha = datos.get('fecha')
+    if fecha and datos.get('hora'):
+        return timezone.make_aware(datetime.combine(timezone.localdate(fecha), datos['hora']))
+    return fecha
+
+
+def duracion_servicios(ids_servicio):
+    """Minutos que suman los servicios del taller indicados (una consulta)"""
+    duraciones = ServicioTaller.objects.filter(pk__in=ids_servicio).values_list(
+        'pk', 'duracion_estimada'
+    )
+    return sum(duracion or DURACION_DEFAULT for _, duracion in duraciones)
@@ -0,0 +1,110 @@
+import re
+
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from agencia.models import ConflictoVersion
+
+
+ETAG_VERSION = re.compile(r'^"(\d+)"$')
+
+
+class PrecondicionFallida(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'El recurso fue modificado por otra petición; vuelve a consultarlo'
+    default_code = 'precondition_failed'
+
+
+class AvanceRetrocedido(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'El avance no puede ser menor que el ya registrado'
+    default_code = 'avance_retrocede'
+
+
+class TransicionNoPermitida(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Transición de estado no permitida'
+    default_code = 'transicion_no_permitida'
+
+
+def etag_version(version):
+    return f'"{version}"'
+
+
+def version_esperada(request, instancia):
+    """
+    Versión que exige el If-Match de la petición, comprobada contra la
+    instancia ya leída. None si no hay If-Match (o es '*').
+    """
+    etags = parse_etags(request.META.get('HTTP_IF_MATCH', ''))
+    if not etags or etags == ['*']:
+        return None
+    versiones = {
+        int(coincide.group(1))
+        for coincide in map(ETAG_VERSION.match, etags) if coincide
+    }
+    if instancia.version not in versiones:
+        raise PrecondicionFallida()
+    return instancia.version
+
+
+def guardar_condicional(request, instancia, **kwargs):
+    """
+    save() que respeta If-Match: el UPDATE lleva la versión en el WHERE,
+    así que un cambio concurrente se detecta sin volver a leer la fila.
+    """
+    instancia.version_esperada = version_esperada(request, instancia)
+    try:
+        instancia.save(**kwargs)
+    except ConflictoVersion:
+        raise PrecondicionFallida()
+
+
+class VersionETagMixin:
+    """
+    Detalle con ETag tomado de la versión de la fila.
+
+    GET con If-None-Match consulta solo la versión y responde 304 si no
+    cambió. PUT/PATCH con If-Match actualizan únicamente si la fila sigue
+    en esa versión; si no, 412.
+    """
+
+    def version_actual(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        version = self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list('version', flat=True).first()
+        if version is None:
+            raise Http404
+        return version
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            etag = etag_version(self.version_actual())
+            no_modificado = get_conditional_response(request, etag=etag)
+            if no_modificado is not None:
+                no_modificado['ETag'] = etag
+                return no_modificado
+
+        instancia = self.get_object()
+        response = Response(self.get_serializer(instancia).data)
+        response['ETag'] = etag_version(instancia.version)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = etag_version(self._instancia_actualizada.version)
+        return response
+
+    def perform_update(self, serializer):
+        instancia = serializer.instance
+        instancia.version_esperada = version_esperada(self.request, instancia)
+        try:
+            serializer.save()
+        except ConflictoVersion:
+            raise PrecondicionFallida()
+        self._instancia_actualizada = serializer.instance
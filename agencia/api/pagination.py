@@ -0,0 +1,113 @@
+import base64
+import json
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre (campo_fecha, id), del más reciente al más
+    antiguo. Cada página es un WHERE sobre la llave + LIMIT, sin COUNT ni
+    OFFSET, así que cuesta lo mismo en la página 1 que en la 500.
+
+    Con ?page=N se usa PageNumberPagination (formato anterior con count),
+    el único modo que respeta ?ordering=. El cursor depende del orden fijo,
+    así que ?ordering= sin ?page=N responde 400 en vez de ignorarse.
+    """
+    campo_fecha = None
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    ordering_query_param = api_settings.ORDERING_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self._paginas = None
+
+        if self.page_query_param in request.query_params:
+            self._paginas = PageNumberPagination()
+            return self._paginas.paginate_queryset(queryset, request, view)
+
+        if self.ordering_query_param in request.query_params:
+            raise ValidationError({
+                self.ordering_query_param: 'El cursor sigue el orden por fecha; usa ?page=N para ordenar'
+            })
+
+        campo = self.campo_fecha
+        admite_nulos = queryset.model._meta.get_field(campo).null
+        orden = F(campo).desc(nulls_last=True) if admite_nulos else f'-{campo}'
+        queryset = queryset.order_by(orden, '-pk')
+
+        cursor = self.decodificar_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.condicion_cursor(*cursor, admite_nulos))
+
+        filas = list(queryset[:self.page_size + 1])
+        self.siguiente = None
+        if len(filas) > self.page_size:
+            filas = filas[:self.page_size]
+            ultima = filas[-1]
+            self.siguiente = (getattr(ultima, campo), ultima.pk)
+        return filas
+
+    def condicion_cursor(self, fecha, pk, admite_nulos):
+        """Filas estrictamente después de (fecha, pk) en orden descendente"""
+        campo = self.campo_fecha
+        if fecha is None:
+            return Q(**{f'{campo}__isnull': True, 'pk__lt': pk})
+        condicion = Q(**{f'{campo}__lt': fecha}) | Q(**{campo: fecha, 'pk__lt': pk})
+        if admite_nulos:
+            condicion |= Q(**{f'{campo}__isnull': True})
+        return condicion
+
+    def decodificar_cursor(self, request):
+        valor = request.query_params.get(self.cursor_query_param)
+        if not valor:
+            return None
+        try:
+            fecha, pk = json.loads(base64.urlsafe_b64decode(valor.encode('ascii')))
+            if fecha is not None:
+                fecha = parse_datetime(fecha)
+                if fecha is None:
+                    raise ValueError
+            return fecha, int(pk)
+        except (TypeError, ValueError, UnicodeEncodeError):
+            raise NotFound('Cursor inválido')
+
+    def codificar_cursor(self, fecha, pk):
+        datos = json.dumps([fecha.isoformat() if fecha else None, pk])
+        return base64.urlsafe_b64encode(datos.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.codificar_cursor(*self.siguiente)
+        )
+
+    def get_paginated_response(self, data):
+        if self._paginas is not None:
+            return self._paginas.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class SolicitudKeysetPagination(KeysetPagination):
+    campo_fecha = 'fecha_creacion'
+
+
+class ReservacionKeysetPagination(KeysetPagination):
+    campo_fecha = 'fecha'
+
+
+class ServicioReservadoKeysetPagination(KeysetPagination):
+    campo_fecha = 'creado_at'
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from users.api.tokens import rol_del_request
 
 
 class IsCliente(permissions.BasePermission):
@@ -9,7 +10,7 @@ class IsCliente(permissions.BasePermission):
         return (
             request.user and 
             request.user.is_authenticated and 
-            request.user.id_tipo.cve == 'CLIENTE'
+            rol_del_request(request) == 'CLIENTE'
         )
 
 
@@ -21,7 +22,7 @@ class IsAsistente(permissions.BasePermission):
         return (
             request.user and 
             request.user.is_authenticated and 
-            request.user.id_tipo.cve == 'ASISTENTE'
+            rol_del_request(request) == 'ASISTENTE'
         )
 
 
@@ -33,7 +34,7 @@ class IsTaller(permissions.BasePermission):
         return (
             request.user and 
             request.user.is_authenticated and 
-            request.user.id_tipo.cve == 'TALLER'
+            rol_del_request(request) == 'TALLER'
         )
 
 
@@ -45,7 +46,7 @@ class IsClienteOrAsistente(permissions.BasePermission):
         return (
             request.user and 
             request.user.is_authenticated and 
-            request.user.id_tipo.cve in ['CLIENTE', 'ASISTENTE']
+            rol_del_request(request) in ['CLIENTE', 'ASISTENTE']
         )
 
 
@@ -57,5 +58,5 @@ class IsAsistenteOrTaller(permissions.BasePermission):
         return (
             request.user and 
             request.user.is_authenticated and 
-            request.user.id_tipo.cve in ['ASISTENTE', 'TALLER']
+            rol_del_request(request) in ['ASISTENTE', 'TALLER']
         )
\ No newline at end of file
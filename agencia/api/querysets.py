@@ -0,0 +1,126 @@
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from agencia.estados import TRANSICIONES_RESERVACION
+from agencia.models import Vehiculo, Solicitud, Reservacion, ServicioReservado
+
+
+# ==========================================
+# VEHÍCULOS
+# ==========================================
+
+def prefijo_placa(prefijo):
+    """
+    Placas normalizadas que empiezan con `prefijo` (ya normalizado) como
+    rango [prefijo, siguiente): el índice único lo recorre en orden, cosa
+    que no hace con el LIKE ... ESCAPE de __startswith en SQLite.
+    """
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return Q(placa_normalizada__gte=prefijo, placa_normalizada__lt=siguiente)
+
+
+def vehiculos_con_solicitud_abierta(queryset=None):
+    """
+    Vehículos con propietario, modelo y marca por join y la solicitud
+    abierta más reciente (sin reservación terminada o cancelada) anotada
+    con subconsultas correlacionadas: todo en una consulta.
+    """
+    if queryset is None:
+        queryset = Vehiculo.objects.all()
+    cerrados = [estado for estado, siguientes in TRANSICIONES_RESERVACION.items() if not siguientes]
+    # -pk en lugar de la fecha: el índice de la FK ya viene en ese orden
+    abiertas = Solicitud.objects.filter(id_vehiculo=OuterRef('pk')).exclude(
+        reservaciones__estado_global__in=cerrados
+    ).order_by('-pk')
+    return queryset.select_related(
+        'id_modelo',
+        'id_modelo__id_marca',
+        'id_usuario_propietario',
+    ).annotate(**{
+        f'solicitud_abierta_{campo}': Subquery(abiertas.values(campo)[:1])
+        for campo in ('id', 'fecha_creacion', 'descripcion')
+    })
+
+
+# ==========================================
+# SOLICITUDES
+# ==========================================
+
+# Atributo donde se deja la lista de reservaciones ya ordenadas.
+# SolicitudSerializer lo lee en lugar de consultar la relación.
+RESERVACIONES_ATTR = 'reservaciones_ordenadas'
+
+
+def solicitudes_detalladas(queryset=None):
+    """
+    Solicitudes con todo lo que necesita SolicitudSerializer
+    resuelto en un número constante de consultas.
+    """
+    if queryset is None:
+        queryset = Solicitud.objects.all()
+    return queryset.select_related(
+        'id_usuario',
+        'id_vehiculo',
+        'id_vehiculo__id_modelo',
+        'id_vehiculo__id_modelo__id_marca',
+        'id_vehiculo__id_usuario_propietario',
+    ).prefetch_related(
+        'detalles',
+        Prefetch(
+            'reservaciones',
+            # Mismo orden que reservaciones.first() (por pk); id_solicitud
+            # primero para que el índice de la FK resuelva el orden
+            queryset=Reservacion.objects.order_by('id_solicitud', 'pk'),
+            to_attr=RESERVACIONES_ATTR,
+        ),
+    )
+
+
+# ==========================================
+# RESERVACIONES
+# ==========================================
+
+def reservaciones_detalladas(queryset=None):
+    """
+    Reservaciones con la cadena solicitud/usuario/vehículo/modelo/marca
+    y el conteo de servicios anotado, listas para ReservacionSerializer.
+    """
+    if queryset is None:
+        queryset = Reservacion.objects.all()
+    # Subconsulta correlacionada: el conteo no se altera si el queryset
+    # ya filtra o hace join sobre servicios_reservados
+    servicios_count = ServicioReservado.objects.filter(
+        id_reservacion=OuterRef('pk')
+    ).order_by().values('id_reservacion').annotate(
+        total=Count('pk')
+    ).values('total')
+    return queryset.select_related(
+        'id_solicitud',
+        'id_solicitud__id_usuario',
+        'id_solicitud__id_vehiculo',
+        'id_solicitud__id_vehiculo__id_modelo',
+        'id_solicitud__id_vehiculo__id_modelo__id_marca',
+    ).annotate(
+        servicios_count=Coalesce(
+            Subquery(servicios_count, output_field=IntegerField()), 0
+        )
+    )
+
+
+# ==========================================
+# SERVICIOS RESERVADOS
+# ==========================================
+
+def servicios_detallados(queryset=None):
+    """
+    Servicios reservados con servicio, técnico, vehículo y último
+    progreso resueltos por join, listos para ServicioReservadoSerializer.
+    """
+    if queryset is None:
+        queryset = ServicioReservado.objects.all()
+    return queryset.select_related(
+        'id_servicio',
+        'id_usuario_taller',
+        'id_reservacion',
+        'id_reservacion__id_solicitud__id_vehiculo__id_modelo__id_marca',
+        'ultimo_progreso',
+    )
@@ -1,9 +1,17 @@
+from django.utils import timezone
 from rest_framework import serializers
 from agencia.models import (
     Marca, Modelo, Vehiculo, Solicitud, DetalleSolicitud,
-    Reservacion, ServicioTaller, ServicioReservado, ProgresoServicio
+    Reservacion, ServicioTaller, ServicioReservado, ProgresoServicio,
+    PLACA_VALIDA, normalizar_placa,
 )
+from agencia.agenda import AgendaTaller, DURACION_DEFAULT, inicio_reservacion
+from agencia.busqueda import TIPOS as TIPOS_BUSQUEDA, consulta_fts
+from agencia.exportacion import FORMATOS as FORMATOS_EXPORTACION
+from agencia.estados import ESTADOS_RESERVACION, ESTADOS_SERVICIO
 from users.models import Usuario
+from users.api.serializers import UsuarioSerializer
+from .querysets import RESERVACIONES_ATTR
 
 
 # ==========================================
@@ -28,6 +36,21 @@ class ModeloSerializer(serializers.ModelSerializer):
 # VEHÍCULOS
 # ==========================================
 
+def validar_placa(value, instancia=None):
+    """Placa con caracteres válidos y que, normalizada, no use otro vehículo"""
+    if not PLACA_VALIDA.fullmatch(value) or not normalizar_placa(value):
+        raise serializers.ValidationError(
+            'La placa solo admite letras, números, espacios, guiones, puntos y diagonales'
+        )
+    otros = Vehiculo.objects.filter(placa_normalizada=normalizar_placa(value))
+    if instancia is not None:
+        otros = otros.exclude(pk=instancia.pk)
+    if otros.exists():
+        raise serializers.ValidationError("Ya existe un vehículo con esta placa")
+    # Se guarda como se tecleó: placa_normalizada ya resuelve unicidad y búsqueda
+    return value
+
+
 class VehiculoSerializer(serializers.ModelSerializer):
     modelo_nombre = serializers.CharField(source='id_modelo.nombre', read_only=True)
     marca_nombre = serializers.CharField(source='id_modelo.id_marca.nombre', read_only=True)
@@ -43,6 +66,9 @@ class VehiculoSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'creado_at']
 
+    def validate_placa(self, value):
+        return validar_placa(value, self.instance)
+
 
 class VehiculoCreateSerializer(serializers.ModelSerializer):
     """
@@ -54,9 +80,40 @@ class VehiculoCreateSerializer(serializers.ModelSerializer):
     
     def validate_placa(self, value):
         """Validar que la placa sea única"""
-        if Vehiculo.objects.filter(placa=value).exists():
-            raise serializers.ValidationError("Ya existe un vehículo con esta placa")
-        return value.upper()
+        return validar_placa(value)
+
+
+class VehiculoPlacaSerializer(VehiculoSerializer):
+    """
+    Resultado del autocompletado de placas: el vehículo, su propietario y
+    su solicitud abierta (anotada por vehiculos_con_solicitud_abierta)
+    """
+    propietario_telefono = serializers.CharField(source='id_usuario_propietario.telefono', read_only=True)
+    solicitud_abierta = serializers.SerializerMethodField()
+
+    class Meta(VehiculoSerializer.Meta):
+        fields = VehiculoSerializer.Meta.fields + ['propietario_telefono', 'solicitud_abierta']
+
+    def get_solicitud_abierta(self, obj):
+        if obj.solicitud_abierta_id is None:
+            return None
+        return {
+            'id': obj.solicitud_abierta_id,
+            'fecha_creacion': serializers.DateTimeField().to_representation(obj.solicitud_abierta_fecha_creacion),
+            'descripcion': obj.solicitud_abierta_descripcion,
+        }
+
+
+class AutocompletarPlacaSerializer(serializers.Serializer):
+    """Parámetros de GET /api/asistente/vehiculos/placa/"""
+    q = serializers.CharField(max_length=50)
+    n = serializers.IntegerField(required=False, min_value=1, max_value=50, default=10)
+
+    def validate_q(self, value):
+        prefijo = normalizar_placa(value)
+        if not prefijo:
+            raise serializers.ValidationError('La placa no contiene letras ni números')
+        return prefijo
 
 
 # ==========================================
@@ -88,11 +145,18 @@ class SolicitudSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'fecha_creacion']
     
+    def _reservacion_actual(self, obj):
+        """Usa el prefetch de solicitudes_detalladas() si está disponible"""
+        reservaciones = getattr(obj, RESERVACIONES_ATTR, None)
+        if reservaciones is not None:
+            return reservaciones[0] if reservaciones else None
+        return obj.reservaciones.first()
+    
     def get_tiene_reservacion(self, obj):
-        return obj.reservaciones.exists()
+        return self._reservacion_actual(obj) is not None
     
     def get_reservacion_info(self, obj):
-        reservacion = obj.reservaciones.first()
+        reservacion = self._reservacion_actual(obj)
         if reservacion:
             return {
                 'id': reservacion.id,
@@ -115,7 +179,7 @@ class SolicitudCreateSerializer(serializers.ModelSerializer):
     def validate_id_vehiculo(self, value):
         """Validar que el vehículo pertenezca al usuario actual"""
         user = self.context['request'].user
-        if value.id_usuario_propietario != user:
+        if value.id_usuario_propietario_id != user.id:
             raise serializers.ValidationError("Este vehículo no te pertenece")
         return value
 
@@ -138,7 +202,8 @@ class ReservacionSerializer(serializers.ModelSerializer):
             'fecha_inicio', 'fecha_fin', 'creado_at',
             'servicios_count'
         ]
-        read_only_fields = ['id', 'creado_at']
+        # Los acumulados los mantienen los servicios (acumular_servicios)
+        read_only_fields = ['id', 'creado_at', *Reservacion.campos_acumulados]
     
     def get_solicitud_info(self, obj):
         return {
@@ -157,6 +222,9 @@ class ReservacionSerializer(serializers.ModelSerializer):
         }
     
     def get_servicios_count(self, obj):
+        # Anotado por reservaciones_detalladas()
+        if hasattr(obj, 'servicios_count'):
+            return obj.servicios_count
         return obj.servicios_reservados.count()
 
 
@@ -176,6 +244,28 @@ class ReservacionCreateSerializer(serializers.ModelSerializer):
         if value.reservaciones.filter(estado_global__in=['pendiente', 'confirmada', 'en_progreso']).exists():
             raise serializers.ValidationError("Esta solicitud ya tiene una reservación activa")
         return value
+    
+    def validate(self, attrs):
+        """Validar que el taller abra y tenga bahía libre en el horario pedido"""
+        inicio = inicio_reservacion(attrs)
+        if inicio is None:
+            return attrs
+        fin = attrs.get('fecha_fin')
+        if fin is not None and fin <= inicio:
+            raise serializers.ValidationError({
+                'fecha_fin': 'La fecha de fin debe ser posterior al inicio'
+            })
+        duracion = (fin - inicio).total_seconds() // 60 if fin else DURACION_DEFAULT
+        
+        dia = timezone.localtime(inicio).replace(hour=0, minute=0, second=0, microsecond=0)
+        agenda = AgendaTaller.cargar(dia)
+        if not agenda.hay_capacidad(inicio, duracion):
+            huecos = agenda.huecos_libres(duracion, n=3, desde=inicio)
+            raise serializers.ValidationError({
+                'fecha': 'El taller no tiene capacidad en ese horario',
+                'sugerencias': [hueco['inicio'].isoformat() for hueco in huecos],
+            })
+        return attrs
 
 
 # ==========================================
@@ -251,7 +341,8 @@ class ServicioReservadoSerializer(serializers.ModelSerializer):
         }
     
     def get_ultimo_progreso(self, obj):
-        ultimo = obj.progresos.order_by('-fecha').first()
+        # Apuntador mantenido por las vistas de progreso del taller
+        ultimo = obj.ultimo_progreso
         if ultimo:
             return {
                 'fecha': ultimo.fecha,
@@ -261,6 +352,55 @@ class ServicioReservadoSerializer(serializers.ModelSerializer):
         return None
 
 
+class ServicioAsignadoSerializer(serializers.Serializer):
+    id_servicio = serializers.IntegerField()
+    id_usuario_taller = serializers.IntegerField(required=False, allow_null=True)
+
+
+class AsignarServiciosSerializer(serializers.Serializer):
+    """
+    Valida una asignación masiva de servicios a una reservación. Los
+    servicios y técnicos referenciados se comprueban con una consulta IN
+    por tabla, sin importar cuántos renglones traiga la petición.
+    """
+    servicios = ServicioAsignadoSerializer(many=True, allow_empty=False)
+    # Los renglones sin técnico se reparten entre los menos cargados
+    asignacion_automatica = serializers.BooleanField(default=False)
+
+    def validate_servicios(self, value):
+        ids_servicio = {item['id_servicio'] for item in value}
+        ids_tecnico = {
+            item['id_usuario_taller'] for item in value
+            if item.get('id_usuario_taller') is not None
+        }
+
+        duraciones = dict(
+            ServicioTaller.objects.filter(pk__in=ids_servicio, activo=True)
+            .values_list('pk', 'duracion_estimada')
+        )
+        existentes = set(duraciones)
+        tecnicos = set(
+            Usuario.objects.filter(
+                pk__in=ids_tecnico, id_tipo__cve='TALLER', is_active=True
+            ).values_list('pk', flat=True)
+        ) if ids_tecnico else set()
+
+        errores = {}
+        if ids_servicio - existentes:
+            errores['id_servicio'] = (
+                f"Servicios inexistentes o inactivos: {sorted(ids_servicio - existentes)}"
+            )
+        if ids_tecnico - tecnicos:
+            errores['id_usuario_taller'] = (
+                f"No son técnicos del taller: {sorted(ids_tecnico - tecnicos)}"
+            )
+        if errores:
+            raise serializers.ValidationError(errores)
+        for item in value:
+            item['duracion'] = duraciones[item['id_servicio']] or DURACION_DEFAULT
+        return value
+
+
 # ==========================================
 # PROGRESO DE SERVICIO
 # ==========================================
@@ -281,6 +421,98 @@ class ProgresoServicioSerializer(serializers.ModelSerializer):
     
     def validate_porcentaje(self, value):
         """Validar que el porcentaje esté entre 0 y 100"""
-        if value < 0 or value > 100:
+        if value is not None and (value < 0 or value > 100):
             raise serializers.ValidationError("El porcentaje debe estar entre 0 y 100")
-        return value
\ No newline at end of file
+        return value
+
+
+# ==========================================
+# CAMBIOS DE ESTADO POR LOTE
+# ==========================================
+
+class CambioEstadoLoteSerializer(serializers.Serializer):
+    # Acotado para que el IN (...) quepa en una sola consulta
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500
+    )
+
+
+class EstadoSolicitudLoteSerializer(CambioEstadoLoteSerializer):
+    id_estado = serializers.IntegerField(min_value=1)
+
+
+class EstadoReservacionLoteSerializer(CambioEstadoLoteSerializer):
+    estado_global = serializers.ChoiceField(choices=ESTADOS_RESERVACION)
+
+
+class EstadoServicioLoteSerializer(CambioEstadoLoteSerializer):
+    estado = serializers.ChoiceField(choices=ESTADOS_SERVICIO)
+
+
+class TecnicoCargaSerializer(UsuarioSerializer):
+    """Técnico con su carga abierta (anotada por tecnicos_con_carga)"""
+    carga_minutos = serializers.IntegerField(read_only=True)
+    servicios_abiertos = serializers.IntegerField(read_only=True)
+
+    class Meta(UsuarioSerializer.Meta):
+        fields = UsuarioSerializer.Meta.fields + ['carga_minutos', 'servicios_abiertos']
+
+
+# ==========================================
+# TABLERO
+# ==========================================
+
+class TableroSerializer(serializers.Serializer):
+    """Parámetros de GET /api/asistente/tablero/"""
+    dias = serializers.IntegerField(required=False, min_value=1, max_value=366, default=30)
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+
+class BusquedaSerializer(serializers.Serializer):
+    """Parámetros de GET /api/asistente/buscar/"""
+    q = serializers.CharField(max_length=200)
+    tipo = serializers.ChoiceField(choices=TIPOS_BUSQUEDA, required=False)
+    page = serializers.IntegerField(required=False, min_value=1, default=1)
+
+    def validate_q(self, value):
+        if not consulta_fts(value):
+            raise serializers.ValidationError('La búsqueda no contiene palabras')
+        return value
+
+
+# ==========================================
+# EXPORTACIÓN
+# ==========================================
+
+class ExportacionSerializer(serializers.Serializer):
+    """Parámetros de GET /api/asistente/exportar/<entidad>/"""
+    formato = serializers.ChoiceField(choices=list(FORMATOS_EXPORTACION), required=False, default='csv')
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get('desde') and data.get('hasta') and data['desde'] > data['hasta']:
+            raise serializers.ValidationError('desde debe ser anterior o igual a hasta')
+        return data
+
+
+# ==========================================
+# AGENDA DEL TALLER
+# ==========================================
+
+class DisponibilidadSerializer(serializers.Serializer):
+    """Parámetros de GET /api/asistente/disponibilidad/"""
+    servicios = serializers.CharField(required=False, help_text='ids separados por coma')
+    duracion = serializers.IntegerField(required=False, min_value=1, max_value=24 * 60)
+    desde = serializers.DateTimeField(required=False)
+    n = serializers.IntegerField(required=False, min_value=1, max_value=50, default=5)
+    tecnico = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_servicios(self, value):
+        try:
+            return [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError('Lista de ids inválida')
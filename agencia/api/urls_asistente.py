@@ -4,12 +4,14 @@ from .views.asistente_views import (
     SolicitudAsistenteListView,
     SolicitudAsistenteDetailView,
     CambiarEstadoSolicitudView,
+    CambiarEstadoSolicitudLoteView,
     CrearDetalleSolicitudView,
     
     # Reservaciones
     ReservacionAsistenteListCreateView,
     ReservacionAsistenteDetailView,
     CambiarEstadoReservacionView,
+    CambiarEstadoReservacionLoteView,
     
     # Servicios Reservados
     AsignarServiciosView,
@@ -19,7 +21,20 @@ from .views.asistente_views import (
     # Catálogos y consultas
     ClientesListView,
     VehiculosListView,
+    AutocompletarPlacaView,
     TecnicosListView,
+    
+    # Agenda
+    DisponibilidadView,
+    
+    # Tablero
+    TableroView,
+    
+    # Búsqueda
+    BusquedaView,
+    
+    # Exportación
+    ExportarView,
 )
 
 app_name = 'asistente'
@@ -29,6 +44,7 @@ urlpatterns = [
     # SOLICITUDES
     # ==========================================
     path('solicitudes/', SolicitudAsistenteListView.as_view(), name='solicitudes-list'),
+    path('solicitudes/estado/', CambiarEstadoSolicitudLoteView.as_view(), name='cambiar-estado-solicitudes'),
     path('solicitudes/<int:pk>/', SolicitudAsistenteDetailView.as_view(), name='solicitud-detail'),
     path('solicitudes/<int:pk>/estado/', CambiarEstadoSolicitudView.as_view(), name='cambiar-estado-solicitud'),
     path('solicitudes/<int:solicitud_id>/detalle/', CrearDetalleSolicitudView.as_view(), name='crear-detalle'),
@@ -37,6 +53,7 @@ urlpatterns = [
     # RESERVACIONES
     # ==========================================
     path('reservaciones/', ReservacionAsistenteListCreateView.as_view(), name='reservaciones-list-create'),
+    path('reservaciones/estado/', CambiarEstadoReservacionLoteView.as_view(), name='cambiar-estado-reservaciones'),
     path('reservaciones/<int:pk>/', ReservacionAsistenteDetailView.as_view(), name='reservacion-detail'),
     path('reservaciones/<int:pk>/estado/', CambiarEstadoReservacionView.as_view(), name='cambiar-estado-reservacion'),
     
@@ -52,5 +69,26 @@ urlpatterns = [
     # ==========================================
     path('clientes/', ClientesListView.as_view(), name='clientes-list'),
     path('vehiculos/', VehiculosListView.as_view(), name='vehiculos-list'),
+    path('vehiculos/placa/', AutocompletarPlacaView.as_view(), name='vehiculos-placa'),
     path('tecnicos/', TecnicosListView.as_view(), name='tecnicos-list'),
+    
+    # ==========================================
+    # AGENDA DEL TALLER
+    # ==========================================
+    path('disponibilidad/', DisponibilidadView.as_view(), name='disponibilidad'),
+    
+    # ==========================================
+    # TABLERO
+    # ==========================================
+    path('tablero/', TableroView.as_view(), name='tablero'),
+    
+    # ==========================================
+    # BÚSQUEDA
+    # ==========================================
+    path('buscar/', BusquedaView.as_view(), name='buscar'),
+    
+    # ==========================================
+    # EXPORTACIÓN
+    # ==========================================
+    path('exportar/<slug:entidad>/', ExportarView.as_view(), name='exportar'),
 ]
\ No newline at end of file
@@ -16,7 +16,11 @@ from .views.cliente_views import (
     # Seguimiento
     ServiciosReservacionView,
     ProgresoServicioView,
+    
+    # Sincronización
+    CambiosClienteView,
 )
+from .views.async_views import eventos_cliente
 
 app_name = 'cliente'
 
@@ -45,4 +49,10 @@ urlpatterns = [
     # ==========================================
     path('reservaciones/<int:reservacion_id>/servicios/', ServiciosReservacionView.as_view(), name='servicios-reservacion'),
     path('servicios/<int:servicio_id>/progreso/', ProgresoServicioView.as_view(), name='progreso-servicio'),
+    path('eventos/', eventos_cliente, name='eventos'),
+    
+    # ==========================================
+    # SINCRONIZACIÓN
+    # ==========================================
+    path('cambios/', CambiosClienteView.as_view(), name='cambios'),
 ]
\ No newline at end of file
@@ -4,6 +4,7 @@ from .views.taller_views import (
     MisServiciosListView,
     MiServicioDetailView,
     CambiarEstadoServicioView,
+    CambiarEstadoServicioLoteView,
     
     # Progreso
     CrearProgresoServicioView,
@@ -13,6 +14,9 @@ from .views.taller_views import (
     # Consultas
     ReservacionTallerDetailView,
     ServicioDetalleView,
+    
+    # Sincronización
+    CambiosTallerView,
 )
 
 app_name = 'taller'
@@ -22,6 +26,7 @@ urlpatterns = [
     # SERVICIOS ASIGNADOS
     # ==========================================
     path('mis-servicios/', MisServiciosListView.as_view(), name='mis-servicios-list'),
+    path('mis-servicios/estado/', CambiarEstadoServicioLoteView.as_view(), name='cambiar-estado-servicios'),
     path('mis-servicios/<int:pk>/', MiServicioDetailView.as_view(), name='mi-servicio-detail'),
     path('mis-servicios/<int:pk>/estado/', CambiarEstadoServicioView.as_view(), name='cambiar-estado-servicio'),
     
@@ -37,4 +42,9 @@ urlpatterns = [
     # ==========================================
     path('reservaciones/<int:pk>/', ReservacionTallerDetailView.as_view(), name='reservacion-detail'),
     path('servicios/<int:pk>/detalle/', ServicioDetalleView.as_view(), name='servicio-detalle'),
+    
+    # ==========================================
+    # SINCRONIZACIÓN
+    # ==========================================
+    path('cambios/', CambiosTallerView.as_view(), name='cambios'),
 ]
\ No newline at end of file
@@ -1,22 +1,52 @@
 from users.api.serializers import UsuarioSerializer  # 🔧 Correcto
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from agencia.agenda import AgendaTaller, DURACION_DEFAULT, duracion_servicios
+from agencia.busqueda import buscar, disponible as busqueda_disponible
+from agencia.cambios import registrar_instancias, registrar_reasignacion
+from agencia.carga import RepartoCarga, tecnicos_con_carga
+from agencia.estados import (
+    ESTADOS_SERVICIO_ABIERTOS, TRANSICIONES_RESERVACION, cambiar_estado_lote
+)
+from agencia.exportacion import EXPORTACIONES, FORMATOS as FORMATOS_EXPORTACION, en_hilo_propio, exportar
 from agencia.models import (
     Solicitud, DetalleSolicitud, Reservacion,
     ServicioReservado, Vehiculo
 )
-from users.models import Usuario, TipoUsuario
+from agencia.resumen import leer_tablero, registrar_altas
+from users.models import Usuario
 from ..serializers import (
     SolicitudSerializer, SolicitudCreateSerializer,
     DetalleSolicitudSerializer, ReservacionSerializer,
     ReservacionCreateSerializer, ServicioReservadoSerializer,
-    VehiculoSerializer,
+    VehiculoSerializer, AsignarServiciosSerializer,
+    EstadoSolicitudLoteSerializer, EstadoReservacionLoteSerializer,
+    DisponibilidadSerializer, TecnicoCargaSerializer, TableroSerializer,
+    BusquedaSerializer, VehiculoPlacaSerializer, AutocompletarPlacaSerializer,
+    ExportacionSerializer,
 )
 from users.api.serializers import UsuarioSerializer  # 🔧 Importar desde users
+from ..condicional import VersionETagMixin, etag_version, guardar_condicional
+from ..pagination import (
+    SolicitudKeysetPagination, ReservacionKeysetPagination,
+    ServicioReservadoKeysetPagination,
+)
 from ..permissions import IsAsistente
+from ..querysets import (
+    solicitudes_detalladas, reservaciones_detalladas, servicios_detallados,
+    prefijo_placa, vehiculos_con_solicitud_abierta,
+)
 
 # ... resto del código iguals
 # ==========================================
@@ -25,22 +55,24 @@ from ..permissions import IsAsistente
 
 class SolicitudAsistenteListView(generics.ListAPIView):
     """
-    GET /api/asistente/solicitudes/
+    GET /api/asistente/solicitudes/?cursor=...
+    GET /api/asistente/solicitudes/?page=N&ordering=... (paginación anterior)
+    Con cursor el orden es fijo (más reciente primero): ?ordering= sin
+    ?page=N → 400.
     """
-    queryset = Solicitud.objects.all().select_related(
-        'id_vehiculo', 'id_usuario'
-    ).prefetch_related('detalles', 'reservaciones').order_by('-fecha_creacion')
+    queryset = solicitudes_detalladas().order_by('-fecha_creacion', '-id')
     serializer_class = SolicitudSerializer
     permission_classes = [IsAuthenticated, IsAsistente]
+    pagination_class = SolicitudKeysetPagination
 
 
-class SolicitudAsistenteDetailView(generics.RetrieveUpdateAPIView):
+class SolicitudAsistenteDetailView(VersionETagMixin, generics.RetrieveUpdateAPIView):
     """
-    GET /api/asistente/solicitudes/{id}/
+    GET /api/asistente/solicitudes/{id}/ (ETag; If-None-Match → 304)
     PUT /api/asistente/solicitudes/{id}/
-    PATCH /api/asistente/solicitudes/{id}/
+    PATCH /api/asistente/solicitudes/{id}/ (If-Match → 412 si cambió)
     """
-    queryset = Solicitud.objects.all().select_related('id_vehiculo', 'id_usuario')
+    queryset = solicitudes_detalladas()
     serializer_class = SolicitudSerializer
     permission_classes = [IsAuthenticated, IsAsistente]
 
@@ -52,7 +84,7 @@ class CambiarEstadoSolicitudView(APIView):
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def patch(self, request, pk):
-        solicitud = get_object_or_404(Solicitud, pk=pk)
+        solicitud = get_object_or_404(solicitudes_detalladas(), pk=pk)
         nuevo_estado = request.data.get('id_estado')
         
         if not nuevo_estado:
@@ -62,10 +94,33 @@ class CambiarEstadoSolicitudView(APIView):
             )
         
         solicitud.id_estado = nuevo_estado
-        solicitud.save()
+        guardar_condicional(request, solicitud)
         
         serializer = SolicitudSerializer(solicitud)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag_version(solicitud.version)})
+
+
+class CambiarEstadoSolicitudLoteView(APIView):
+    """
+    PATCH /api/asistente/solicitudes/estado/
+    Body: {"ids": [1, 2, 3], "id_estado": 2}
+    Un resultado por id; consultas constantes sin importar cuántos ids.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+    
+    def patch(self, request):
+        entrada = EstadoSolicitudLoteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        destino = entrada.validated_data['id_estado']
+        
+        resultados, actualizados = cambiar_estado_lote(
+            Solicitud.objects.all(), 'id_estado', entrada.validated_data['ids'], destino
+        )
+        return Response({
+            'id_estado': destino,
+            'actualizados': len(actualizados),
+            'resultados': resultados,
+        })
 
 
 class CrearDetalleSolicitudView(generics.CreateAPIView):
@@ -87,13 +142,15 @@ class CrearDetalleSolicitudView(generics.CreateAPIView):
 
 class ReservacionAsistenteListCreateView(generics.ListCreateAPIView):
     """
-    GET /api/asistente/reservaciones/
+    GET /api/asistente/reservaciones/?cursor=...
+    GET /api/asistente/reservaciones/?page=N&ordering=... (paginación anterior)
+    Con cursor el orden es fijo (más reciente primero): ?ordering= sin
+    ?page=N → 400.
     POST /api/asistente/reservaciones/
     """
-    queryset = Reservacion.objects.all().select_related(
-        'id_solicitud', 'id_solicitud__id_vehiculo'
-    ).order_by('-fecha')
+    queryset = reservaciones_detalladas().order_by('-fecha', '-id')
     permission_classes = [IsAuthenticated, IsAsistente]
+    pagination_class = ReservacionKeysetPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -101,14 +158,14 @@ class ReservacionAsistenteListCreateView(generics.ListCreateAPIView):
         return ReservacionSerializer
 
 
-class ReservacionAsistenteDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ReservacionAsistenteDetailView(VersionETagMixin, generics.RetrieveUpdateDestroyAPIView):
     """
-    GET /api/asistente/reservaciones/{id}/
+    GET /api/asistente/reservaciones/{id}/ (ETag; If-None-Match → 304)
     PUT /api/asistente/reservaciones/{id}/
-    PATCH /api/asistente/reservaciones/{id}/
+    PATCH /api/asistente/reservaciones/{id}/ (If-Match → 412 si cambió)
     DELETE /api/asistente/reservaciones/{id}/
     """
-    queryset = Reservacion.objects.all().select_related('id_solicitud')
+    queryset = reservaciones_detalladas()
     serializer_class = ReservacionSerializer
     permission_classes = [IsAuthenticated, IsAsistente]
 
@@ -116,11 +173,13 @@ class ReservacionAsistenteDetailView(generics.RetrieveUpdateDestroyAPIView):
 class CambiarEstadoReservacionView(APIView):
     """
     PATCH /api/asistente/reservaciones/{id}/estado/
+    Body: {"estado_global": "confirmada"}
+    Un estado desconocido responde 400 y una transición no permitida
+    (agencia.estados), 409, igual que el cambio por lote.
     """
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def patch(self, request, pk):
-        reservacion = get_object_or_404(Reservacion, pk=pk)
         nuevo_estado = request.data.get('estado_global')
         
         if not nuevo_estado:
@@ -128,12 +187,55 @@ class CambiarEstadoReservacionView(APIView):
                 {'error': 'El campo estado_global es requerido'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if nuevo_estado not in TRANSICIONES_RESERVACION:
+            return Response(
+                {'error': f'Estado inválido. Opciones: {", ".join(TRANSICIONES_RESERVACION)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        reservacion = get_object_or_404(reservaciones_detalladas(), pk=pk)
+        actual = reservacion.estado_global
+        if nuevo_estado != actual and nuevo_estado not in TRANSICIONES_RESERVACION[actual]:
+            return Response(
+                {'error': f'Transición no permitida: {actual} → {nuevo_estado}'},
+                status=status.HTTP_409_CONFLICT
+            )
         
         reservacion.estado_global = nuevo_estado
-        reservacion.save()
+        guardar_condicional(request, reservacion)
         
         serializer = ReservacionSerializer(reservacion)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag_version(reservacion.version)})
+
+
+class CambiarEstadoReservacionLoteView(APIView):
+    """
+    PATCH /api/asistente/reservaciones/estado/
+    Body: {"ids": [1, 2, 3], "estado_global": "completada"}
+    Solo aplica transiciones permitidas (agencia.estados); un resultado por id.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+    
+    def patch(self, request):
+        entrada = EstadoReservacionLoteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        destino = entrada.validated_data['estado_global']
+        
+        with transaction.atomic():
+            resultados, actualizados = cambiar_estado_lote(
+                Reservacion.objects.all(), 'estado_global',
+                entrada.validated_data['ids'], destino, TRANSICIONES_RESERVACION
+            )
+            if actualizados:
+                # El detalle de la solicitud muestra el estado de su reservación
+                Solicitud.objects.filter(
+                    reservaciones__pk__in=actualizados
+                ).update(version=F('version') + 1)
+        return Response({
+            'estado_global': destino,
+            'actualizados': len(actualizados),
+            'resultados': resultados,
+        })
 
 
 # ==========================================
@@ -149,28 +251,69 @@ class AsignarServiciosView(APIView):
             {"id_servicio": 2, "id_usuario_taller": 6}
         ]
     }
+    Se asignan todos o ninguno: servicios activos y técnicos con rol TALLER.
+    Con "asignacion_automatica": true los renglones sin id_usuario_taller
+    se reparten entre los técnicos con menos carga abierta. Una reservación
+    completada o cancelada ya no recibe servicios (409).
     """
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def post(self, request, reservacion_id):
-        reservacion = get_object_or_404(Reservacion, pk=reservacion_id)
-        servicios_data = request.data.get('servicios', [])
+        reservacion = get_object_or_404(
+            Reservacion.objects.select_related('id_solicitud'), pk=reservacion_id
+        )
+        if not TRANSICIONES_RESERVACION[reservacion.estado_global]:
+            # Sin transiciones de salida: pendientes nuevos no la reabren
+            return Response(
+                {'error': f'La reservación está {reservacion.estado_global}: no admite servicios'},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        if not servicios_data:
+        if not request.data.get('servicios'):
             return Response(
                 {'error': 'Debe proporcionar al menos un servicio'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        servicios_creados = []
-        for servicio_data in servicios_data:
-            servicio_reservado = ServicioReservado.objects.create(
-                id_reservacion=reservacion,
-                id_servicio_id=servicio_data.get('id_servicio'),
-                id_usuario_taller_id=servicio_data.get('id_usuario_taller'),
-            )
-            servicios_creados.append(servicio_reservado)
+        entrada = AsignarServiciosSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        items = entrada.validated_data['servicios']
+        
+        sin_tecnico = [item for item in items if item.get('id_usuario_taller') is None]
+        if entrada.validated_data['asignacion_automatica'] and sin_tecnico:
+            # Una consulta de carga y el reparto completo en memoria
+            reparto = RepartoCarga.cargar()
+            if not reparto:
+                return Response(
+                    {'error': 'No hay técnicos activos para asignar'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            for item in items:
+                if item.get('id_usuario_taller') is not None:
+                    reparto.sumar(item['id_usuario_taller'], item['duracion'])
+            # Los más largos primero reparten mejor
+            for item in sorted(sin_tecnico, key=lambda item: -item['duracion']):
+                item['id_usuario_taller'] = reparto.asignar(item['duracion'])
+        
+        # Todo o nada: un solo INSERT y los acumulados de la reservación
+        # (bulk_create no emite post_save)
+        with transaction.atomic():
+            creados = ServicioReservado.objects.bulk_create([
+                ServicioReservado(
+                    id_reservacion=reservacion,
+                    id_servicio_id=item['id_servicio'],
+                    id_usuario_taller_id=item.get('id_usuario_taller'),
+                )
+                for item in items
+            ])
+            Reservacion.objects.filter(pk=reservacion.pk).acumular_servicios(servicios=len(creados))
+            registrar_instancias(creados, 'alta')
+            registrar_instancias([reservacion], 'cambio')
+            registrar_altas(creados)
         
+        servicios_creados = servicios_detallados(
+            ServicioReservado.objects.filter(pk__in=[s.pk for s in creados])
+        ).order_by('pk')
         serializer = ServicioReservadoSerializer(servicios_creados, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -178,35 +321,60 @@ class AsignarServiciosView(APIView):
 class AsignarTecnicoView(APIView):
     """
     PUT /api/asistente/servicios-reservados/{id}/asignar-tecnico/
+    Body: {"id_usuario_taller": 5} o {"asignacion_automatica": true}
     """
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def put(self, request, pk):
-        servicio_reservado = get_object_or_404(ServicioReservado, pk=pk)
+        servicio_reservado = get_object_or_404(servicios_detallados(), pk=pk)
         tecnico_id = request.data.get('id_usuario_taller')
         
+        if not tecnico_id and request.data.get('asignacion_automatica'):
+            tecnico_id = self.tecnico_menos_cargado(servicio_reservado)
+            if tecnico_id is None:
+                return Response(
+                    {'error': 'No hay técnicos activos para asignar'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
         if not tecnico_id:
             return Response(
                 {'error': 'El campo id_usuario_taller es requerido'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        anterior = servicio_reservado.id_usuario_taller_id
         servicio_reservado.id_usuario_taller_id = tecnico_id
-        servicio_reservado.save()
+        with transaction.atomic():
+            guardar_condicional(request, servicio_reservado)
+            registrar_reasignacion(servicio_reservado, anterior)
         
         serializer = ServicioReservadoSerializer(servicio_reservado)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag_version(servicio_reservado.version)})
+    
+    def tecnico_menos_cargado(self, servicio_reservado):
+        reparto = RepartoCarga.cargar()
+        if not reparto:
+            return None
+        duracion = servicio_reservado.id_servicio.duracion_estimada or DURACION_DEFAULT
+        actual = servicio_reservado.id_usuario_taller_id
+        if actual is not None and servicio_reservado.estado in ESTADOS_SERVICIO_ABIERTOS:
+            # Su carga ya incluye este servicio: compararlo sin él
+            reparto.sumar(actual, -duracion)
+        return reparto.asignar(duracion)
 
 
 class ServiciosReservadosListView(generics.ListAPIView):
     """
-    GET /api/asistente/servicios-reservados/
+    GET /api/asistente/servicios-reservados/?cursor=...
+    GET /api/asistente/servicios-reservados/?page=N&ordering=... (paginación anterior)
+    Con cursor el orden es fijo (más reciente primero): ?ordering= sin
+    ?page=N → 400.
     """
-    queryset = ServicioReservado.objects.all().select_related(
-        'id_servicio', 'id_usuario_taller', 'id_reservacion'
-    ).order_by('-creado_at')
+    queryset = servicios_detallados().order_by('-creado_at', '-id')
     serializer_class = ServicioReservadoSerializer
     permission_classes = [IsAuthenticated, IsAsistente]
+    pagination_class = ServicioReservadoKeysetPagination
 
 
 # ==========================================
@@ -221,10 +389,7 @@ class ClientesListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def get_queryset(self):
-        tipo_cliente = TipoUsuario.objects.filter(cve='CLIENTE').first()
-        if tipo_cliente:
-            return Usuario.objects.filter(id_tipo=tipo_cliente)
-        return Usuario.objects.none()
+        return Usuario.objects.filter(id_tipo__cve='CLIENTE').select_related('id_tipo')
 
 
 class VehiculosListView(generics.ListAPIView):
@@ -238,15 +403,159 @@ class VehiculosListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsAsistente]
 
 
+class AutocompletarPlacaView(APIView):
+    """
+    GET /api/asistente/vehiculos/placa/?q=abc-1&n=10
+    Vehículos cuya placa empieza con q, sin importar mayúsculas ni
+    separadores, con su propietario y su solicitud abierta. Una consulta:
+    rango sobre el índice de placa_normalizada y subconsultas por vehículo.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+
+    def get(self, request):
+        parametros = AutocompletarPlacaSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        vehiculos = vehiculos_con_solicitud_abierta(
+            Vehiculo.objects.filter(prefijo_placa(datos['q']))
+        ).order_by('placa_normalizada')[:datos['n']]
+        return Response(VehiculoPlacaSerializer(vehiculos, many=True).data)
+
+
 class TecnicosListView(generics.ListAPIView):
     """
     GET /api/asistente/tecnicos/
+    Con carga abierta (minutos y servicios), de menor a mayor carga
     """
-    serializer_class = UsuarioSerializer
+    serializer_class = TecnicoCargaSerializer
     permission_classes = [IsAuthenticated, IsAsistente]
     
     def get_queryset(self):
-        tipo_taller = TipoUsuario.objects.filter(cve='TALLER').first()
-        if tipo_taller:
-            return Usuario.objects.filter(id_tipo=tipo_taller)
-        return Usuario.objects.none()
\ No newline at end of file
+        return tecnicos_con_carga(
+            Usuario.objects.filter(id_tipo__cve='TALLER')
+        ).select_related('id_tipo').order_by('carga_minutos', 'pk')
+
+
+# ==========================================
+# AGENDA DEL TALLER
+# ==========================================
+
+class DisponibilidadView(APIView):
+    """
+    GET /api/asistente/disponibilidad/?servicios=1,2&desde=2025-01-20T08:00&n=5
+    Siguientes horarios con técnico y bahía libres para los servicios
+    indicados (o ?duracion=minutos). Con ?tecnico=ID solo ese técnico.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+    
+    def get(self, request):
+        parametros = DisponibilidadSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        
+        if datos.get('servicios'):
+            duracion = duracion_servicios(datos['servicios'])
+        else:
+            duracion = datos.get('duracion', DURACION_DEFAULT)
+        desde = max(datos.get('desde') or timezone.now(), timezone.now())
+        tecnicos = [datos['tecnico']] if 'tecnico' in datos else None
+        
+        agenda = AgendaTaller.cargar(desde)
+        huecos = agenda.huecos_libres(duracion, n=datos['n'], desde=desde, tecnicos=tecnicos)
+        return Response({'duracion_minutos': duracion, 'huecos': huecos})
+
+
+# ==========================================
+# TABLERO
+# ==========================================
+
+class TableroView(APIView):
+    """
+    GET /api/asistente/tablero/?dias=30
+    Conteos por estado de solicitudes, reservaciones y servicios, servicios
+    por técnico y altas e ingresos por día, leídos del resumen que cada
+    escritura mantiene (agencia.resumen): el costo no crece con el historial.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+    
+    def get(self, request):
+        parametros = TableroSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        return Response(leer_tablero(parametros.validated_data['dias']))
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+
+class BusquedaView(APIView):
+    """
+    GET /api/asistente/buscar/?q=texto&tipo=solicitud&page=1
+    Solicitudes, vehículos y clientes que contienen todas las palabras (como
+    prefijo, sin acentos), del más al menos relevante, en páginas sin
+    conteo. Consulta el índice FTS5 que mantienen triggers (agencia.busqueda).
+    "truncado" es true si solo se ordenaron las BUSQUEDA_CANDIDATOS
+    coincidencias más recientes: conviene afinar la búsqueda.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+
+    def get(self, request):
+        if not busqueda_disponible():
+            return Response(
+                {'error': 'Búsqueda no disponible con esta base de datos'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        parametros = BusquedaSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        page_size = api_settings.PAGE_SIZE
+
+        resultados, truncado = buscar(
+            datos['q'], tipo=datos.get('tipo'),
+            limite=page_size + 1, desplazamiento=(datos['page'] - 1) * page_size,
+        )
+        siguiente = None
+        if len(resultados) > page_size:
+            resultados = resultados[:page_size]
+            siguiente = replace_query_param(request.build_absolute_uri(), 'page', datos['page'] + 1)
+        return Response({'next': siguiente, 'truncado': truncado, 'results': resultados})
+
+
+# ==========================================
+# EXPORTACIÓN
+# ==========================================
+
+class ExportarView(APIView):
+    """
+    GET /api/asistente/exportar/<entidad>/?formato=csv&desde=2026-01-01&hasta=2026-01-31
+    Exporta solicitudes, detalles, reservaciones o servicios completos en
+    CSV o NDJSON (una línea JSON por registro) para contabilidad y BI, en
+    lugar de recorrer los listados de 20 en 20. La respuesta se genera
+    mientras se envía (agencia.exportacion): una consulta y memoria
+    constante sin importar cuántas filas haya.
+    """
+    permission_classes = [IsAuthenticated, IsAsistente]
+
+    def perform_content_negotiation(self, request, force=False):
+        # La exportación no pasa por renderers: un Accept: text/csv no es
+        # motivo de 406 (los errores se siguen respondiendo en JSON)
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, entidad):
+        if entidad not in EXPORTACIONES:
+            raise NotFound(f'Exportaciones disponibles: {", ".join(EXPORTACIONES)}')
+        parametros = ExportacionSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        formato = datos['formato']
+
+        contenido = exportar(entidad, formato, datos.get('desde'), datos.get('hasta'))
+        if isinstance(request._request, ASGIRequest):
+            contenido = en_hilo_propio(contenido)
+        response = StreamingHttpResponse(contenido, content_type=FORMATOS_EXPORTACION[formato])
+        nombre = '-'.join(
+            [entidad] + [str(datos[limite]) for limite in ('desde', 'hasta') if limite in datos]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,82 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from agencia.eventos import HEARTBEAT_SEGUNDOS, REVISION_USUARIO_SEGUNDOS, broker, formatear_evento
+from users.api.authentication import JWTQueryStringAuthentication
+from users.api.tokens import rol_del_usuario
+from users.models import Usuario
+from users.revocacion import compartida, token_revocado
+
+
+# ==========================================
+# SEGUIMIENTO EN VIVO (ASGI)
+# ==========================================
+
+async def _activo(usuario_id):
+    return await Usuario.objects.filter(pk=usuario_id, is_active=True).aexists()
+
+
+async def _stream(usuario_id, token):
+    suscripcion = broker().suscribir(usuario_id)
+    try:
+        yield 'retry: 5000\n: conectado\n\n'
+        revisado = leido = time.monotonic()
+        while True:
+            # El token solo se validó al conectar: el stream se cierra
+            # cuando expira o lo revocan, y el cliente reconecta con otro
+            restante = token['exp'] - time.time()
+            if restante <= 0:
+                yield formatear_evento('cierre', {'motivo': 'token_expirado'})
+                return
+            eventos = await suscripcion.siguientes(min(HEARTBEAT_SEGUNDOS, restante))
+            ahora = time.monotonic()
+            if not eventos or ahora - revisado >= HEARTBEAT_SEGUNDOS:
+                revisado = ahora
+                # La marca de revocación no toca la base de datos. Si no es
+                # compartida, la desactivación hecha en otro worker se ve al
+                # leer el usuario, pero solo cada REVISION_USUARIO_SEGUNDOS
+                vigente = not await sync_to_async(token_revocado)(usuario_id, token)
+                if vigente and not compartida() and ahora - leido >= REVISION_USUARIO_SEGUNDOS:
+                    vigente, leido = await _activo(usuario_id), ahora
+                if not vigente:
+                    yield formatear_evento('cierre', {'motivo': 'token_revocado'})
+                    return
+            # El comentario periódico mantiene viva la conexión en proxies
+            # y deja ver desconexiones sin otra tarea por cliente
+            yield ''.join(eventos) if eventos else ': ping\n\n'
+    finally:
+        broker().cancelar(suscripcion)
+
+
+@require_GET
+async def eventos_cliente(request):
+    """
+    GET /api/cliente/eventos/?token=<access>
+    Server-Sent Events con los cambios de estado y progreso de los
+    servicios del cliente (evento "servicio"), en lugar de consultar
+    periódicamente servicios/ y progreso/. Al reconectar conviene volver a
+    leer el estado una vez: los eventos perdidos no se reenvían. Cuando el
+    token expira o se revoca llega un evento "cierre" y el stream termina.
+    """
+    try:
+        # Sin cache de revocación compartida, autenticar lee el usuario
+        autenticado = await sync_to_async(JWTQueryStringAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        autenticado = None
+    if autenticado is None:
+        return JsonResponse({'error': 'Token inválido o ausente'}, status=401)
+
+    usuario, token = autenticado
+    # Para tokens emitidos antes de incluir el rol, lee el TipoUsuario
+    if await sync_to_async(rol_del_usuario)(usuario, token) != 'CLIENTE':
+        return JsonResponse({'error': 'Solo disponible para clientes'}, status=403)
+
+    response = StreamingHttpResponse(_stream(usuario.pk, token), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
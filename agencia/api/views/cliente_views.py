@@ -3,6 +3,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from users.api.authentication import JWTSinConsultaAuthentication
 from agencia.models import (
     Vehiculo, Solicitud, Reservacion, 
     ServicioReservado, ProgresoServicio
@@ -13,7 +14,12 @@ from ..serializers import (
     ReservacionSerializer, ServicioReservadoSerializer,
     ProgresoServicioSerializer
 )
+from .common_views import CambiosView
+from ..condicional import VersionETagMixin, etag_version, guardar_condicional
 from ..permissions import IsCliente
+from ..querysets import (
+    solicitudes_detalladas, reservaciones_detalladas, servicios_detallados
+)
 
 
 # ==========================================
@@ -29,7 +35,9 @@ class VehiculoClienteListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         # Solo los vehículos del cliente actual
-        return Vehiculo.objects.filter(id_usuario_propietario=self.request.user)
+        return Vehiculo.objects.filter(id_usuario_propietario=self.request.user.id).select_related(
+            'id_modelo', 'id_modelo__id_marca', 'id_usuario_propietario'
+        )
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -38,7 +46,7 @@ class VehiculoClienteListCreateView(generics.ListCreateAPIView):
     
     def perform_create(self, serializer):
         # Asignar automáticamente el propietario
-        serializer.save(id_usuario_propietario=self.request.user)
+        serializer.save(id_usuario_propietario_id=self.request.user.id)
 
 
 class VehiculoClienteDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -53,7 +61,9 @@ class VehiculoClienteDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         # Solo puede ver/editar sus propios vehículos
-        return Vehiculo.objects.filter(id_usuario_propietario=self.request.user)
+        return Vehiculo.objects.filter(id_usuario_propietario=self.request.user.id).select_related(
+            'id_modelo', 'id_modelo__id_marca', 'id_usuario_propietario'
+        )
 
 
 # ==========================================
@@ -69,9 +79,9 @@ class SolicitudClienteListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         # Solicitudes del cliente actual
-        return Solicitud.objects.filter(id_usuario=self.request.user).select_related(
-            'id_vehiculo', 'id_vehiculo__id_modelo', 'id_vehiculo__id_modelo__id_marca'
-        ).prefetch_related('detalles', 'reservaciones')
+        return solicitudes_detalladas(
+            Solicitud.objects.filter(id_usuario=self.request.user.id)
+        )
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -80,22 +90,22 @@ class SolicitudClienteListCreateView(generics.ListCreateAPIView):
     
     def perform_create(self, serializer):
         # Asignar automáticamente el usuario
-        serializer.save(id_usuario=self.request.user)
+        serializer.save(id_usuario_id=self.request.user.id)
 
 
-class SolicitudClienteDetailView(generics.RetrieveUpdateAPIView):
+class SolicitudClienteDetailView(VersionETagMixin, generics.RetrieveUpdateAPIView):
     """
-    GET /api/cliente/solicitudes/{id}/
+    GET /api/cliente/solicitudes/{id}/ (ETag; If-None-Match → 304)
     PUT /api/cliente/solicitudes/{id}/
-    PATCH /api/cliente/solicitudes/{id}/
+    PATCH /api/cliente/solicitudes/{id}/ (If-Match → 412 si cambió)
     """
     serializer_class = SolicitudSerializer
     permission_classes = [IsAuthenticated, IsCliente]
     
     def get_queryset(self):
-        return Solicitud.objects.filter(id_usuario=self.request.user).select_related(
-            'id_vehiculo', 'id_vehiculo__id_modelo'
-        ).prefetch_related('detalles', 'reservaciones')
+        return solicitudes_detalladas(
+            Solicitud.objects.filter(id_usuario=self.request.user.id)
+        )
 
 
 # ==========================================
@@ -107,26 +117,28 @@ class ReservacionClienteListView(generics.ListAPIView):
     GET /api/cliente/reservaciones/
     """
     serializer_class = ReservacionSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsCliente]
     
     def get_queryset(self):
         # Reservaciones de las solicitudes del cliente
-        return Reservacion.objects.filter(
-            id_solicitud__id_usuario=self.request.user
-        ).select_related('id_solicitud', 'id_solicitud__id_vehiculo').order_by('-fecha')
+        return reservaciones_detalladas(
+            Reservacion.objects.filter(id_solicitud__id_usuario=self.request.user.id)
+        ).order_by('-fecha')
 
 
-class ReservacionClienteDetailView(generics.RetrieveAPIView):
+class ReservacionClienteDetailView(VersionETagMixin, generics.RetrieveAPIView):
     """
-    GET /api/cliente/reservaciones/{id}/
+    GET /api/cliente/reservaciones/{id}/ (ETag; If-None-Match → 304)
     """
     serializer_class = ReservacionSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsCliente]
     
     def get_queryset(self):
-        return Reservacion.objects.filter(
-            id_solicitud__id_usuario=self.request.user
-        ).select_related('id_solicitud').prefetch_related('servicios_reservados')
+        return reservaciones_detalladas(
+            Reservacion.objects.filter(id_solicitud__id_usuario=self.request.user.id)
+        )
 
 
 class CancelarReservacionView(APIView):
@@ -137,9 +149,9 @@ class CancelarReservacionView(APIView):
     
     def put(self, request, pk):
         reservacion = get_object_or_404(
-            Reservacion, 
-            pk=pk, 
-            id_solicitud__id_usuario=request.user
+            reservaciones_detalladas(),
+            pk=pk,
+            id_solicitud__id_usuario=request.user.id
         )
         
         # Solo se puede cancelar si está pendiente
@@ -150,10 +162,10 @@ class CancelarReservacionView(APIView):
             )
         
         reservacion.estado_global = 'cancelada'
-        reservacion.save()
+        guardar_condicional(request, reservacion)
         
         serializer = ReservacionSerializer(reservacion)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag_version(reservacion.version)})
 
 
 # ==========================================
@@ -165,14 +177,17 @@ class ServiciosReservacionView(generics.ListAPIView):
     GET /api/cliente/reservaciones/{reservacion_id}/servicios/
     """
     serializer_class = ServicioReservadoSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsCliente]
     
     def get_queryset(self):
         reservacion_id = self.kwargs.get('reservacion_id')
-        return ServicioReservado.objects.filter(
-            id_reservacion_id=reservacion_id,
-            id_reservacion__id_solicitud__id_usuario=self.request.user
-        ).select_related('id_servicio', 'id_usuario_taller')
+        return servicios_detallados(
+            ServicioReservado.objects.filter(
+                id_reservacion_id=reservacion_id,
+                id_reservacion__id_solicitud__id_usuario=self.request.user.id
+            )
+        )
 
 
 class ProgresoServicioView(generics.ListAPIView):
@@ -180,11 +195,36 @@ class ProgresoServicioView(generics.ListAPIView):
     GET /api/cliente/servicios/{servicio_id}/progreso/
     """
     serializer_class = ProgresoServicioSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsCliente]
     
     def get_queryset(self):
         servicio_id = self.kwargs.get('servicio_id')
         return ProgresoServicio.objects.filter(
             id_serv_res_id=servicio_id,
-            id_serv_res__id_reservacion__id_solicitud__id_usuario=self.request.user
-        ).order_by('-fecha')
\ No newline at end of file
+            id_serv_res__id_reservacion__id_solicitud__id_usuario=self.request.user.id
+        ).select_related('id_serv_res__id_servicio').order_by('-fecha')
+
+
+# ==========================================
+# SINCRONIZACIÓN
+# ==========================================
+
+class CambiosClienteView(CambiosView):
+    """
+    GET /api/cliente/cambios/?cursor=N
+    Solicitudes, reservaciones, servicios y progresos del cliente
+    """
+    permission_classes = [IsAuthenticated, IsCliente]
+    campo_dueno = 'id_cliente'
+
+    colecciones = {
+        'solicitud': ('solicitudes', solicitudes_detalladas(), SolicitudSerializer),
+        'reservacion': ('reservaciones', reservaciones_detalladas(), ReservacionSerializer),
+        'servicio': ('servicios', servicios_detallados(), ServicioReservadoSerializer),
+        'progreso': (
+            'progresos',
+            ProgresoServicio.objects.select_related('id_serv_res__id_servicio'),
+            ProgresoServicioSerializer,
+        ),
+    }
@@ -1,37 +1,143 @@
-from rest_framework import generics
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from agencia.cache_catalogo import version_catalogo, obtener_respuesta, guardar_respuesta
+from agencia.cambios import cursor_vigente, leer_cambios, ruta_dueno, ultimo_cursor
 from agencia.models import Marca, Modelo, ServicioTaller
+from users.api.authentication import JWTSinConsultaAuthentication
 from ..serializers import MarcaSerializer, ModeloSerializer, ServicioTallerSerializer
 
 
-class MarcaListView(generics.ListAPIView):
+class CatalogoEnCacheMixin:
+    """
+    Listado de catálogo servido desde cache bajo la versión vigente.
+    Responde 304 a peticiones condicionales (If-None-Match /
+    If-Modified-Since) sin serializar, con solo la lectura de la versión.
+    """
+
+    def list(self, request, *args, **kwargs):
+        version = version_catalogo()
+        modificado = version // 1_000_000_000
+        response = Response()
+        response['ETag'] = f'W/"catalogo-{version}"'
+        response['Last-Modified'] = http_date(modificado)
+        # El cliente puede guardar el cuerpo pero debe revalidar cada vez
+        response['Cache-Control'] = 'private, no-cache'
+
+        condicional = get_conditional_response(
+            request, etag=response['ETag'], last_modified=modificado, response=response
+        )
+        if condicional is not response:
+            return condicional
+
+        # La URL completa incluye la página y el host de los enlaces next/previous
+        url = request.build_absolute_uri()
+        datos = obtener_respuesta(version, url)
+        if datos is None:
+            datos = super().list(request, *args, **kwargs).data
+            guardar_respuesta(version, url, datos)
+        response.data = datos
+        return response
+
+
+class MarcaListView(CatalogoEnCacheMixin, generics.ListAPIView):
     """
     GET /api/marcas/
     Listar todas las marcas disponibles
     """
     queryset = Marca.objects.all()
     serializer_class = MarcaSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated]
 
 
-class ModelosPorMarcaView(generics.ListAPIView):
+class ModelosPorMarcaView(CatalogoEnCacheMixin, generics.ListAPIView):
     """
     GET /api/marcas/{id}/modelos/
     Listar modelos de una marca específica
     """
     serializer_class = ModeloSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         marca_id = self.kwargs.get('pk')
-        return Modelo.objects.filter(id_marca_id=marca_id)
+        return Modelo.objects.filter(id_marca_id=marca_id).select_related('id_marca')
 
 
-class ServicioTallerListView(generics.ListAPIView):
+class ServicioTallerListView(CatalogoEnCacheMixin, generics.ListAPIView):
     """
     GET /api/servicios-taller/
     Listar todos los servicios que ofrece el taller
     """
     queryset = ServicioTaller.objects.filter(activo=True)
     serializer_class = ServicioTallerSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    authentication_classes = [JWTSinConsultaAuthentication]
+    permission_classes = [IsAuthenticated]
+
+
+# ==========================================
+# SINCRONIZACIÓN INCREMENTAL
+# ==========================================
+
+class CambiosView(APIView):
+    """
+    Cambios desde un cursor de la bitácora (agencia.cambios), por rol.
+
+    Sin ?cursor solo devuelve el cursor actual: la app hace la carga
+    completa con los listados y guarda ese valor. Con ?cursor=N devuelve
+    los registros creados o modificados después de N, ya serializados
+    como en los listados, y en "bajas" los ids borrados o que dejaron de
+    ser del usuario. Si "mas" es true se vuelve a pedir con el cursor nuevo.
+    Sin cambios la respuesta es solo {"cursor": N, "mas": false}.
+    """
+    authentication_classes = [JWTSinConsultaAuthentication]
+    campo_dueno = None
+    # {modelo en la bitácora: (clave, queryset, serializer)}. El queryset se
+    # limita a lo del usuario por la ruta de agencia.cambios.RUTAS
+    colecciones = {}
+
+    def get(self, request):
+        valor = request.query_params.get('cursor')
+        if not valor:
+            return Response({'cursor': ultimo_cursor(), 'mas': False})
+        try:
+            cursor = int(valor)
+            if cursor < 0:
+                raise ValueError
+        except ValueError:
+            raise NotFound('Cursor inválido')
+        if not cursor_vigente(cursor):
+            return Response(
+                {'error': 'El cursor es anterior a la bitácora vigente; sincroniza de nuevo'},
+                status=status.HTTP_410_GONE
+            )
+
+        nuevo, hay_mas, vigentes, bajas = leer_cambios(self.campo_dueno, request.user.id, cursor)
+        colecciones = self.colecciones
+        datos = {'cursor': nuevo, 'mas': hay_mas}
+        eliminados = {}
+        for modelo, pks in vigentes.items():
+            if modelo not in colecciones:
+                continue
+            clave, queryset, serializer_class = colecciones[modelo]
+            propios = queryset.filter(
+                pk__in=pks, **{ruta_dueno(queryset.model, self.campo_dueno): request.user.id}
+            )
+            filas = serializer_class(propios, many=True, context={'request': request}).data
+            if filas:
+                datos[clave] = filas
+            # Ya no visibles para este usuario (p. ej. reasignados)
+            faltantes = set(pks) - {fila['id'] for fila in filas}
+            if faltantes:
+                eliminados[clave] = sorted(faltantes)
+        for modelo, pks in bajas.items():
+            if modelo in colecciones:
+                eliminados.setdefault(colecciones[modelo][0], []).extend(pks)
+        if eliminados:
+            datos['bajas'] = eliminados
+        return Response(datos)
@@ -2,15 +2,30 @@ from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from users.api.authentication import JWTSinConsultaAuthentication
+from agencia.avance import reflejar_lote, reflejar_servicio
+from agencia.cambios import registrar_instancia
+from agencia.estados import TRANSICIONES_SERVICIO, cambiar_estado_lote
+from agencia.eventos import datos_servicio, publicar_servicio
 from agencia.models import (
-    ServicioReservado, ProgresoServicio, Reservacion
+    ConflictoVersion, ServicioReservado, ProgresoServicio, Reservacion
 )
+from agencia.progreso import AvanceRetrocede, estado_por_avance, preparar_avance
 from ..serializers import (
     ServicioReservadoSerializer, ProgresoServicioSerializer,
-    ReservacionSerializer
+    ReservacionSerializer, EstadoServicioLoteSerializer,
 )
+from .common_views import CambiosView
+from ..condicional import (
+    AvanceRetrocedido, TransicionNoPermitida, VersionETagMixin, etag_version,
+    guardar_condicional,
+)
+from ..pagination import ServicioReservadoKeysetPagination
 from ..permissions import IsTaller
+from ..querysets import reservaciones_detalladas, servicios_detallados
 
 
 # ==========================================
@@ -19,59 +34,131 @@ from ..permissions import IsTaller
 
 class MisServiciosListView(generics.ListAPIView):
     """
-    GET /api/taller/mis-servicios/
+    GET /api/taller/mis-servicios/?cursor=...
+    GET /api/taller/mis-servicios/?page=N&ordering=... (paginación anterior)
+    Con cursor el orden es fijo (más reciente primero): ?ordering= sin
+    ?page=N → 400.
     """
     serializer_class = ServicioReservadoSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsTaller]
+    pagination_class = ServicioReservadoKeysetPagination
     
     def get_queryset(self):
         # Solo los servicios asignados al técnico actual
-        return ServicioReservado.objects.filter(
-            id_usuario_taller=self.request.user
-        ).select_related(
-            'id_servicio', 'id_reservacion', 'id_reservacion__id_solicitud'
-        ).order_by('-creado_at')
+        return servicios_detallados(
+            ServicioReservado.objects.filter(id_usuario_taller=self.request.user.id)
+        ).order_by('-creado_at', '-id')
 
 
-class MiServicioDetailView(generics.RetrieveAPIView):
+class MiServicioDetailView(VersionETagMixin, generics.RetrieveAPIView):
     """
-    GET /api/taller/mis-servicios/{id}/
+    GET /api/taller/mis-servicios/{id}/ (ETag; If-None-Match → 304)
     """
     serializer_class = ServicioReservadoSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsTaller]
     
     def get_queryset(self):
-        return ServicioReservado.objects.filter(
-            id_usuario_taller=self.request.user
-        ).select_related('id_servicio', 'id_reservacion').prefetch_related('progresos')
+        return servicios_detallados(
+            ServicioReservado.objects.filter(id_usuario_taller=self.request.user.id)
+        )
 
 
 class CambiarEstadoServicioView(APIView):
     """
     PATCH /api/taller/mis-servicios/{id}/estado/
     Body: {"estado": "en_progreso", "avance_porcentaje": 50}
+    Solo escribe las columnas recibidas. Un estado desconocido responde
+    400; una transición no permitida (agencia.estados) o, con
+    PROGRESO_MONOTONO, un avance menor al guardado, 409.
     """
     permission_classes = [IsAuthenticated, IsTaller]
     
     def patch(self, request, pk):
-        servicio = get_object_or_404(
-            ServicioReservado, 
-            pk=pk, 
-            id_usuario_taller=request.user
-        )
-        
-        nuevo_estado = request.data.get('estado')
+        nuevo_estado = request.data.get('estado') or None
+        if nuevo_estado is not None and nuevo_estado not in TRANSICIONES_SERVICIO:
+            return Response(
+                {'error': f'Estado inválido. Opciones: {", ".join(TRANSICIONES_SERVICIO)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         avance = request.data.get('avance_porcentaje')
-        
-        if nuevo_estado:
-            servicio.estado = nuevo_estado
         if avance is not None:
-            servicio.avance_porcentaje = avance
+            # Entra en la suma de avance de la reservación: solo 0-100
+            try:
+                avance = int(avance)
+            except (TypeError, ValueError):
+                avance = None
+            if avance is None or not 0 <= avance <= 100:
+                return Response(
+                    {'error': 'avance_porcentaje debe ser un entero entre 0 y 100'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        servicio.save()
+        # El servicio y el avance de su reservación, juntos; la fila queda
+        # bloqueada desde la lectura para que el delta sea el vigente
+        with transaction.atomic():
+            servicio = get_object_or_404(
+                servicios_detallados().select_for_update(of=('self',)),
+                pk=pk,
+                id_usuario_taller=request.user.id
+            )
+            antes = (servicio.avance_porcentaje, servicio.estado)
+            # Mismas transiciones que el cambio por lote
+            if nuevo_estado not in (None, servicio.estado, *TRANSICIONES_SERVICIO[servicio.estado]):
+                return Response(
+                    {'error': f'Transición no permitida: {servicio.estado} → {nuevo_estado}'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            try:
+                campos = preparar_avance(servicio, avance=avance, estado=nuevo_estado)
+            except AvanceRetrocede as error:
+                raise AvanceRetrocedido(str(error))
+            guardar_condicional(request, servicio, update_fields=campos)
+            reflejar_servicio(servicio, *antes)
+        publicar_servicio(servicio.id_reservacion.id_solicitud.id_usuario_id, datos_servicio(servicio))
         
         serializer = ServicioReservadoSerializer(servicio)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag_version(servicio.version)})
+
+
+class CambiarEstadoServicioLoteView(APIView):
+    """
+    PATCH /api/taller/mis-servicios/estado/
+    Body: {"ids": [1, 2, 3], "estado": "completado"}
+    Solo servicios asignados al técnico y transiciones permitidas
+    (agencia.estados); un resultado por id.
+    """
+    permission_classes = [IsAuthenticated, IsTaller]
+    
+    def patch(self, request):
+        entrada = EstadoServicioLoteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        destino = entrada.validated_data['estado']
+        
+        with transaction.atomic():
+            resultados, actualizados = cambiar_estado_lote(
+                ServicioReservado.objects.filter(id_usuario_taller=request.user.id),
+                'estado', entrada.validated_data['ids'], destino, TRANSICIONES_SERVICIO
+            )
+            cambios = list(ServicioReservado.objects.filter(pk__in=actualizados).values(
+                'pk', 'id_reservacion', 'estado', 'avance_porcentaje', 'version',
+                cliente=F('id_reservacion__id_solicitud__id_usuario'),
+            )) if actualizados else []
+            reflejar_lote([(cambio['id_reservacion'], cambio['cliente']) for cambio in cambios], destino)
+        for cambio in cambios:
+            publicar_servicio(cambio['cliente'], {
+                'id_serv_res': cambio['pk'],
+                'id_reservacion': cambio['id_reservacion'],
+                'estado': cambio['estado'],
+                'avance_porcentaje': cambio['avance_porcentaje'],
+                'version': cambio['version'],
+            })
+        return Response({
+            'estado': destino,
+            'actualizados': len(actualizados),
+            'resultados': resultados,
+        })
 
 
 # ==========================================
@@ -86,27 +173,50 @@ class CrearProgresoServicioView(generics.CreateAPIView):
         "comentario": "Filtro de aceite cambiado",
         "evidencia_url": "https://..."
     }
+    Sin porcentaje solo se anota el comentario. Un porcentaje que cambiaría
+    el estado fuera de las transiciones permitidas (reabrir un servicio
+    completado) responde 409, igual que con PROGRESO_MONOTONO un
+    porcentaje menor al avance guardado.
     """
     serializer_class = ProgresoServicioSerializer
     permission_classes = [IsAuthenticated, IsTaller]
     
     def perform_create(self, serializer):
         servicio_id = self.kwargs.get('servicio_id')
-        servicio = get_object_or_404(
-            ServicioReservado, 
-            pk=servicio_id,
-            id_usuario_taller=self.request.user
-        )
-        
-        progreso = serializer.save(id_serv_res=servicio)
         
-        # Actualizar el avance del servicio
-        servicio.avance_porcentaje = progreso.porcentaje
-        if progreso.porcentaje == 100:
-            servicio.estado = 'completado'
-        elif progreso.porcentaje > 0:
-            servicio.estado = 'en_progreso'
-        servicio.save()
+        with transaction.atomic():
+            # Bloqueada desde la lectura: dos técnicos (o un reintento) no
+            # intercalan su lectura y su escritura
+            servicio = get_object_or_404(
+                ServicioReservado.objects.select_related('id_reservacion__id_solicitud')
+                .select_for_update(of=('self',)),
+                pk=servicio_id,
+                id_usuario_taller=self.request.user.id
+            )
+            antes = (servicio.avance_porcentaje, servicio.estado)
+            porcentaje = serializer.validated_data.get('porcentaje')
+            estado = None if porcentaje is None else estado_por_avance(porcentaje, servicio.estado)
+            # Mismas transiciones que el cambio de estado: un avance menor
+            # no reabre un servicio completado
+            if estado not in (None, servicio.estado, *TRANSICIONES_SERVICIO[servicio.estado]):
+                raise TransicionNoPermitida(f'Transición no permitida: {servicio.estado} → {estado}')
+            progreso = serializer.save(id_serv_res=servicio)
+            
+            # Actualizar el avance del servicio y el de su reservación
+            try:
+                campos = preparar_avance(
+                    servicio, avance=porcentaje, estado=estado, ultimo_progreso=progreso,
+                )
+                servicio.save(update_fields=campos)
+            except AvanceRetrocede as error:
+                raise AvanceRetrocedido(str(error))
+            except ConflictoVersion:
+                # El WHERE monótono falló: otro avance mayor ganó la carrera
+                raise AvanceRetrocedido()
+            reflejar_servicio(servicio, *antes)
+        publicar_servicio(
+            servicio.id_reservacion.id_solicitud.id_usuario_id, datos_servicio(servicio, progreso)
+        )
 
 
 class ListarProgresoServicioView(generics.ListAPIView):
@@ -114,14 +224,15 @@ class ListarProgresoServicioView(generics.ListAPIView):
     GET /api/taller/servicios/{servicio_id}/progreso/listar/
     """
     serializer_class = ProgresoServicioSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsTaller]
     
     def get_queryset(self):
         servicio_id = self.kwargs.get('servicio_id')
         return ProgresoServicio.objects.filter(
             id_serv_res_id=servicio_id,
-            id_serv_res__id_usuario_taller=self.request.user
-        ).order_by('-fecha')
+            id_serv_res__id_usuario_taller=self.request.user.id
+        ).select_related('id_serv_res__id_servicio').order_by('-fecha')
 
 
 class ActualizarProgresoServicioView(generics.RetrieveUpdateAPIView):
@@ -137,8 +248,38 @@ class ActualizarProgresoServicioView(generics.RetrieveUpdateAPIView):
         servicio_id = self.kwargs.get('servicio_id')
         return ProgresoServicio.objects.filter(
             id_serv_res_id=servicio_id,
-            id_serv_res__id_usuario_taller=self.request.user
-        )
+            id_serv_res__id_usuario_taller=self.request.user.id
+        ).select_related('id_serv_res__id_servicio', 'id_serv_res__id_reservacion__id_solicitud')
+    
+    def perform_update(self, serializer):
+        progreso = serializer.save()
+        # Mantener vigente el apuntador al último progreso del servicio
+        ServicioReservado.objects.filter(
+            pk=progreso.id_serv_res_id
+        ).actualizar_ultimo_progreso()
+        registrar_instancia(progreso.id_serv_res, 'cambio')
+
+
+# ==========================================
+# SINCRONIZACIÓN
+# ==========================================
+
+class CambiosTallerView(CambiosView):
+    """
+    GET /api/taller/cambios/?cursor=N
+    Servicios asignados al técnico y sus progresos
+    """
+    permission_classes = [IsAuthenticated, IsTaller]
+    campo_dueno = 'id_tecnico'
+
+    colecciones = {
+        'servicio': ('servicios', servicios_detallados(), ServicioReservadoSerializer),
+        'progreso': (
+            'progresos',
+            ProgresoServicio.objects.select_related('id_serv_res__id_servicio'),
+            ProgresoServicioSerializer,
+        ),
+    }
 
 
 # ==========================================
@@ -150,13 +291,18 @@ class ReservacionTallerDetailView(generics.RetrieveAPIView):
     GET /api/taller/reservaciones/{id}/
     """
     serializer_class = ReservacionSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsTaller]
     
     def get_queryset(self):
         # Solo reservaciones donde el técnico tiene servicios asignados
-        return Reservacion.objects.filter(
-            servicios_reservados__id_usuario_taller=self.request.user
-        ).distinct().select_related('id_solicitud')
+        # (subconsulta en lugar de join + distinct)
+        asignadas = ServicioReservado.objects.filter(
+            id_usuario_taller=self.request.user.id
+        ).values('id_reservacion')
+        return reservaciones_detalladas(
+            Reservacion.objects.filter(pk__in=asignadas)
+        )
 
 
 class ServicioDetalleView(generics.RetrieveAPIView):
@@ -164,13 +310,10 @@ class ServicioDetalleView(generics.RetrieveAPIView):
     GET /api/taller/servicios/{id}/detalle/
     """
     serializer_class = ServicioReservadoSerializer
+    authentication_classes = [JWTSinConsultaAuthentication]
     permission_classes = [IsAuthenticated, IsTaller]
     
     def get_queryset(self):
-        return ServicioReservado.objects.filter(
-            id_usuario_taller=self.request.user
-        ).select_related(
-            'id_servicio', 
-            'id_reservacion',
-            'id_reservacion__id_solicitud__id_vehiculo'
-        ).prefetch_related('progresos')
\ No newline at end of file
+        return servicios_detallados(
+            ServicioReservado.objects.filter(id_usuario_taller=self.request.user.id)
+        )
\ No newline at end of file
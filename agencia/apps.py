@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AgenciaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agencia'
+
+    def ready(self):
+        from agencia import signals  # noqa: F401
@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.db.models import Case, Value, When
+
+from agencia.cambios import registrar, registrar_instancias
+from agencia.models import Reservacion
+
+
+def reflejar_servicio(servicio, avance_anterior, estado_anterior):
+    """
+    Lleva a la reservación el cambio de un servicio ya guardado con un
+    UPDATE relativo (ReservacionQuerySet.acumular_servicios) y lo anota en
+    la bitácora. Va en la misma transacción que el save() del servicio.
+    """
+    avance = servicio.avance_porcentaje - avance_anterior
+    completados = (servicio.estado == 'completado') - (estado_anterior == 'completado')
+    if not avance and not completados and servicio.estado == estado_anterior:
+        return
+    Reservacion.objects.filter(pk=servicio.id_reservacion_id).acumular_servicios(
+        avance=avance, completados=completados, iniciado=servicio.estado != 'pendiente'
+    )
+    registrar_instancias([servicio.id_reservacion], 'cambio')
+
+
+def reflejar_lote(reservaciones, destino):
+    """
+    Servicios que pasaron a `destino` por lote, uno por par
+    (id_reservacion, cliente): un UPDATE para todas sus reservaciones y un
+    INSERT en la bitácora.
+    """
+    por_reservacion = Counter(reservacion for reservacion, _ in reservaciones)
+    if not por_reservacion:
+        return
+    completados = 0
+    if destino == 'completado':
+        # Ninguna transición sale de completado: todos son nuevos
+        completados = Case(
+            *[When(pk=pk, then=Value(n)) for pk, n in por_reservacion.items()],
+            default=Value(0),
+        )
+    Reservacion.objects.filter(pk__in=por_reservacion).acumular_servicios(
+        completados=completados, iniciado=True
+    )
+    registrar(Reservacion, list(por_reservacion), clientes=dict(reservaciones))
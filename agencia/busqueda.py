@@ -0,0 +1,103 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+
+# Palabras de la consulta que se usan y coincidencias, de las más recientes,
+# que se ordenan por relevancia (sobrescribibles en settings)
+TERMINOS_MAX = getattr(settings, 'BUSQUEDA_TERMINOS_MAX', 8)
+CANDIDATOS = getattr(settings, 'BUSQUEDA_CANDIDATOS', 2000)
+
+TIPOS = ('solicitud', 'vehiculo', 'cliente')
+
+# Una palabra más corta no se busca como prefijo: "a*" recorrería buena
+# parte del vocabulario
+PREFIJO_MIN = 2
+
+# Marcas de la coincidencia en el fragmento (texto plano, no HTML)
+MARCA_INICIO, MARCA_FIN = '[', ']'
+
+
+def disponible():
+    """El índice (migración 0008) existe solo en SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def consulta_fts(texto):
+    """
+    'Revisión ABC-12' -> '"Revisión"* "ABC"* "12"*': cada palabra como
+    prefijo y todas requeridas. Las comillas impiden que la entrada use la
+    sintaxis de FTS5 (operadores, columnas, paréntesis). '' si no hay
+    palabras.
+    """
+    terminos = re.findall(r'\w+', texto)[:TERMINOS_MAX]
+    return ' '.join(
+        f'"{termino}"*' if len(termino) >= PREFIJO_MIN else f'"{termino}"' for termino in terminos
+    )
+
+
+def buscar(texto, tipo=None, limite=20, desplazamiento=0):
+    """
+    Coincidencias de `texto` en solicitudes (descripción y observaciones),
+    vehículos (placa y color) y clientes (nombre y email), de la más a la
+    menos relevante. El índice lo mantienen triggers, así que no se recorren
+    las tablas.
+
+    bm25 se calcula por coincidencia: para que una palabra frecuente no
+    cueste lo mismo que ordenar toda la tabla, solo se ordenan las
+    CANDIDATOS coincidencias más recientes (FTS5 las entrega en orden de
+    rowid sin ordenar). Los fragmentos se arman después, solo para la
+    página.
+
+    Devuelve (resultados, truncado); truncado es True si hubo más
+    coincidencias que CANDIDATOS y las más antiguas no se ordenaron.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return [], False
+    filtro, parametros = '', [consulta]
+    if tipo is not None:
+        filtro = 'AND tipo = %s'
+        parametros.append(tipo)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id, tipo, titulo, relevancia, coincidencias FROM (
+                -- Una coincidencia de más para saber si hubo recorte
+                SELECT *, COUNT(*) OVER () AS coincidencias,
+                       ROW_NUMBER() OVER (ORDER BY id DESC) AS n
+                FROM (
+                    SELECT rowid AS id, tipo, titulo, rank AS relevancia FROM agencia_busqueda
+                    WHERE agencia_busqueda MATCH %s {filtro}
+                    ORDER BY rowid DESC LIMIT %s
+                )
+            )
+            WHERE n <= %s
+            ORDER BY relevancia, id DESC
+            LIMIT %s OFFSET %s
+            """,
+            [*parametros, CANDIDATOS + 1, CANDIDATOS, limite, desplazamiento],
+        )
+        filas = cursor.fetchall()
+        if not filas:
+            return [], False
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet(agencia_busqueda, -1, %s, %s, '…', 12) FROM agencia_busqueda
+            WHERE agencia_busqueda MATCH %s AND rowid IN ({', '.join(['%s'] * len(filas))})
+            """,
+            [MARCA_INICIO, MARCA_FIN, consulta, *(fila[0] for fila in filas)],
+        )
+        fragmentos = dict(cursor.fetchall())
+    resultados = [
+        {
+            # El rowid codifica id * 4 + tipo (migración 0008)
+            'tipo': tipo, 'id': rowid // 4, 'titulo': titulo, 'fragmento': fragmentos.get(rowid, ''),
+            # rank (bm25 con los pesos de la migración) es negativo: más
+            # bajo, más relevante
+            'relevancia': round(-rank, 4),
+        }
+        for rowid, tipo, titulo, rank, _ in filas
+    ]
+    return resultados, filas[0][4] > CANDIDATOS
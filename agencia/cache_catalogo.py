@@ -0,0 +1,66 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from agencia.models import VersionCatalogo
+
+
+# Alias de cache para las respuestas serializadas. Puede ser local a cada
+# proceso: la clave lleva la versión, que se lee de la base de datos.
+CACHE_ALIAS = getattr(settings, 'CATALOGO_CACHE', 'default')
+
+# Las respuestas guardadas no necesitan vencer: cambiar la versión las
+# deja inalcanzables. El timeout solo limita cuánto ocupan las viejas.
+TIMEOUT = getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 60 * 60 * 24)
+
+PREFIJO = 'catalogo:respuesta:'
+
+# pk de la fila única de VersionCatalogo (migración 0012)
+FILA_VERSION = 1
+
+
+def version_catalogo():
+    """
+    Versión vigente de los catálogos (marcas, modelos, servicios del taller):
+    una consulta por clave primaria, igual para todos los procesos. Es el
+    instante del último cambio en nanosegundos, así que también sirve para
+    Last-Modified.
+    """
+    version = VersionCatalogo.objects.filter(pk=FILA_VERSION).values_list('version', flat=True).first()
+    if version is None:
+        version = VersionCatalogo.objects.get_or_create(
+            pk=FILA_VERSION, defaults={'version': time.time_ns()}
+        )[0].version
+    return version
+
+
+def invalidar_catalogo():
+    """
+    Cambia la versión en la misma transacción que el cambio del catálogo:
+    los demás procesos ven la nueva cuando los datos ya están confirmados,
+    y una lectura que vio los datos anteriores los guarda bajo la anterior.
+    Nunca retrocede aunque el reloj de otro servidor vaya atrasado.
+    """
+    ahora = time.time_ns()
+    actualizadas = VersionCatalogo.objects.filter(pk=FILA_VERSION).update(
+        version=Greatest(F('version') + 1, Value(ahora))
+    )
+    if not actualizadas:
+        VersionCatalogo.objects.get_or_create(pk=FILA_VERSION, defaults={'version': ahora})
+
+
+def clave_respuesta(version, url):
+    resumen = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f'{PREFIJO}{version}:{resumen}'
+
+
+def obtener_respuesta(version, url):
+    return caches[CACHE_ALIAS].get(clave_respuesta(version, url))
+
+
+def guardar_respuesta(version, url, datos):
+    caches[CACHE_ALIAS].set(clave_respuesta(version, url), datos, timeout=TIMEOUT)
@@ -0,0 +1,178 @@
+from django.conf import settings
+from django.db.models import F, Max, Min
+
+from agencia.models import (
+    RegistroCambio, Solicitud, Reservacion, ServicioReservado, ProgresoServicio
+)
+
+
+# Registros por respuesta de cambios/ (sobrescribible en settings)
+LIMITE = getattr(settings, 'CAMBIOS_LIMITE', 500)
+
+# Nombre en la bitácora y rutas a los dueños (cliente, técnico)
+RUTAS = {
+    Solicitud: ('solicitud', 'id_usuario', None),
+    Reservacion: ('reservacion', 'id_solicitud__id_usuario', None),
+    ServicioReservado: (
+        'servicio', 'id_reservacion__id_solicitud__id_usuario', 'id_usuario_taller'
+    ),
+    ProgresoServicio: (
+        'progreso', 'id_serv_res__id_reservacion__id_solicitud__id_usuario',
+        'id_serv_res__id_usuario_taller',
+    ),
+}
+
+# Campos de RegistroCambio con el dueño, en el orden de las rutas
+CAMPOS_DUENO = ('id_cliente', 'id_tecnico')
+
+_SIN_CACHE = object()
+
+
+def ruta_dueno(modelo, campo_dueno):
+    """Ruta desde `modelo` hasta el usuario que la bitácora guarda en `campo_dueno`"""
+    return RUTAS[modelo][1 + CAMPOS_DUENO.index(campo_dueno)]
+
+
+# ==========================================
+# REGISTRO
+# ==========================================
+
+def _dueno_en_memoria(instancia, ruta):
+    """Sigue la ruta por relaciones ya cargadas; _SIN_CACHE si falta alguna"""
+    if ruta is None:
+        return None
+    *relaciones, ultimo = ruta.split('__')
+    objeto = instancia
+    for nombre in relaciones:
+        if not objeto._meta.get_field(nombre).is_cached(objeto):
+            return _SIN_CACHE
+        objeto = getattr(objeto, nombre)
+        if objeto is None:
+            return None
+    return getattr(objeto, objeto._meta.get_field(ultimo).attname)
+
+
+def registrar_instancias(instancias, operacion):
+    """
+    Un INSERT para todas (pueden ser de distintos modelos); los dueños
+    salen de memoria cuando las relaciones ya están cargadas y, si no, de
+    una lectura por modelo.
+    """
+    filas, sin_cache = [], []
+    for instancia in instancias:
+        nombre, ruta_cliente, ruta_tecnico = RUTAS[type(instancia)]
+        cliente = _dueno_en_memoria(instancia, ruta_cliente)
+        tecnico = _dueno_en_memoria(instancia, ruta_tecnico)
+        if cliente is _SIN_CACHE or tecnico is _SIN_CACHE:
+            sin_cache.append(instancia)
+            continue
+        filas.append(RegistroCambio(
+            modelo=nombre, objeto_id=instancia.pk, operacion=operacion,
+            id_cliente=cliente, id_tecnico=tecnico,
+        ))
+    for modelo in {type(instancia) for instancia in sin_cache}:
+        registrar(
+            modelo, [instancia.pk for instancia in sin_cache if type(instancia) is modelo], operacion
+        )
+    if filas:
+        RegistroCambio.objects.bulk_create(filas)
+
+
+def registrar_instancia(instancia, operacion):
+    registrar_instancias([instancia], operacion)
+
+
+def registrar(modelo, pks, operacion='cambio', clientes=None):
+    """
+    Cambios hechos con update() o bulk_create (sin señales): una lectura
+    de los dueños y un INSERT para todo el lote. Si quien llama ya conoce
+    al cliente de cada pk ({pk: cliente}) y el modelo no tiene técnico,
+    basta el INSERT.
+    """
+    if not pks:
+        return
+    nombre, ruta_cliente, ruta_tecnico = RUTAS[modelo]
+    if clientes is not None and ruta_tecnico is None:
+        filas = [{'pk': pk, 'cliente': clientes[pk]} for pk in pks]
+    else:
+        duenos = {'cliente': F(ruta_cliente)}
+        if ruta_tecnico is not None:
+            duenos['tecnico'] = F(ruta_tecnico)
+        filas = modelo.objects.filter(pk__in=pks).values('pk', **duenos)
+    RegistroCambio.objects.bulk_create([
+        RegistroCambio(
+            modelo=nombre, objeto_id=fila['pk'], operacion=operacion,
+            id_cliente=fila['cliente'], id_tecnico=fila.get('tecnico'),
+        )
+        for fila in filas
+    ])
+
+
+def registrar_reasignacion(servicio, tecnico_anterior):
+    """El técnico anterior debe enterarse de que el servicio ya no es suyo"""
+    if tecnico_anterior is not None and tecnico_anterior != servicio.id_usuario_taller_id:
+        RegistroCambio.objects.create(
+            modelo=RUTAS[ServicioReservado][0], objeto_id=servicio.pk,
+            operacion='cambio', id_tecnico=tecnico_anterior,
+        )
+
+
+def registrar_bajas_para_tecnicos(servicios):
+    """
+    En un borrado en cascada solo el origen registra su baja. Si es una
+    reservación o solicitud no lleva técnico: sin esto los técnicos no se
+    enterarían de que sus servicios (y con ellos sus progresos) ya no
+    existen. Una lectura y un INSERT para todos.
+    """
+    RegistroCambio.objects.bulk_create([
+        RegistroCambio(
+            modelo=RUTAS[ServicioReservado][0], objeto_id=pk,
+            operacion='baja', id_tecnico=tecnico,
+        )
+        for pk, tecnico in servicios.filter(id_usuario_taller__isnull=False)
+        .values_list('pk', 'id_usuario_taller')
+    ])
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+
+def ultimo_cursor():
+    return RegistroCambio.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+
+
+def cursor_vigente(cursor):
+    """False si la depuración ya borró registros posteriores al cursor"""
+    primero = RegistroCambio.objects.aggregate(primero=Min('pk'))['primero']
+    return primero is None or cursor >= primero - 1
+
+
+def leer_cambios(campo_dueno, usuario_id, cursor, limite=None):
+    """
+    Cambios del usuario posteriores al cursor, condensados por registro:
+    solo cuenta la última operación de cada uno. Devuelve
+    (nuevo_cursor, hay_mas, vigentes, bajas) con {modelo: [pks]}.
+
+    El cursor supone que los ids se confirman en orden, como en SQLite
+    (un escritor a la vez); con escrituras concurrentes haría falta un
+    margen para no saltar transacciones que confirman tarde.
+    """
+    limite = limite or LIMITE
+    filas = list(
+        RegistroCambio.objects.filter(**{campo_dueno: usuario_id}, pk__gt=cursor)
+        .order_by('pk').values_list('pk', 'modelo', 'objeto_id', 'operacion')[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    ultima_operacion = {}
+    for _, modelo, objeto_id, operacion in filas:
+        ultima_operacion[(modelo, objeto_id)] = operacion
+    vigentes, bajas = {}, {}
+    for (modelo, objeto_id), operacion in ultima_operacion.items():
+        destino = bajas if operacion == 'baja' else vigentes
+        destino.setdefault(modelo, []).append(objeto_id)
+
+    nuevo_cursor = filas[-1][0] if filas else cursor
+    return nuevo_cursor, hay_mas, vigentes, bajas
@@ -0,0 +1,74 @@
+import heapq
+
+from django.db.models import Count, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from agencia.agenda import DURACION_DEFAULT
+from agencia.estados import ESTADOS_SERVICIO_ABIERTOS
+from users.models import Usuario
+
+
+def tecnicos_con_carga(queryset=None):
+    """
+    Técnicos activos anotados con su carga abierta en una sola consulta
+    agregada: minutos de servicios pendientes o en progreso (según
+    duracion_estimada del servicio) y cuántos son.
+    """
+    if queryset is None:
+        queryset = Usuario.objects.filter(id_tipo__cve='TALLER', is_active=True)
+    abiertos = Q(servicios_asignados__estado__in=ESTADOS_SERVICIO_ABIERTOS)
+    return queryset.annotate(
+        carga_minutos=Coalesce(
+            Sum(
+                Coalesce(
+                    'servicios_asignados__id_servicio__duracion_estimada',
+                    Value(DURACION_DEFAULT),
+                ),
+                filter=abiertos,
+            ),
+            0,
+            output_field=IntegerField(),
+        ),
+        servicios_abiertos=Count('servicios_asignados', filter=abiertos),
+    )
+
+
+class RepartoCarga:
+    """
+    Min-heap de (carga, técnico). Cada asignación toma al técnico menos
+    cargado y le suma la duración del servicio, así un lote completo se
+    reparte en una pasada sin volver a consultar la base de datos.
+
+    La carga vigente de cada técnico vive en un dict. Sumar trabajo a mano
+    empuja una tupla nueva en vez de buscar la anterior; las que ya no
+    coinciden con el dict se descartan al llegar a la cima.
+    """
+
+    def __init__(self, cargas):
+        """cargas: iterable de (tecnico_id, minutos)"""
+        self._cargas = dict(cargas)
+        self._heap = [(minutos, tecnico) for tecnico, minutos in self._cargas.items()]
+        heapq.heapify(self._heap)
+
+    @classmethod
+    def cargar(cls):
+        return cls(tecnicos_con_carga().values_list('pk', 'carga_minutos'))
+
+    def __bool__(self):
+        return bool(self._cargas)
+
+    def asignar(self, minutos):
+        """Técnico menos cargado (desempate por id); su carga crece en `minutos`"""
+        carga, tecnico = self._heap[0]
+        while self._cargas[tecnico] != carga:
+            heapq.heappop(self._heap)
+            carga, tecnico = self._heap[0]
+        self._cargas[tecnico] = carga + minutos
+        heapq.heapreplace(self._heap, (carga + minutos, tecnico))
+        return tecnico
+
+    def sumar(self, tecnico, minutos):
+        """Registra trabajo asignado a mano para que cuente en el reparto"""
+        if tecnico in self._cargas:
+            self._cargas[tecnico] += minutos
+            heapq.heappush(self._heap, (self._cargas[tecnico], tecnico))
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import F
+
+from agencia.cambios import registrar as registrar_cambios
+from agencia import resumen
+
+
+# ==========================================
+# TRANSICIONES PERMITIDAS
+# ==========================================
+# estado actual -> estados a los que puede pasar
+
+TRANSICIONES_RESERVACION = {
+    'pendiente': {'confirmada', 'en_progreso', 'cancelada'},
+    'confirmada': {'en_progreso', 'cancelada'},
+    'en_progreso': {'completada'},
+    'completada': set(),
+    'cancelada': set(),
+}
+
+TRANSICIONES_SERVICIO = {
+    'pendiente': {'en_progreso', 'completado'},
+    'en_progreso': {'completado'},
+    'completado': set(),
+}
+
+ESTADOS_RESERVACION = list(TRANSICIONES_RESERVACION)
+ESTADOS_SERVICIO = list(TRANSICIONES_SERVICIO)
+
+# Servicios que siguen ocupando al técnico
+ESTADOS_SERVICIO_ABIERTOS = ('pendiente', 'en_progreso')
+
+
+# ==========================================
+# CAMBIO DE ESTADO POR LOTE
+# ==========================================
+
+def cambiar_estado_lote(queryset, campo, ids, destino, transiciones=None):
+    """
+    Pasa a `destino` las filas de `queryset` con pk en `ids`.
+
+    Una lectura (bloqueada con select_for_update) valida existencia,
+    pertenencia —el queryset ya viene filtrado por dueño— y transición, y
+    un solo UPDATE ... WHERE id IN (...) aplica el cambio e incrementa la
+    versión de fila; los cambios quedan en la bitácora (agencia.cambios) y
+    en el resumen del tablero (agencia.resumen). Sin `transiciones` se
+    acepta cualquier cambio.
+
+    Devuelve (resultados, actualizados): un resultado por id en el orden
+    recibido y la lista de pks modificados.
+    """
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        filas = {
+            fila[0]: fila[1:] for fila in queryset.select_for_update().filter(pk__in=ids)
+            .values_list('pk', campo, *resumen.columnas_lote(queryset.model))
+        }
+        actuales = {pk: fila[0] for pk, fila in filas.items()}
+
+        resultados, actualizados = [], []
+        for pk in ids:
+            if pk not in actuales:
+                resultados.append({'id': pk, 'ok': False, 'error': 'No encontrado'})
+            elif actuales[pk] == destino:
+                resultados.append({'id': pk, 'ok': True, 'sin_cambio': True})
+            elif transiciones is not None and destino not in transiciones.get(actuales[pk], ()):
+                resultados.append({
+                    'id': pk, 'ok': False,
+                    'error': f'Transición no permitida: {actuales[pk]} → {destino}',
+                })
+            else:
+                resultados.append({'id': pk, 'ok': True})
+                actualizados.append(pk)
+
+        if actualizados:
+            queryset.model.objects.filter(pk__in=actualizados).update(
+                **{campo: destino}, version=F('version') + 1
+            )
+            registrar_cambios(queryset.model, actualizados)
+            resumen.registrar_lote(queryset.model, [filas[pk] for pk in actualizados], destino)
+    return resultados, actualizados
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+# Broker de eventos (sobrescribible en settings). El local solo entrega a
+# los streams del mismo proceso; con varios workers se sustituye por uno
+# con la misma interfaz sobre un pub/sub compartido.
+BROKER = getattr(settings, 'EVENTOS_BROKER', 'agencia.eventos.BrokerLocal')
+HEARTBEAT_SEGUNDOS = getattr(settings, 'EVENTOS_HEARTBEAT_SEGUNDOS', 15)
+REVISION_USUARIO_SEGUNDOS = getattr(settings, 'EVENTOS_REVISION_USUARIO_SEGUNDOS', 300)
+PENDIENTES_MAX = getattr(settings, 'EVENTOS_PENDIENTES_MAX', 100)
+
+
+def formatear_evento(tipo, datos):
+    """Bloque text/event-stream listo para escribirse en la conexión"""
+    return f'event: {tipo}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n'
+
+
+class Suscripcion:
+    """
+    Buzón de un stream abierto, atado al event loop que lo atiende.
+
+    Solo guarda el último evento pendiente por clave (un servicio): un
+    cliente lento recibe el estado más reciente en lugar de acumular la
+    historia, y una conexión inactiva no retiene más que este objeto.
+    """
+    __slots__ = ('usuario_id', '_loop', '_pendientes', '_aviso')
+
+    def __init__(self, usuario_id, loop):
+        self.usuario_id = usuario_id
+        self._loop = loop
+        self._pendientes = {}
+        self._aviso = asyncio.Event()
+
+    def _entregar(self, clave, evento):
+        # Corre en el loop del stream (call_soon_threadsafe)
+        self._pendientes.pop(clave, None)
+        self._pendientes[clave] = evento
+        if len(self._pendientes) > PENDIENTES_MAX:
+            del self._pendientes[next(iter(self._pendientes))]
+        self._aviso.set()
+
+    async def siguientes(self, timeout):
+        """Eventos pendientes en orden de llegada; vacío si vence `timeout`"""
+        if not self._pendientes:
+            try:
+                await asyncio.wait_for(self._aviso.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._aviso.clear()
+        eventos = list(self._pendientes.values())
+        self._pendientes.clear()
+        return eventos
+
+
+class BrokerLocal:
+    """
+    Fan-out por usuario dentro del proceso. Las vistas síncronas publican
+    desde su hilo; la entrega se agenda en el loop de cada suscripción.
+    El evento se serializa una sola vez y se comparte entre suscriptores.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = {}
+
+    def suscribir(self, usuario_id):
+        """Llamar desde el event loop que atenderá el stream"""
+        suscripcion = Suscripcion(usuario_id, asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.setdefault(usuario_id, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            abiertas = self._suscripciones.get(suscripcion.usuario_id)
+            if abiertas is not None:
+                abiertas.discard(suscripcion)
+                if not abiertas:
+                    del self._suscripciones[suscripcion.usuario_id]
+
+    def publicar(self, usuario_id, clave, evento):
+        with self._lock:
+            abiertas = tuple(self._suscripciones.get(usuario_id, ()))
+        for suscripcion in abiertas:
+            try:
+                suscripcion._loop.call_soon_threadsafe(suscripcion._entregar, clave, evento)
+            except RuntimeError:
+                # Loop cerrado: el stream ya terminó
+                self.cancelar(suscripcion)
+
+    def conexiones(self):
+        with self._lock:
+            return sum(len(abiertas) for abiertas in self._suscripciones.values())
+
+
+@lru_cache(maxsize=None)
+def broker():
+    return import_string(BROKER)()
+
+
+# ==========================================
+# EVENTOS DE SERVICIOS
+# ==========================================
+
+def datos_servicio(servicio, progreso=None):
+    """Lo que el cliente consultaba por polling, en un solo evento"""
+    datos = {
+        'id_serv_res': servicio.pk,
+        'id_reservacion': servicio.id_reservacion_id,
+        'estado': servicio.estado,
+        'avance_porcentaje': servicio.avance_porcentaje,
+        'version': servicio.version,
+    }
+    if progreso is not None:
+        datos['progreso'] = {
+            'id': progreso.pk,
+            'porcentaje': progreso.porcentaje,
+            'comentario': progreso.comentario,
+            'fecha': progreso.fecha,
+        }
+    return datos
+
+
+def publicar_servicio(cliente_id, datos):
+    """Notifica al dueño del servicio cuando la transacción confirme"""
+    evento = formatear_evento('servicio', datos)
+    transaction.on_commit(
+        partial(broker().publicar, cliente_id, ('servicio', datos['id_serv_res']), evento)
+    )
@@ -0,0 +1,237 @@
+import asyncio
+import csv
+import queue
+import threading
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from agencia.models import Solicitud, DetalleSolicitud, Reservacion, ServicioReservado
+
+
+# Filas por lectura del cursor y por fragmento de la respuesta
+# (sobrescribible en settings)
+LOTE = getattr(settings, 'EXPORTACION_LOTE', 2000)
+
+# Fragmentos generados que esperan al cliente bajo ASGI
+PENDIENTES = 4
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Modelo, columna de fecha (con índice que empieza por ella, para filtrar
+# y ordenar sin recorrer la tabla) y columnas: {nombre: ruta para values()}
+EXPORTACIONES = {
+    'solicitudes': (Solicitud, 'fecha_creacion', {
+        'id': 'id',
+        'fecha_creacion': 'fecha_creacion',
+        'id_estado': 'id_estado',
+        'descripcion': 'descripcion',
+        'referencia_externa': 'referencia_externa',
+        'id_cliente': 'id_usuario',
+        'cliente': 'id_usuario__nombre',
+        'email_cliente': 'id_usuario__email',
+        'id_vehiculo': 'id_vehiculo',
+        'placa': 'id_vehiculo__placa',
+    }),
+    'detalles': (DetalleSolicitud, 'creado_at', {
+        'id': 'id',
+        'creado_at': 'creado_at',
+        'id_solicitud': 'id_solicitud',
+        'id_cliente': 'id_solicitud__id_usuario',
+        'costo': 'costo',
+        'observaciones': 'observaciones',
+    }),
+    'reservaciones': (Reservacion, 'fecha', {
+        'id': 'id',
+        'fecha': 'fecha',
+        'hora': 'hora',
+        'estado_global': 'estado_global',
+        'avance_global': 'avance_global',
+        'servicios_total': 'servicios_total',
+        'servicios_completados': 'servicios_completados',
+        'fecha_inicio': 'fecha_inicio',
+        'fecha_fin': 'fecha_fin',
+        'creado_at': 'creado_at',
+        'id_solicitud': 'id_solicitud',
+        'id_cliente': 'id_solicitud__id_usuario',
+        'placa': 'id_solicitud__id_vehiculo__placa',
+        'notas': 'notas',
+    }),
+    'servicios': (ServicioReservado, 'creado_at', {
+        'id': 'id',
+        'creado_at': 'creado_at',
+        'id_reservacion': 'id_reservacion',
+        'id_servicio': 'id_servicio',
+        'servicio': 'id_servicio__nombre',
+        'costo_base': 'id_servicio__costo_base',
+        'id_tecnico': 'id_usuario_taller',
+        'tecnico': 'id_usuario_taller__nombre',
+        'estado': 'estado',
+        'avance_porcentaje': 'avance_porcentaje',
+        'fecha_inicio': 'fecha_inicio',
+        'fecha_fin': 'fecha_fin',
+    }),
+}
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+
+def filas(entidad, desde=None, hasta=None):
+    """
+    Tuplas de la exportación en el orden de columnas(entidad), por fecha e
+    id. `desde` y `hasta` son fechas inclusivas en la zona horaria actual;
+    se convierten a un rango sobre la columna (no __date) para que lo
+    resuelva el índice.
+
+    Una sola consulta leída con iterator(): ni instancias de modelo ni
+    cache del queryset, así que la memoria no depende del número de filas.
+    """
+    modelo, campo_fecha, rutas = EXPORTACIONES[entidad]
+    queryset = modelo.objects.all()
+    if desde is not None:
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': _inicio_del_dia(desde)})
+    if hasta is not None:
+        queryset = queryset.filter(**{f'{campo_fecha}__lt': _inicio_del_dia(hasta + timedelta(days=1))})
+    return queryset.order_by(campo_fecha, 'pk').values_list(*rutas.values()).iterator(chunk_size=LOTE)
+
+
+def columnas(entidad):
+    return list(EXPORTACIONES[entidad][2])
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+# ==========================================
+# FORMATOS
+# ==========================================
+
+class _Eco:
+    """Destino de csv.writer que devuelve cada línea en lugar de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+def _lotes(iterable):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, LOTE)):
+        yield lote
+
+
+# Fechas y decimales con el mismo formato en CSV y NDJSON
+_CODIFICADOR = DjangoJSONEncoder(ensure_ascii=False)
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (str, int, float)):
+        return valor
+    return _CODIFICADOR.default(valor)
+
+
+# Inicios con los que una hoja de cálculo toma la celda como fórmula
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celda(valor):
+    """
+    Texto capturado por usuarios (descripciones, notas, nombres) que
+    empieza como fórmula se exporta tras un apóstrofo: al abrir el CSV se
+    ve como texto en lugar de ejecutarse. Números y fechas no cambian.
+    """
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return _texto(valor)
+
+
+def generar_csv(entidad, tuplas):
+    """Encabezado y un fragmento por lote de filas"""
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas(entidad))
+    for lote in _lotes(tuplas):
+        yield ''.join(escritor.writerow([_celda(valor) for valor in fila]) for fila in lote)
+
+
+def generar_ndjson(entidad, tuplas):
+    """Un objeto JSON por línea, un fragmento por lote de filas"""
+    nombres = columnas(entidad)
+    for lote in _lotes(tuplas):
+        yield ''.join(_CODIFICADOR.encode(dict(zip(nombres, fila))) + '\n' for fila in lote)
+
+
+GENERADORES = {
+    'csv': generar_csv,
+    'ndjson': generar_ndjson,
+}
+
+
+def exportar(entidad, formato, desde=None, hasta=None):
+    """Generador con el contenido de la exportación (para StreamingHttpResponse)"""
+    return GENERADORES[formato](entidad, filas(entidad, desde, hasta))
+
+
+# ==========================================
+# ASGI
+# ==========================================
+
+_FIN = object()
+
+
+async def en_hilo_propio(contenido):
+    """
+    Bajo ASGI, StreamingHttpResponse lee un iterador síncrono completo en
+    memoria antes de enviarlo. Esto lo recorre en un hilo propio —con su
+    propia conexión: las vistas síncronas comparten hilo y conexión, que
+    cerrarían el cursor a mitad de la exportación— y entrega los
+    fragmentos por una cola acotada: si el cliente lee lento, el hilo
+    espera. Si el cliente se desconecta, el hilo se detiene.
+    """
+    cola = queue.Queue(maxsize=PENDIENTES)
+    cancelado = threading.Event()
+
+    def entregar(fragmento):
+        while not cancelado.is_set():
+            try:
+                cola.put(fragmento, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producir():
+        try:
+            for fragmento in contenido:
+                if not entregar(fragmento):
+                    break
+        except Exception as error:
+            entregar(error)
+        finally:
+            if hasattr(contenido, 'close'):
+                contenido.close()
+            connection.close()
+            if not entregar(_FIN):
+                # Cancelado: libera al get() que pudiera seguir esperando
+                try:
+                    cola.put_nowait(_FIN)
+                except queue.Full:
+                    pass
+
+    threading.Thread(target=producir, daemon=True).start()
+    try:
+        while (fragmento := await asyncio.to_thread(cola.get)) is not _FIN:
+            if isinstance(fragmento, Exception):
+                raise fragmento
+            yield fragmento
+    finally:
+        cancelado.set()
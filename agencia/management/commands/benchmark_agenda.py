@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agencia.agenda import AgendaTaller, APERTURA, CIERRE, DIAS_HABILES
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la construcción de AgendaTaller y la búsqueda de horarios '
+        'libres con una semana sintética (sin tocar la base de datos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reservaciones', type=int, default=3000,
+            help='Reservaciones en la semana (default: 3000)'
+        )
+        parser.add_argument('--tecnicos', type=int, default=200, help='Técnicos (default: 200)')
+        parser.add_argument('--bahias', type=int, default=200, help='Bahías (default: 200)')
+        parser.add_argument(
+            '--consultas', type=int, default=2000,
+            help='Búsquedas de horarios libres a medir (default: 2000)'
+        )
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        hoy = timezone.localdate()
+        lunes = hoy + timedelta(days=7 - hoy.weekday())
+        desde = timezone.make_aware(datetime.combine(lunes, APERTURA))
+        hasta = desde + timedelta(days=7)
+        tecnicos = list(range(1, options['tecnicos'] + 1))
+
+        # Cada reservación: 1 a 3 servicios de 30 a 180 minutos, en serie
+        jornada = (datetime.combine(lunes, CIERRE) - datetime.combine(lunes, APERTURA)).seconds // 60
+        dias = [d for d in range(7) if (lunes + timedelta(days=d)).weekday() in DIAS_HABILES]
+        ocupaciones, reservaciones = [], []
+        for _ in range(options['reservaciones']):
+            inicio = desde + timedelta(
+                days=azar.choice(dias), minutes=30 * azar.randrange(jornada // 30)
+            )
+            fin = inicio
+            for _ in range(azar.randint(1, 3)):
+                duracion = timedelta(minutes=30 * azar.randint(1, 6))
+                ocupaciones.append((azar.choice(tecnicos), fin, fin + duracion))
+                fin += duracion
+            reservaciones.append((inicio, fin))
+
+        inicio_construccion = time.perf_counter()
+        agenda = AgendaTaller(
+            desde, hasta, tecnicos, ocupaciones, reservaciones, bahias=options['bahias']
+        )
+        construccion = time.perf_counter() - inicio_construccion
+
+        busquedas, capacidad = [], []
+        for _ in range(options['consultas']):
+            consulta = desde + timedelta(minutes=azar.randrange(6 * 24 * 60))
+            duracion = 30 * azar.randint(1, 8)
+
+            t = time.perf_counter()
+            agenda.huecos_libres(duracion, n=5, desde=consulta)
+            busquedas.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            agenda.hay_capacidad(consulta, duracion)
+            capacidad.append(time.perf_counter() - t)
+
+        self.stdout.write(
+            f"{options['reservaciones']} reservaciones, {len(ocupaciones)} servicios, "
+            f"{len(tecnicos)} técnicos, {options['bahias']} bahías"
+        )
+        self.stdout.write(f'Construcción del índice: {construccion * 1000:.1f} ms')
+        for nombre, muestras in (('huecos_libres(n=5)', busquedas), ('hay_capacidad', capacidad)):
+            muestras.sort()
+            self.stdout.write(
+                f'{nombre}: media {statistics.mean(muestras) * 1e6:.0f} µs, '
+                f'p50 {muestras[len(muestras) // 2] * 1e6:.0f} µs, '
+                f'p99 {muestras[int(len(muestras) * 0.99)] * 1e6:.0f} µs'
+            )
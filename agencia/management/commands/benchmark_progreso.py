@@ -0,0 +1,208 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Max, Sum
+from rest_framework.test import APIClient
+
+from agencia import progreso as avance_monotono
+from agencia.models import (
+    ProgresoServicio, Reservacion, ServicioReservado, ServicioTaller, Solicitud, Vehiculo
+)
+from users.api.tokens import RefreshTokenConRol
+from users.models import TipoUsuario, Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Varios hilos registran progreso sobre los mismos servicios por la '
+        'API y comprueban que avance, último progreso y acumulados de la '
+        'reservación quedan consistentes (usa la base de datos configurada '
+        'y borra lo que crea al terminar)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos concurrentes (default: 8)')
+        parser.add_argument(
+            '--servicios', type=int, default=4,
+            help='Servicios que se disputan los hilos (default: 4)'
+        )
+        parser.add_argument(
+            '--escrituras', type=int, default=50,
+            help='Progresos que registra cada hilo (default: 50)'
+        )
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        datos = self.crear_datos(options['servicios'])
+        try:
+            latencias, respuestas, duracion = self.competir(datos, options)
+            errores = self.verificar(datos, respuestas)
+        finally:
+            self.borrar_datos(datos)
+
+        self.stdout.write(f'Base de datos: {self.describir_base()}')
+        self.stdout.write(
+            f"{options['hilos']} hilos, {options['servicios']} servicios, "
+            f"avance monótono: {'sí' if avance_monotono.MONOTONO else 'no'}"
+        )
+        self.stdout.write(
+            'Respuestas: ' + ', '.join(f'{codigo}: {n}' for codigo, n in sorted(respuestas.items()))
+        )
+        latencias.sort()
+        self.stdout.write(
+            f'{len(latencias) / duracion:.0f} escrituras/s, '
+            f'p50 {latencias[len(latencias) // 2] * 1000:.1f} ms, '
+            f'p99 {latencias[int(len(latencias) * 0.99)] * 1000:.1f} ms, '
+            f'media {statistics.mean(latencias) * 1000:.1f} ms'
+        )
+        if errores:
+            for error in errores:
+                self.stdout.write(self.style.ERROR(error))
+        else:
+            self.stdout.write(self.style.SUCCESS('Consistente'))
+
+    # ==========================================
+    # ESCENARIO
+    # ==========================================
+
+    def crear_datos(self, n_servicios):
+        marca = uuid.uuid4().hex[:8]
+        tipos = {
+            cve: TipoUsuario.objects.get_or_create(cve=cve, defaults={'descripcion': cve.title()})[0]
+            for cve in ('CLIENTE', 'TALLER')
+        }
+        cliente = Usuario.objects.create_user(
+            f'benchmark-cliente-{marca}@example.com', 'Benchmark', tipos['CLIENTE'], uuid.uuid4().hex
+        )
+        tecnico = Usuario.objects.create_user(
+            f'benchmark-tecnico-{marca}@example.com', 'Benchmark', tipos['TALLER'], uuid.uuid4().hex
+        )
+        vehiculo = Vehiculo.objects.create(placa=f'BENCH-{marca}', id_usuario_propietario=cliente)
+        solicitud = Solicitud.objects.create(id_vehiculo=vehiculo, id_usuario=cliente, id_estado=1)
+        reservacion = Reservacion.objects.create(id_solicitud=solicitud)
+        servicio_taller = ServicioTaller.objects.create(nombre=f'Benchmark {marca}', costo_base=0)
+        servicios = [
+            ServicioReservado.objects.create(
+                id_reservacion=reservacion, id_servicio=servicio_taller, id_usuario_taller=tecnico
+            ).pk
+            for _ in range(n_servicios)
+        ]
+        return {
+            'usuarios': [cliente.pk, tecnico.pk],
+            'tecnico': tecnico,
+            'vehiculo': vehiculo.pk,
+            'solicitud': solicitud.pk,
+            'reservacion': reservacion.pk,
+            'servicio_taller': servicio_taller.pk,
+            'servicios': servicios,
+        }
+
+    def borrar_datos(self, datos):
+        Solicitud.objects.filter(pk=datos['solicitud']).delete()
+        Vehiculo.objects.filter(pk=datos['vehiculo']).delete()
+        ServicioTaller.objects.filter(pk=datos['servicio_taller']).delete()
+        Usuario.objects.filter(pk__in=datos['usuarios']).delete()
+
+    def competir(self, datos, options):
+        token = RefreshTokenConRol.for_user(datos['tecnico']).access_token
+        latencias, respuestas = [], Counter()
+        lock = threading.Lock()
+        salida = threading.Barrier(options['hilos'] + 1)
+
+        def trabajar(semilla):
+            azar = random.Random(semilla)
+            cliente = APIClient(raise_request_exception=False)
+            cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            propias, codigos = [], Counter()
+            try:
+                salida.wait()
+                for _ in range(options['escrituras']):
+                    servicio = azar.choice(datos['servicios'])
+                    t = time.perf_counter()
+                    response = cliente.post(f'/api/taller/servicios/{servicio}/progreso/', {
+                        'id_serv_res': servicio, 'porcentaje': azar.randint(1, 100),
+                        'comentario': 'benchmark',
+                    }, format='json')
+                    propias.append(time.perf_counter() - t)
+                    codigos[response.status_code] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    latencias.extend(propias)
+                    respuestas.update(codigos)
+
+        hilos = [
+            threading.Thread(target=trabajar, args=(options['semilla'] + i,))
+            for i in range(options['hilos'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        salida.wait()
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.join()
+        return latencias, respuestas, time.perf_counter() - inicio
+
+    # ==========================================
+    # CORRECCIÓN
+    # ==========================================
+
+    def verificar(self, datos, respuestas):
+        errores = []
+        progresos = ProgresoServicio.objects.filter(id_serv_res__in=datos['servicios'])
+        if progresos.count() != respuestas[201]:
+            errores.append(
+                f'{progresos.count()} progresos guardados para {respuestas[201]} respuestas 201'
+            )
+
+        for servicio in ServicioReservado.objects.filter(pk__in=datos['servicios']):
+            ultimo = progresos.filter(id_serv_res=servicio).order_by('-pk').first()
+            if ultimo is None:
+                continue
+            if servicio.ultimo_progreso_id != ultimo.pk:
+                errores.append(
+                    f'Servicio {servicio.pk}: último progreso {servicio.ultimo_progreso_id}, '
+                    f'esperado {ultimo.pk}'
+                )
+            # Las escrituras se serializan: el avance es el del último
+            # progreso confirmado (con avance monótono, también el máximo)
+            esperado = ultimo.porcentaje
+            if avance_monotono.MONOTONO:
+                maximo = progresos.filter(id_serv_res=servicio).aggregate(m=Max('porcentaje'))['m']
+                if maximo != esperado:
+                    errores.append(f'Servicio {servicio.pk}: el avance retrocedió de {maximo} a {esperado}')
+            if servicio.avance_porcentaje != esperado:
+                errores.append(
+                    f'Servicio {servicio.pk}: avance {servicio.avance_porcentaje}, esperado {esperado}'
+                )
+
+        reservacion = Reservacion.objects.get(pk=datos['reservacion'])
+        servicios = ServicioReservado.objects.filter(pk__in=datos['servicios'])
+        recuento = (
+            servicios.count(),
+            servicios.filter(estado='completado').count(),
+            servicios.aggregate(s=Sum('avance_porcentaje'))['s'] or 0,
+        )
+        acumulado = (
+            reservacion.servicios_total, reservacion.servicios_completados, reservacion.avance_suma
+        )
+        if acumulado != recuento:
+            errores.append(
+                f'Reservación {reservacion.pk}: acumulados {acumulado}, recuento {recuento} '
+                '(total, completados, suma de avance)'
+            )
+        return errores
+
+    def describir_base(self):
+        if connection.vendor != 'sqlite':
+            return connection.vendor
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            modo = cursor.fetchone()[0]
+        return f"sqlite (journal {modo}, transacciones {connection.transaction_mode or 'DEFERRED'})"
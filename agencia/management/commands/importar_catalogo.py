@@ -0,0 +1,158 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agencia.cache_catalogo import invalidar_catalogo
+from agencia.models import Marca, Modelo
+
+
+FORMATOS = ('csv', 'json', 'ndjson')
+
+# Largo de Marca.nombre y Modelo.nombre
+NOMBRE_MAX = 100
+
+
+def _nombre(valor):
+    """' Corolla   Cross ' -> 'Corolla Cross'; '' si no es texto"""
+    return ' '.join(valor.split()) if isinstance(valor, str) else ''
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa marcas y modelos desde un CSV (columnas marca y modelo), un '
+        'arreglo JSON o NDJSON de objetos {"marca", "modelo"}. Crea lo que '
+        'falta y deja lo existente: correrlo otra vez no cambia nada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument(
+            '--formato', choices=FORMATOS,
+            help='Formato del archivo (default: según la extensión)'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Filas por inserción (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.is_file():
+            raise CommandError(f'No existe el archivo {ruta}')
+        formato = options['formato'] or ruta.suffix.lstrip('.').lower()
+        if formato == 'jsonl':
+            formato = 'ndjson'
+        if formato not in FORMATOS:
+            raise CommandError(f'Formato desconocido "{formato}": usa --formato {"|".join(FORMATOS)}')
+        lote = options['lote']
+
+        inicio = time.perf_counter()
+        catalogo, leidas, descartadas = self.leer(ruta, formato)
+        lectura = time.perf_counter() - inicio
+
+        with transaction.atomic():
+            marcas_antes, modelos_antes = Marca.objects.count(), Modelo.objects.count()
+            ids = self.importar_marcas(catalogo, lote)
+            self.importar_modelos(catalogo, ids, lote)
+            marcas_nuevas = Marca.objects.count() - marcas_antes
+            modelos_nuevos = Modelo.objects.count() - modelos_antes
+            # bulk_create no envía post_save: la versión del catálogo se
+            # cambia aquí, una sola vez. Vive en la base de datos, así que
+            # los workers en marcha la ven en su siguiente petición aunque
+            # no compartan cache con este proceso
+            if marcas_nuevas or modelos_nuevos:
+                invalidar_catalogo()
+        total = time.perf_counter() - inicio
+
+        unicos = sum(len(modelos) for modelos in catalogo.values())
+        self.stdout.write(
+            f'{leidas} filas leídas ({descartadas} descartadas, {unicos} modelos únicos '
+            f'de {len(catalogo)} marcas) en {lectura:.2f} s'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{marcas_nuevas} marcas y {modelos_nuevos} modelos nuevos en {total:.2f} s'
+        ))
+
+    # ==========================================
+    # LECTURA
+    # ==========================================
+
+    def leer(self, ruta, formato):
+        """
+        {marca: {modelos}} sin repetidos, sin filas incompletas y con los
+        espacios normalizados. Se arma al recorrer el archivo: en memoria
+        queda el catálogo, no las filas.
+        """
+        catalogo, leidas, descartadas = {}, 0, 0
+        with ruta.open(encoding='utf-8-sig', newline='') as archivo:
+            for fila in self.filas(archivo, formato):
+                leidas += 1
+                if not isinstance(fila, dict):
+                    descartadas += 1
+                    continue
+                marca, modelo = _nombre(fila.get('marca')), _nombre(fila.get('modelo'))
+                if not marca or not modelo or len(marca) > NOMBRE_MAX or len(modelo) > NOMBRE_MAX:
+                    descartadas += 1
+                    continue
+                catalogo.setdefault(marca, set()).add(modelo)
+        return catalogo, leidas, descartadas
+
+    def filas(self, archivo, formato):
+        if formato == 'csv':
+            lector = csv.DictReader(archivo)
+            if not lector.fieldnames or not {'marca', 'modelo'} <= set(lector.fieldnames):
+                raise CommandError('El CSV necesita las columnas marca y modelo')
+            yield from lector
+        elif formato == 'ndjson':
+            for numero, linea in enumerate(archivo, start=1):
+                if linea.strip():
+                    try:
+                        yield json.loads(linea)
+                    except json.JSONDecodeError as error:
+                        raise CommandError(f'Línea {numero}: {error}')
+        else:
+            # json no lee por partes: para archivos muy grandes, NDJSON
+            try:
+                datos = json.load(archivo)
+            except json.JSONDecodeError as error:
+                raise CommandError(f'JSON inválido: {error}')
+            if not isinstance(datos, list):
+                raise CommandError('El JSON debe ser un arreglo de objetos {"marca", "modelo"}')
+            yield from datos
+
+    # ==========================================
+    # ESCRITURA
+    # ==========================================
+
+    def importar_marcas(self, catalogo, lote):
+        """
+        Inserta las marcas que faltan y devuelve {nombre: id} de todas las
+        del archivo. Sin columnas que actualizar, el upsert es ignorar el
+        conflicto con la restricción única.
+        """
+        ids = {}
+        for nombres in _lotes(sorted(catalogo), lote):
+            Marca.objects.bulk_create([Marca(nombre=nombre) for nombre in nombres], ignore_conflicts=True)
+            ids.update(Marca.objects.filter(nombre__in=nombres).values_list('nombre', 'pk'))
+        return ids
+
+    def importar_modelos(self, catalogo, ids, lote):
+        """Inserta los modelos que faltan; los existentes (marca y nombre) quedan"""
+        modelos = (
+            Modelo(id_marca_id=ids[marca], nombre=nombre)
+            for marca, nombres in sorted(catalogo.items())
+            for nombre in sorted(nombres)
+        )
+        for parte in _lotes(modelos, lote):
+            Modelo.objects.bulk_create(parte, ignore_conflicts=True)
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agencia.cambios import ultimo_cursor
+from agencia.models import RegistroCambio
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina por lotes los registros antiguos de la bitácora de cambios. '
+        'Las apps con un cursor anterior reciben 410 y sincronizan completo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=getattr(settings, 'CAMBIOS_RETENCION_DIAS', 30),
+            help='Días de bitácora que se conservan (default: CAMBIOS_RETENCION_DIAS)'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Registros eliminados por sentencia (default: 5000)'
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0.0,
+            help='Segundos de espera entre lotes para ceder escrituras'
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias'])
+        # El último registro se conserva: sin él no se distinguiría una
+        # bitácora purgada de una vacía
+        ultimo = ultimo_cursor()
+
+        total = 0
+        while True:
+            # Siempre desde el más antiguo: la bitácora queda sin huecos y
+            # el primer id restante marca qué cursores siguen vigentes
+            ids = list(
+                RegistroCambio.objects.filter(fecha__lt=limite, pk__lt=ultimo)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            RegistroCambio.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} registros de la bitácora eliminados'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from agencia.models import Reservacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Recuenta los acumulados de avance de las reservaciones desde sus '
+        'servicios (después de cargas masivas o ediciones fuera de la API)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Cantidad de reservaciones por UPDATE (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+
+        total = 0
+        ultimo_id = 0
+        while True:
+            ids = list(
+                Reservacion.objects.filter(pk__gt=ultimo_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                total += Reservacion.objects.filter(pk__in=ids).recalcular_avance()
+            ultimo_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'{total} reservaciones recalculadas'))
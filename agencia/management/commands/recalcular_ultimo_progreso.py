@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from agencia.models import ServicioReservado
+
+
+class Command(BaseCommand):
+    help = 'Rellena ServicioReservado.ultimo_progreso para los registros existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Cantidad de servicios por UPDATE (default: 1000)'
+        )
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Recalcular también los servicios que ya tienen apuntador'
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        queryset = ServicioReservado.objects.all()
+        if not options['todos']:
+            queryset = queryset.filter(ultimo_progreso__isnull=True)
+
+        total = 0
+        ultimo_id = 0
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=ultimo_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                total += ServicioReservado.objects.filter(
+                    pk__in=ids
+                ).actualizar_ultimo_progreso()
+            ultimo_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'{total} servicios actualizados'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from agencia.resumen import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Recuenta el resumen del tablero (estados, técnicos y días) desde '
+        'las tablas; conviene correrlo sin escrituras en curso'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Rango de ids agregado por consulta (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        filas = reconstruir(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{filas} filas de resumen reconstruidas'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicioreservado',
+            name='ultimo_progreso',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='agencia.progresoservicio'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0002_servicioreservado_ultimo_progreso'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='progresoservicio',
+            index=models.Index(fields=['id_serv_res', 'fecha'], name='progreso_servicio_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservacion',
+            index=models.Index(fields=['fecha', 'id'], name='reservacion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservacion',
+            index=models.Index(fields=['estado_global', 'fecha'], name='reservacion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicioreservado',
+            index=models.Index(fields=['id_usuario_taller', 'creado_at'], name='servres_tecnico_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicioreservado',
+            index=models.Index(fields=['creado_at', 'id'], name='servres_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['id_usuario', 'fecha_creacion'], name='solicitud_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='solicitud_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0003_indices_patrones_acceso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservacion',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='servicioreservado',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='solicitud',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0004_version_fila'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('alta', 'Alta'), ('cambio', 'Cambio'), ('baja', 'Baja')], max_length=10)),
+                ('id_cliente', models.BigIntegerField(blank=True, null=True)),
+                ('id_tecnico', models.BigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_cliente', 'id'], name='cambio_cliente_idx'), models.Index(fields=['id_tecnico', 'id'], name='cambio_tecnico_idx'), models.Index(fields=['fecha'], name='cambio_fecha_idx')],
+            },
+        ),
+    ]
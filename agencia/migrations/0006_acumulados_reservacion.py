@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def recalcular_acumulados(apps, schema_editor):
+    Reservacion = apps.get_model('agencia', 'Reservacion')
+    ServicioReservado = apps.get_model('agencia', 'ServicioReservado')
+    servicios = ServicioReservado.objects.filter(
+        id_reservacion=models.OuterRef('pk')
+    ).order_by().values('id_reservacion')
+
+    def agregado(expresion, **filtro):
+        return Coalesce(models.Subquery(
+            servicios.filter(**filtro).annotate(valor=expresion).values('valor'),
+            output_field=models.IntegerField(),
+        ), 0)
+
+    Reservacion.objects.update(
+        servicios_total=agregado(models.Count('pk')),
+        avance_suma=agregado(models.Sum('avance_porcentaje')),
+        servicios_completados=agregado(models.Count('pk'), estado='completado'),
+    )
+    # Mismo criterio que ReservacionQuerySet.acumular_servicios
+    Reservacion.objects.filter(servicios_total__gt=0).update(
+        avance_global=models.Case(
+            models.When(servicios_completados=models.F('servicios_total'), then=models.Value(100)),
+            default=models.F('avance_suma') / models.F('servicios_total'),
+            output_field=models.IntegerField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0005_bitacora_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservacion',
+            name='avance_suma',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reservacion',
+            name='servicios_completados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reservacion',
+            name='servicios_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(recalcular_acumulados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def llenar_resumen(apps, schema_editor):
+    # Mismo recuento que agencia.resumen.reconstruir, de una sola vez
+    ResumenEstado = apps.get_model('agencia', 'ResumenEstado')
+    ResumenTecnico = apps.get_model('agencia', 'ResumenTecnico')
+    ResumenDiario = apps.get_model('agencia', 'ResumenDiario')
+    ServicioReservado = apps.get_model('agencia', 'ServicioReservado')
+
+    # Los estados conocidos quedan en cero: cambiar a ellos es un UPDATE
+    conocidos = {
+        'solicitud': [''],
+        'reservacion': ['pendiente', 'confirmada', 'en_progreso', 'completada', 'cancelada'],
+        'servicio': ['pendiente', 'en_progreso', 'completado'],
+    }
+    estados = []
+    for nombre, entidad, columna in (
+        ('Solicitud', 'solicitud', 'id_estado'),
+        ('Reservacion', 'reservacion', 'estado_global'),
+        ('ServicioReservado', 'servicio', 'estado'),
+    ):
+        modelo = apps.get_model('agencia', nombre)
+        totales = dict.fromkeys(conocidos.get(entidad, ()), 0)
+        for estado, n in modelo.objects.order_by().values_list(columna).annotate(n=models.Count('pk')):
+            totales['' if estado is None else str(estado)] = n
+        estados += [
+            ResumenEstado(entidad=entidad, estado=estado, total=n) for estado, n in totales.items()
+        ]
+    ResumenEstado.objects.bulk_create(estados)
+
+    tecnicos = {}
+    for tecnico, estado, n in ServicioReservado.objects.filter(id_usuario_taller__isnull=False).order_by(
+    ).values_list('id_usuario_taller', 'estado').annotate(n=models.Count('pk')):
+        tecnicos.setdefault(tecnico, dict.fromkeys(conocidos['servicio'], 0))[estado] = n
+    ResumenTecnico.objects.bulk_create([
+        ResumenTecnico(id_tecnico_id=tecnico, estado=estado, servicios=n)
+        for tecnico, totales in tecnicos.items() for estado, n in totales.items()
+    ])
+
+    dias = {}
+    for nombre, columna, campo, aporte in (
+        ('Solicitud', 'fecha_creacion', 'solicitudes', models.Count('pk')),
+        ('Reservacion', 'creado_at', 'reservaciones', models.Count('pk')),
+        ('DetalleSolicitud', 'creado_at', 'ingresos', models.Sum('costo')),
+    ):
+        modelo = apps.get_model('agencia', nombre)
+        for fecha, valor in modelo.objects.order_by().values_list(TruncDate(columna)).annotate(v=aporte):
+            dias.setdefault(fecha, {})[campo] = valor or 0
+    ResumenDiario.objects.bulk_create([
+        ResumenDiario(fecha=fecha, **campos) for fecha, campos in dias.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0006_acumulados_reservacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('solicitudes', models.IntegerField(default=0)),
+                ('reservaciones', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(max_length=20)),
+                ('estado', models.CharField(max_length=100)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entidad', 'estado'), name='resumen_estado_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenTecnico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(max_length=100)),
+                ('servicios', models.IntegerField(default=0)),
+                ('id_tecnico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('id_tecnico', 'estado'), name='resumen_tecnico_unico')],
+            },
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# Índice FTS5 de agencia.busqueda. El rowid codifica el registro:
+# id * 4 + (0 solicitud, 1 vehículo, 2 cliente), así los triggers lo
+# localizan sin recorrer el índice. Los triggers cubren también los
+# bulk_create, update() y borrados en cascada.
+#
+# Las búsquedas son por prefijo: sin los índices de prefijo, "fre*" une
+# las listas de cada palabra que empieza así.
+CREAR = [
+    """
+    CREATE VIRTUAL TABLE agencia_busqueda USING fts5(
+        tipo UNINDEXED, titulo, texto,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+    )
+    """,
+    # Orden por relevancia (ORDER BY rank): una coincidencia en la placa o
+    # el nombre pesa más que en las observaciones
+    """
+    INSERT INTO agencia_busqueda (agencia_busqueda, rank) VALUES ('rank', 'bm25(0.0, 10.0, 1.0)')
+    """,
+
+    # Solicitudes: descripción y observaciones de sus detalles
+    """
+    CREATE TRIGGER agencia_busqueda_solicitud_alta AFTER INSERT ON agencia_solicitud BEGIN
+        INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+        VALUES (NEW.id * 4, 'solicitud', coalesce(NEW.descripcion, ''), '');
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_solicitud_cambio AFTER UPDATE OF descripcion ON agencia_solicitud BEGIN
+        UPDATE agencia_busqueda SET titulo = coalesce(NEW.descripcion, '') WHERE rowid = NEW.id * 4;
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_solicitud_baja AFTER DELETE ON agencia_solicitud BEGIN
+        DELETE FROM agencia_busqueda WHERE rowid = OLD.id * 4;
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_detalle_alta AFTER INSERT ON agencia_detallesolicitud BEGIN
+        UPDATE agencia_busqueda SET texto = (
+            SELECT coalesce(group_concat(observaciones, ' '), '') FROM agencia_detallesolicitud
+            WHERE id_solicitud_id = NEW.id_solicitud_id
+        ) WHERE rowid = NEW.id_solicitud_id * 4;
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_detalle_cambio
+    AFTER UPDATE OF observaciones, id_solicitud_id ON agencia_detallesolicitud BEGIN
+        UPDATE agencia_busqueda SET texto = (
+            SELECT coalesce(group_concat(observaciones, ' '), '') FROM agencia_detallesolicitud
+            WHERE id_solicitud_id = agencia_busqueda.rowid / 4
+        ) WHERE rowid IN (OLD.id_solicitud_id * 4, NEW.id_solicitud_id * 4);
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_detalle_baja AFTER DELETE ON agencia_detallesolicitud BEGIN
+        UPDATE agencia_busqueda SET texto = (
+            SELECT coalesce(group_concat(observaciones, ' '), '') FROM agencia_detallesolicitud
+            WHERE id_solicitud_id = OLD.id_solicitud_id
+        ) WHERE rowid = OLD.id_solicitud_id * 4;
+    END
+    """,
+
+    # Vehículos: placa y color
+    """
+    CREATE TRIGGER agencia_busqueda_vehiculo_alta AFTER INSERT ON agencia_vehiculo BEGIN
+        INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+        VALUES (NEW.id * 4 + 1, 'vehiculo', NEW.placa, coalesce(NEW.color, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_vehiculo_cambio AFTER UPDATE OF placa, color ON agencia_vehiculo BEGIN
+        UPDATE agencia_busqueda SET titulo = NEW.placa, texto = coalesce(NEW.color, '')
+        WHERE rowid = NEW.id * 4 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_vehiculo_baja AFTER DELETE ON agencia_vehiculo BEGIN
+        DELETE FROM agencia_busqueda WHERE rowid = OLD.id * 4 + 1;
+    END
+    """,
+
+    # Clientes: nombre y email (un cambio de tipo los agrega o los quita)
+    """
+    CREATE TRIGGER agencia_busqueda_cliente_alta AFTER INSERT ON usuarios
+    WHEN (SELECT cve FROM users_tipousuario WHERE id = NEW.id_tipo_id) = 'CLIENTE' BEGIN
+        INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+        VALUES (NEW.id * 4 + 2, 'cliente', NEW.nombre, NEW.email);
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_cliente_cambio AFTER UPDATE OF nombre, email, id_tipo_id ON usuarios BEGIN
+        DELETE FROM agencia_busqueda WHERE rowid = OLD.id * 4 + 2;
+        INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+        SELECT NEW.id * 4 + 2, 'cliente', NEW.nombre, NEW.email
+        WHERE (SELECT cve FROM users_tipousuario WHERE id = NEW.id_tipo_id) = 'CLIENTE';
+    END
+    """,
+    """
+    CREATE TRIGGER agencia_busqueda_cliente_baja AFTER DELETE ON usuarios BEGIN
+        DELETE FROM agencia_busqueda WHERE rowid = OLD.id * 4 + 2;
+    END
+    """,
+]
+
+LLENAR = [
+    """
+    INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+    SELECT s.id * 4, 'solicitud', coalesce(s.descripcion, ''), coalesce((
+        SELECT group_concat(d.observaciones, ' ') FROM agencia_detallesolicitud d
+        WHERE d.id_solicitud_id = s.id
+    ), '')
+    FROM agencia_solicitud s
+    """,
+    """
+    INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+    SELECT id * 4 + 1, 'vehiculo', placa, coalesce(color, '') FROM agencia_vehiculo
+    """,
+    """
+    INSERT INTO agencia_busqueda (rowid, tipo, titulo, texto)
+    SELECT u.id * 4 + 2, 'cliente', u.nombre, u.email
+    FROM usuarios u JOIN users_tipousuario t ON t.id = u.id_tipo_id
+    WHERE t.cve = 'CLIENTE'
+    """,
+]
+
+BORRAR = [
+    f'DROP TRIGGER IF EXISTS agencia_busqueda_{tabla}_{operacion}'
+    for tabla in ('solicitud', 'detalle', 'vehiculo', 'cliente')
+    for operacion in ('alta', 'cambio', 'baja')
+] + ['DROP TABLE IF EXISTS agencia_busqueda']
+
+
+def _ejecutar(schema_editor, sentencias):
+    # FTS5 es propio de SQLite; con otro motor (p. ej. un tsvector en
+    # Postgres) hará falta su propia migración
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    _ejecutar(schema_editor, CREAR + LLENAR)
+
+
+def borrar_indice(apps, schema_editor):
+    _ejecutar(schema_editor, BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0007_resumen_tablero'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
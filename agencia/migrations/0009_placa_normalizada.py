@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:23
+
+from functools import reduce
+from importlib import import_module
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Replace, Upper
+
+
+def restaurar_triggers_busqueda(apps, schema_editor):
+    # SQLite agrega la columna generada y la restricción reconstruyendo la
+    # tabla, y al borrar la anterior se pierden sus triggers: sin esto el
+    # índice de búsqueda dejaría de seguir a los vehículos
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    busqueda = import_module('agencia.migrations.0008_busqueda_texto')
+    for sentencia in busqueda.CREAR:
+        if 'ON agencia_vehiculo ' in sentencia:
+            schema_editor.execute(sentencia.replace('CREATE TRIGGER', 'CREATE TRIGGER IF NOT EXISTS'))
+
+
+def fusionar_placas_repetidas(apps, schema_editor):
+    # Antes de la restricción: placas que solo difieren en mayúsculas o
+    # separadores ('abc-12' y 'ABC 12'). Del mismo dueño se fusionan en el
+    # vehículo de menor id, que recibe sus solicitudes; de dueños distintos
+    # no hay cuál conservar y la migración se detiene con la lista. Corre
+    # antes de reconstruir la tabla, con los triggers de búsqueda vigentes.
+    Vehiculo = apps.get_model('agencia', 'Vehiculo')
+    Solicitud = apps.get_model('agencia', 'Solicitud')
+    normalizada = reduce(
+        lambda expresion, separador: Replace(expresion, models.Value(separador), models.Value('')),
+        ' -./', Upper('placa'),
+    )
+    repetidas = (
+        Vehiculo.objects.annotate(normalizada=normalizada).values('normalizada')
+        .annotate(
+            total=Count('pk'), duenos=Count('id_usuario_propietario', distinct=True), primero=Min('pk'),
+        )
+        .filter(total__gt=1)
+    )
+    conflictos = []
+    for fila in repetidas:
+        vehiculos = Vehiculo.objects.annotate(normalizada=normalizada).filter(normalizada=fila['normalizada'])
+        if fila['duenos'] > 1:
+            conflictos.append(', '.join(
+                f'{pk} ({placa}, dueño {dueno})'
+                for pk, placa, dueno in vehiculos.order_by('pk').values_list('pk', 'placa', 'id_usuario_propietario')
+            ))
+            continue
+        sobrantes = list(vehiculos.exclude(pk=fila['primero']).values_list('pk', flat=True))
+        Solicitud.objects.filter(id_vehiculo__in=sobrantes).update(id_vehiculo=fila['primero'])
+        Vehiculo.objects.filter(pk__in=sobrantes).delete()
+    if conflictos:
+        raise RuntimeError(
+            'Vehículos de distintos dueños con la misma placa normalizada; corrige sus placas '
+            'y vuelve a migrar:\n' + '\n'.join(conflictos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0008_busqueda_texto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Al revertir, la tabla se reconstruye otra vez antes de este paso
+        migrations.RunPython(migrations.RunPython.noop, restaurar_triggers_busqueda),
+        migrations.RunPython(fusionar_placas_repetidas, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='vehiculo',
+            name='placa_normalizada',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Upper('placa'), models.Value(' '), models.Value('')), models.Value('-'), models.Value('')), models.Value('.'), models.Value('')), models.Value('/'), models.Value('')), output_field=models.CharField(max_length=50)),
+        ),
+        migrations.AddConstraint(
+            model_name='vehiculo',
+            constraint=models.UniqueConstraint(fields=('placa_normalizada',), name='vehiculo_placa_normalizada_unica'),
+        ),
+        migrations.RunPython(restaurar_triggers_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0009_placa_normalizada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detallesolicitud',
+            index=models.Index(fields=['creado_at', 'id'], name='detalle_creado_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def fusionar_duplicados(apps, schema_editor):
+    # Antes de la restricción: los modelos repetidos en una marca se
+    # fusionan en el de menor id, y sus vehículos pasan a apuntarle
+    Modelo = apps.get_model('agencia', 'Modelo')
+    Vehiculo = apps.get_model('agencia', 'Vehiculo')
+    repetidos = (
+        Modelo.objects.values('id_marca', 'nombre')
+        .annotate(total=Count('pk'), primero=Min('pk'))
+        .filter(total__gt=1)
+    )
+    for fila in repetidos:
+        sobrantes = Modelo.objects.filter(id_marca=fila['id_marca'], nombre=fila['nombre']).exclude(pk=fila['primero'])
+        Vehiculo.objects.filter(id_modelo__in=sobrantes).update(id_modelo=fila['primero'])
+        sobrantes.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0010_indice_detalle_fecha'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='modelo',
+            constraint=models.UniqueConstraint(fields=('id_marca', 'nombre'), name='modelo_marca_nombre_unico'),
+        ),
+    ]
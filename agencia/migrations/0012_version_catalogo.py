@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:52
+
+import time
+
+from django.db import migrations, models
+
+
+def crear_version(apps, schema_editor):
+    # Una versión nueva invalida lo que los procesos tuvieran en cache
+    VersionCatalogo = apps.get_model('agencia', 'VersionCatalogo')
+    VersionCatalogo.objects.create(pk=1, version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencia', '0011_modelo_unico_por_marca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(crear_version, migrations.RunPython.noop),
+    ]
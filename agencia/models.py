@@ -1,6 +1,84 @@
-from django.db import models
+import re
+from collections import Counter
+from functools import reduce
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Replace, Upper
+from django.db.models.lookups import Exact, GreaterThan, LessThanOrEqual
 from users.models import Usuario  # relación con usuarios
 
+
+# ========================
+# VERSIÓN DE FILA
+# ========================
+
+class ConflictoVersion(Exception):
+    """La fila cambió (o se borró) después de que el cliente la leyó"""
+
+
+class ModeloVersionado(models.Model):
+    """
+    Agrega una versión de fila que crece en cada save() y alimenta el ETag
+    de los detalles. El UPDATE la incrementa con F('version') + 1, así que
+    es monótona aunque haya escrituras concurrentes.
+
+    Si version_esperada tiene valor, el UPDATE solo procede cuando la fila
+    sigue en esa versión (If-Match); si no, lanza ConflictoVersion. Lo
+    mismo con condicion_update (un Q que el WHERE debe cumplir).
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    version_esperada = None
+    condicion_update = None
+    # Campos que solo cambian con UPDATE relativos (F): save() no los
+    # reescribe con el valor, quizá viejo, que tiene la instancia
+    campos_acumulados = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        actualizando = not self._state.adding
+        update_fields = kwargs.get('update_fields')
+        if actualizando and update_fields is None and self.campos_acumulados:
+            update_fields = [
+                campo.name for campo in self._meta.concrete_fields if not campo.primary_key
+            ]
+        if actualizando and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'} - set(self.campos_acumulados)
+        try:
+            if self.version_esperada is None and self.condicion_update is None:
+                super().save(*args, **kwargs)
+            else:
+                # Punto de guardado propio: el conflicto no deja inservible
+                # la transacción de quien llama
+                with transaction.atomic(using=kwargs.get('using')):
+                    super().save(*args, **kwargs)
+        finally:
+            self.version_esperada = None
+            self.condicion_update = None
+        if actualizando:
+            # Valor exacto con If-Match; sin él, el mínimo posible
+            self.version += 1
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        values = [
+            (campo, modelo, models.F('version') + 1 if campo.attname == 'version' else valor)
+            for campo, modelo, valor in values
+        ]
+        if self.version_esperada is None and self.condicion_update is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        filas = base_qs.filter(pk=pk_val)
+        if self.version_esperada is not None:
+            filas = filas.filter(version=self.version_esperada)
+        if self.condicion_update is not None:
+            filas = filas.filter(self.condicion_update)
+        if not filas._update(values):
+            raise ConflictoVersion(
+                f'{self._meta.object_name} {pk_val} cambió después de leerse'
+            )
+        return True
+
 # ========================
 # MARCAS Y MODELOS
 # ========================
@@ -16,6 +94,13 @@ class Modelo(models.Model):
     id_marca = models.ForeignKey(Marca, on_delete=models.CASCADE, related_name='modelos')
     nombre = models.CharField(max_length=100)
 
+    class Meta:
+        constraints = [
+            # Un modelo por nombre dentro de la marca (importar_catalogo se
+            # apoya en ella para ser idempotente)
+            models.UniqueConstraint(fields=['id_marca', 'nombre'], name='modelo_marca_nombre_unico'),
+        ]
+
     def __str__(self):
         return f"{self.id_marca.nombre} {self.nombre}"
 
@@ -24,14 +109,45 @@ class Modelo(models.Model):
 # VEHÍCULOS
 # ========================
 
+# Caracteres que admite una placa; los separadores no cuentan al compararlas
+# ("ABC-123" es la misma placa que "abc 123")
+PLACA_VALIDA = re.compile(r'[0-9A-Za-z \-./]+')
+SEPARADORES_PLACA = ' -./'
+
+
+def normalizar_placa(placa):
+    """
+    En mayúsculas y sin separadores. Para una placa válida da lo mismo que
+    la columna placa_normalizada; con otro texto (lo que se va tecleando)
+    descarta lo que no sea letra o número.
+    """
+    return re.sub(r'[^0-9A-Z]', '', placa.upper())
+
+
 class Vehiculo(models.Model):
     placa = models.CharField(max_length=50, unique=True)
+    # La calcula la base de datos, también en bulk_create y update()
+    placa_normalizada = models.GeneratedField(
+        expression=reduce(
+            lambda expresion, separador: Replace(expresion, models.Value(separador), models.Value('')),
+            SEPARADORES_PLACA, Upper('placa'),
+        ),
+        output_field=models.CharField(max_length=50),
+        db_persist=True,
+    )
     id_modelo = models.ForeignKey(Modelo, on_delete=models.SET_NULL, null=True, blank=True, related_name='vehiculos')
     id_usuario_propietario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='vehiculos')
     ano = models.IntegerField(null=True, blank=True)
     color = models.CharField(max_length=50, null=True, blank=True)
     creado_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Una placa por vehículo sin importar cómo se escribió; el índice
+            # también resuelve el autocompletado por prefijo
+            models.UniqueConstraint(fields=['placa_normalizada'], name='vehiculo_placa_normalizada_unica'),
+        ]
+
     def __str__(self):
         return f"{self.placa} - {self.id_usuario_propietario.nombre}"
 
@@ -40,7 +156,7 @@ class Vehiculo(models.Model):
 # SOLICITUDES Y DETALLES
 # ========================
 
-class Solicitud(models.Model):
+class Solicitud(ModeloVersionado):
     id_vehiculo = models.ForeignKey(Vehiculo, on_delete=models.CASCADE, related_name='solicitudes')
     id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='solicitudes_creadas')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -48,6 +164,13 @@ class Solicitud(models.Model):
     descripcion = models.TextField(blank=True, null=True)
     referencia_externa = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Solicitudes del cliente / listado del asistente por fecha
+            models.Index(fields=['id_usuario', 'fecha_creacion'], name='solicitud_usuario_fecha_idx'),
+            models.Index(fields=['fecha_creacion', 'id'], name='solicitud_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Solicitud {self.id} - {self.id_usuario.nombre}"
 
@@ -58,6 +181,12 @@ class DetalleSolicitud(models.Model):
     costo = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     creado_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Exportación por rango de fechas
+            models.Index(fields=['creado_at', 'id'], name='detalle_creado_idx'),
+        ]
+
     def __str__(self):
         return f"Detalle de Solicitud {self.id_solicitud.id}"
 
@@ -66,7 +195,89 @@ class DetalleSolicitud(models.Model):
 # RESERVACIONES
 # ========================
 
-class Reservacion(models.Model):
+class ReservacionQuerySet(models.QuerySet):
+    def acumular_servicios(self, servicios=0, avance=0, completados=0, iniciado=False):
+        """
+        Aplica a cada reservación del queryset el cambio en sus servicios
+        con un solo UPDATE relativo, sin recontar los hijos: `servicios`
+        altas/bajas, `avance` puntos porcentuales y `completados` servicios
+        que entran (o salen) de completado. Los deltas pueden ser
+        expresiones (Case por pk) para aplicar un lote de reservaciones.
+
+        avance_global es el promedio de avance de los servicios (100 con
+        todos completados) y estado_global avanza solo: pendiente o
+        confirmada pasan a en_progreso con el primer avance y a completada
+        cuando todos los servicios terminan. cancelada no se toca.
+        """
+        def mas(campo, delta):
+            return models.ExpressionWrapper(
+                models.F(campo) + delta, output_field=models.IntegerField()
+            )
+
+        total = mas('servicios_total', servicios)
+        suma = mas('avance_suma', avance)
+        hechos = mas('servicios_completados', completados)
+        todos_completos = Exact(hechos, total) & GreaterThan(total, 0)
+        abierta = models.Q(estado_global__in=('pendiente', 'confirmada', 'en_progreso'))
+        iniciada = models.Q(estado_global__in=('pendiente', 'confirmada'))
+        if not iniciado:
+            iniciada &= GreaterThan(suma, 0) | GreaterThan(hechos, 0)
+        estado = models.Case(
+            models.When(abierta & todos_completos, then=models.Value('completada')),
+            models.When(iniciada, then=models.Value('en_progreso')),
+            default=models.F('estado_global'),
+        )
+
+        # Import diferido: agencia.resumen importa estos modelos
+        from agencia.resumen import registrar_transiciones
+
+        with transaction.atomic(savepoint=False):
+            # Los estados que cambiará el UPDATE, con la misma expresión y
+            # las filas bloqueadas, para el resumen del tablero
+            transiciones = Counter(
+                self.select_for_update()
+                .annotate(estado_nuevo=estado)
+                .exclude(estado_nuevo=models.F('estado_global'))
+                .values_list('estado_global', 'estado_nuevo')
+            )
+            actualizadas = self.update(
+                servicios_total=total,
+                avance_suma=suma,
+                servicios_completados=hechos,
+                avance_global=models.Case(
+                    models.When(LessThanOrEqual(total, 0), then=models.Value(0)),
+                    models.When(todos_completos, then=models.Value(100)),
+                    default=suma / total,
+                    output_field=models.IntegerField(),
+                ),
+                estado_global=estado,
+                version=models.F('version') + 1,
+            )
+            registrar_transiciones(Reservacion, transiciones)
+        return actualizadas
+
+    def recalcular_avance(self):
+        """Recuenta los acumulados desde los servicios (respaldo y migración)"""
+        servicios = ServicioReservado.objects.filter(
+            id_reservacion=models.OuterRef('pk')
+        ).order_by().values('id_reservacion')
+
+        def agregado(expresion, **filtro):
+            return Coalesce(models.Subquery(
+                servicios.filter(**filtro).annotate(valor=expresion).values('valor'),
+                output_field=models.IntegerField(),
+            ), 0)
+
+        self.update(
+            servicios_total=agregado(models.Count('pk')),
+            avance_suma=agregado(models.Sum('avance_porcentaje')),
+            servicios_completados=agregado(models.Count('pk'), estado='completado'),
+        )
+        # Sin deltas: recalcula avance_global y estado_global
+        return self.acumular_servicios()
+
+
+class Reservacion(ModeloVersionado):
     id_solicitud = models.ForeignKey(Solicitud, on_delete=models.CASCADE, related_name='reservaciones')
     fecha = models.DateTimeField(null=True, blank=True)
     hora = models.TimeField(null=True, blank=True)
@@ -77,6 +288,23 @@ class Reservacion(models.Model):
     fecha_inicio = models.DateTimeField(null=True, blank=True)
     fecha_fin = models.DateTimeField(null=True, blank=True)
     creado_at = models.DateTimeField(auto_now_add=True)
+    # Acumulados de sus servicios (ReservacionQuerySet.acumular_servicios)
+    servicios_total = models.PositiveIntegerField(default=0, editable=False)
+    servicios_completados = models.PositiveIntegerField(default=0, editable=False)
+    avance_suma = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ReservacionQuerySet.as_manager()
+
+    campos_acumulados = (
+        'servicios_total', 'servicios_completados', 'avance_suma', 'avance_global'
+    )
+
+    class Meta:
+        indexes = [
+            # Listado por fecha y búsqueda de reservaciones activas por estado
+            models.Index(fields=['fecha', 'id'], name='reservacion_fecha_idx'),
+            models.Index(fields=['estado_global', 'fecha'], name='reservacion_estado_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Reservación {self.id} - {self.id_solicitud.id}"
@@ -101,7 +329,22 @@ class ServicioTaller(models.Model):
 # SERVICIOS RESERVADOS
 # ========================
 
-class ServicioReservado(models.Model):
+class ServicioReservadoQuerySet(models.QuerySet):
+    def actualizar_ultimo_progreso(self):
+        """
+        Recalcula el apuntador al progreso más reciente de cada servicio
+        del queryset en un solo UPDATE. Devuelve las filas afectadas.
+        """
+        ultimo = ProgresoServicio.objects.filter(
+            id_serv_res=models.OuterRef('pk')
+        ).order_by('-fecha', '-pk').values('pk')[:1]
+        return self.update(
+            ultimo_progreso=models.Subquery(ultimo),
+            version=models.F('version') + 1,
+        )
+
+
+class ServicioReservado(ModeloVersionado):
     id_reservacion = models.ForeignKey(Reservacion, on_delete=models.CASCADE, related_name='servicios_reservados')
     id_servicio = models.ForeignKey(ServicioTaller, on_delete=models.CASCADE, related_name='servicios_reservados')
     id_usuario_taller = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='servicios_asignados')
@@ -111,6 +354,19 @@ class ServicioReservado(models.Model):
     fecha_inicio = models.DateTimeField(null=True, blank=True)
     fecha_fin = models.DateTimeField(null=True, blank=True)
     creado_at = models.DateTimeField(auto_now_add=True)
+    # Progreso más reciente (desnormalizado para lecturas O(1))
+    ultimo_progreso = models.ForeignKey(
+        'ProgresoServicio', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    objects = ServicioReservadoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Servicios del técnico / listado del asistente por fecha de alta
+            models.Index(fields=['id_usuario_taller', 'creado_at'], name='servres_tecnico_creado_idx'),
+            models.Index(fields=['creado_at', 'id'], name='servres_creado_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id_servicio.nombre} - {self.estado}"
@@ -127,5 +383,106 @@ class ProgresoServicio(models.Model):
     comentario = models.TextField(blank=True, null=True)
     evidencia_url = models.CharField(max_length=300, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Historial de progreso de un servicio y cálculo del último
+            models.Index(fields=['id_serv_res', 'fecha'], name='progreso_servicio_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Progreso {self.porcentaje}% del servicio {self.id_serv_res.id}"
+
+
+# ========================
+# BITÁCORA DE CAMBIOS
+# ========================
+
+class RegistroCambio(models.Model):
+    """
+    Bitácora de altas, cambios y bajas de solicitudes, reservaciones,
+    servicios reservados y progresos para la sincronización incremental.
+    El id es el cursor; id_cliente e id_tecnico son los dueños del registro
+    al momento del cambio (sin FK: la bitácora sobrevive a las bajas).
+    """
+    OPERACIONES = [('alta', 'Alta'), ('cambio', 'Cambio'), ('baja', 'Baja')]
+
+    modelo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    operacion = models.CharField(max_length=10, choices=OPERACIONES)
+    id_cliente = models.BigIntegerField(null=True, blank=True)
+    id_tecnico = models.BigIntegerField(null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Cambios de un usuario posteriores al cursor
+            models.Index(fields=['id_cliente', 'id'], name='cambio_cliente_idx'),
+            models.Index(fields=['id_tecnico', 'id'], name='cambio_tecnico_idx'),
+            models.Index(fields=['fecha'], name='cambio_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.operacion} {self.modelo} {self.objeto_id}"
+
+
+# ========================
+# RESUMEN DEL TABLERO
+# ========================
+# Contadores que mantiene agencia.resumen con cada escritura, para que el
+# tablero del asistente no recorra el historial.
+
+class ResumenEstado(models.Model):
+    """Solicitudes, reservaciones o servicios en cada estado"""
+    entidad = models.CharField(max_length=20)
+    estado = models.CharField(max_length=100)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entidad', 'estado'], name='resumen_estado_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.entidad} {self.estado}: {self.total}"
+
+
+class ResumenTecnico(models.Model):
+    """Servicios asignados a un técnico en cada estado"""
+    id_tecnico = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='+')
+    estado = models.CharField(max_length=100)
+    servicios = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['id_tecnico', 'estado'], name='resumen_tecnico_unico'),
+        ]
+
+    def __str__(self):
+        return f"Técnico {self.id_tecnico_id} {self.estado}: {self.servicios}"
+
+
+class ResumenDiario(models.Model):
+    """Altas del día (hora local) e ingresos por los detalles creados ese día"""
+    fecha = models.DateField(unique=True)
+    solicitudes = models.IntegerField(default=0)
+    reservaciones = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Resumen {self.fecha}"
+
+
+# ========================
+# VERSIÓN DEL CATÁLOGO
+# ========================
+
+class VersionCatalogo(models.Model):
+    """
+    Fila única con la versión de marcas, modelos y servicios del taller
+    (agencia.cache_catalogo). Vive en la base de datos para que todos los
+    procesos vean el mismo cambio.
+    """
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Catálogo v{self.version}"
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db.models import Q
+
+
+# Rechazar avances menores al guardado (sobrescribible en settings). Sin
+# esto gana la última escritura, pero ya no una mezcla de dos.
+MONOTONO = getattr(settings, 'PROGRESO_MONOTONO', False)
+
+
+class AvanceRetrocede(Exception):
+    """Con avance monótono, el porcentaje nuevo es menor que el guardado"""
+
+
+def estado_por_avance(porcentaje, estado):
+    """Estado que implica un registro de progreso con `porcentaje`"""
+    if porcentaje == 100:
+        return 'completado'
+    if porcentaje > 0:
+        return 'en_progreso'
+    return estado
+
+
+def preparar_avance(servicio, avance=None, estado=None, ultimo_progreso=None, monotono=None):
+    """
+    Aplica a `servicio` el avance, el estado y el último progreso recibidos
+    y devuelve los update_fields para un save() de solo esas columnas: un
+    UPDATE que no reescribe lo que otra petición cambió en el resto de la
+    fila.
+
+    `servicio` debe leerse dentro de la transacción con
+    select_for_update(of=('self',)) (en SQLite lo serializa el modo
+    IMMEDIATE), así los valores anteriores que usa reflejar_servicio son
+    los vigentes. Con avance monótono el WHERE además exige que el avance
+    guardado no supere al nuevo.
+    """
+    if monotono is None:
+        monotono = MONOTONO
+    campos = []
+    if avance is not None:
+        if monotono:
+            if avance < servicio.avance_porcentaje:
+                raise AvanceRetrocede(
+                    f'El avance guardado ({servicio.avance_porcentaje}%) es mayor que {avance}%'
+                )
+            servicio.condicion_update = Q(avance_porcentaje__lte=avance)
+        if avance != servicio.avance_porcentaje:
+            servicio.avance_porcentaje = avance
+            campos.append('avance_porcentaje')
+    if estado is not None and estado != servicio.estado:
+        servicio.estado = estado
+        campos.append('estado')
+    if ultimo_progreso is not None:
+        servicio.ultimo_progreso = ultimo_progreso
+        campos.append('ultimo_progreso')
+    return campos
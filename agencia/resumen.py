@@ -0,0 +1,312 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from agencia import estados
+from agencia.models import (
+    Solicitud, DetalleSolicitud, Reservacion, ServicioReservado,
+    ResumenEstado, ResumenTecnico, ResumenDiario,
+)
+
+
+# Entidad del resumen y columna de estado de cada modelo
+ESTADOS = {
+    Solicitud: ('solicitud', 'id_estado'),
+    Reservacion: ('reservacion', 'estado_global'),
+    ServicioReservado: ('servicio', 'estado'),
+}
+
+# Columnas que se recuerdan al cargar una instancia para saber, al
+# guardarla, qué contadores mover
+SEGUIDAS = {
+    Solicitud: ('id_estado',),
+    Reservacion: ('estado_global',),
+    ServicioReservado: ('estado', 'id_usuario_taller_id'),
+    DetalleSolicitud: ('costo',),
+}
+
+# Fecha de alta y columna de ResumenDiario de cada modelo
+DIARIO = {
+    Solicitud: ('fecha_creacion', 'solicitudes'),
+    Reservacion: ('creado_at', 'reservaciones'),
+    DetalleSolicitud: ('creado_at', 'ingresos'),
+}
+
+
+def _estado(valor):
+    # id_estado de las solicitudes es numérico (o nulo)
+    return '' if valor is None else str(valor)
+
+
+# ==========================================
+# ESCRITURA
+# ==========================================
+
+def _sumar(modelo, claves, deltas):
+    """
+    deltas: {(valor de cada clave): {campo: delta}}. Un UPDATE relativo
+    para todas las filas; si falta alguna, se inserta en cero (ignorando
+    a quien la haya creado entre tanto) y se le suma con otro UPDATE.
+    """
+    deltas = {
+        clave: {campo: delta for campo, delta in campos.items() if delta}
+        for clave, campos in deltas.items()
+    }
+    deltas = {clave: campos for clave, campos in deltas.items() if campos}
+    if not deltas:
+        return
+
+    def condicion(clave):
+        return Q(**dict(zip(claves, clave)))
+
+    def actualizar(filas):
+        campos = {campo for clave in filas for campo in deltas[clave]}
+        return modelo.objects.filter(reduce(or_, map(condicion, filas))).update(**{
+            campo: F(campo) + Case(
+                *[
+                    When(condicion(clave), then=Value(deltas[clave][campo]))
+                    for clave in filas if campo in deltas[clave]
+                ],
+                default=Value(0),
+                output_field=modelo._meta.get_field(campo),
+            )
+            for campo in campos
+        })
+
+    if actualizar(list(deltas)) == len(deltas):
+        return
+    existentes = set(
+        modelo.objects.filter(reduce(or_, map(condicion, deltas))).values_list(*claves)
+    )
+    faltantes = [clave for clave in deltas if clave not in existentes]
+    attnames = [modelo._meta.get_field(nombre).attname for nombre in claves]
+    modelo.objects.bulk_create(
+        [modelo(**dict(zip(attnames, clave))) for clave in faltantes], ignore_conflicts=True
+    )
+    actualizar(faltantes)
+
+
+class Deltas:
+    """Cambios pendientes para las tres tablas; aplicar() los escribe"""
+
+    def __init__(self):
+        self.estados = Counter()
+        self.tecnicos = Counter()
+        self.dias = defaultdict(Counter)
+
+    def agregar(self, modelo, valores, signo, fecha=None):
+        """
+        Aporte de un registro con `valores` ({columna seguida: valor}),
+        sumado (signo 1) o restado (-1). Con `fecha`, también su día.
+        """
+        if modelo in ESTADOS:
+            entidad, columna = ESTADOS[modelo]
+            self.estados[entidad, _estado(valores[columna])] += signo
+        if modelo is ServicioReservado and valores['id_usuario_taller_id'] is not None:
+            self.tecnicos[valores['id_usuario_taller_id'], valores['estado']] += signo
+        if fecha is not None and modelo in DIARIO:
+            campo = DIARIO[modelo][1]
+            aporte = (valores['costo'] or 0) if modelo is DetalleSolicitud else 1
+            self.dias[timezone.localdate(fecha)][campo] += signo * aporte
+
+    def aplicar(self):
+        _sumar(ResumenEstado, ('entidad', 'estado'), {
+            clave: {'total': n} for clave, n in self.estados.items()
+        })
+        _sumar(ResumenTecnico, ('id_tecnico', 'estado'), {
+            clave: {'servicios': n} for clave, n in self.tecnicos.items()
+        })
+        _sumar(ResumenDiario, ('fecha',), {
+            (fecha,): dict(campos) for fecha, campos in self.dias.items()
+        })
+
+
+def _valores(instancia):
+    return {columna: getattr(instancia, columna) for columna in SEGUIDAS[type(instancia)]}
+
+
+def _fecha(instancia):
+    if type(instancia) in DIARIO:
+        return getattr(instancia, DIARIO[type(instancia)][0])
+    return None
+
+
+def recordar(instancia):
+    """Guarda los valores seguidos tal como están en la base de datos"""
+    if all(columna in instancia.__dict__ for columna in SEGUIDAS[type(instancia)]):
+        instancia._resumen = _valores(instancia)
+
+
+def registrar_altas(instancias, signo=1):
+    """Altas (o bajas, signo -1) de instancias de un mismo modelo"""
+    deltas = Deltas()
+    for instancia in instancias:
+        deltas.agregar(type(instancia), _valores(instancia), signo, _fecha(instancia))
+        recordar(instancia)
+    deltas.aplicar()
+
+
+def registrar_guardado(instancia, update_fields=None):
+    """Mueve los contadores de lo que cambió desde que se cargó la instancia"""
+    anteriores = getattr(instancia, '_resumen', None)
+    if anteriores is None:
+        # Cargada sin las columnas seguidas (only/defer)
+        return
+    actuales = _valores(instancia)
+    if update_fields is not None:
+        # Lo que no se escribió sigue como estaba en la base de datos
+        escritas = {instancia._meta.get_field(campo).attname for campo in update_fields}
+        actuales = {
+            columna: valor if columna in escritas else anteriores[columna]
+            for columna, valor in actuales.items()
+        }
+    if actuales != anteriores:
+        deltas = Deltas()
+        modelo, fecha = type(instancia), _fecha(instancia)
+        deltas.agregar(modelo, anteriores, -1, fecha)
+        deltas.agregar(modelo, actuales, 1, fecha)
+        deltas.aplicar()
+    instancia._resumen = actuales
+
+
+def columnas_lote(modelo):
+    """Columnas además del estado que cambiar_estado_lote debe leer"""
+    return tuple(columna for columna in SEGUIDAS[modelo] if columna != ESTADOS[modelo][1])
+
+
+def registrar_lote(modelo, filas, destino):
+    """
+    Registros que pasaron a `destino` con un update(); cada fila es
+    (estado anterior, *columnas_lote(modelo)).
+    """
+    columnas = SEGUIDAS[modelo]
+    deltas = Deltas()
+    for fila in filas:
+        anteriores = dict(zip(columnas, fila))
+        deltas.agregar(modelo, anteriores, -1)
+        deltas.agregar(modelo, {**anteriores, ESTADOS[modelo][1]: destino}, 1)
+    deltas.aplicar()
+
+
+def registrar_transiciones(modelo, transiciones):
+    """Estados derivados en SQL: {(estado anterior, estado nuevo): n}"""
+    entidad = ESTADOS[modelo][0]
+    movidos = Counter()
+    for (anterior, nuevo), n in transiciones.items():
+        movidos[entidad, _estado(anterior)] -= n
+        movidos[entidad, _estado(nuevo)] += n
+    _sumar(ResumenEstado, ('entidad', 'estado'), {
+        clave: {'total': n} for clave, n in movidos.items()
+    })
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+
+def leer_tablero(dias):
+    """
+    Cifras del tablero en tres lecturas de tablas pequeñas: su tamaño
+    depende de estados, técnicos y días pedidos, no del historial.
+    """
+    por_estado = defaultdict(dict)
+    for entidad, estado, total in ResumenEstado.objects.values_list('entidad', 'estado', 'total'):
+        por_estado[entidad][estado] = total
+
+    tecnicos = {}
+    for fila in ResumenTecnico.objects.filter(servicios__gt=0).values(
+        'id_tecnico', 'estado', 'servicios', nombre=F('id_tecnico__nombre')
+    ).order_by('id_tecnico'):
+        tecnico = tecnicos.setdefault(fila['id_tecnico'], {
+            'id': fila['id_tecnico'], 'nombre': fila['nombre'], 'abiertos': 0, 'por_estado': {},
+        })
+        tecnico['por_estado'][fila['estado']] = fila['servicios']
+        if fila['estado'] in estados.ESTADOS_SERVICIO_ABIERTOS:
+            tecnico['abiertos'] += fila['servicios']
+
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    diario = list(ResumenDiario.objects.filter(fecha__gte=desde).order_by('fecha').values(
+        'fecha', 'solicitudes', 'reservaciones', 'ingresos'
+    ))
+    reservaciones = por_estado['reservacion']
+    return {
+        'solicitudes_por_estado': por_estado['solicitud'],
+        'reservaciones_por_estado': reservaciones,
+        'reservaciones_abiertas': sum(
+            reservaciones.get(estado, 0)
+            for estado, siguientes in estados.TRANSICIONES_RESERVACION.items() if siguientes
+        ),
+        'servicios_por_estado': por_estado['servicio'],
+        'tecnicos': list(tecnicos.values()),
+        'desde': desde,
+        'diario': diario,
+        'ingresos': sum((dia['ingresos'] for dia in diario), Decimal(0)),
+    }
+
+
+# ==========================================
+# RECONSTRUCCIÓN
+# ==========================================
+
+def _por_rangos(queryset, lote):
+    """Rebanadas del queryset por rangos de pk de tamaño `lote`"""
+    ultimo = queryset.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+    for inicio in range(0, ultimo, lote):
+        yield queryset.filter(pk__gt=inicio, pk__lte=inicio + lote)
+
+
+def reconstruir(lote=5000):
+    """
+    Recuenta los tres resúmenes desde las tablas, agregando por rangos de
+    pk para no leer el historial de una vez, y los reemplaza en una
+    transacción. Las escrituras que ocurran durante el recuento se pierden:
+    conviene correrlo en una ventana sin actividad.
+    """
+    por_estado, tecnicos = Counter(), Counter()
+    dias = defaultdict(Counter)
+    # Los estados conocidos quedan en cero: cambiar a ellos es un UPDATE
+    for entidad, conocidos in (
+        ('solicitud', ['']),
+        ('reservacion', estados.ESTADOS_RESERVACION),
+        ('servicio', estados.ESTADOS_SERVICIO),
+    ):
+        por_estado.update({(entidad, estado): 0 for estado in conocidos})
+    for modelo, (entidad, columna) in ESTADOS.items():
+        for rango in _por_rangos(modelo.objects.order_by(), lote):
+            for estado, n in rango.values_list(columna).annotate(n=Count('pk')):
+                por_estado[entidad, _estado(estado)] += n
+    for rango in _por_rangos(ServicioReservado.objects.filter(id_usuario_taller__isnull=False), lote):
+        for tecnico, estado, n in (
+            rango.order_by().values_list('id_usuario_taller', 'estado').annotate(n=Count('pk'))
+        ):
+            tecnicos[tecnico, estado] += n
+    for tecnico in {tecnico for tecnico, _ in tecnicos}:
+        tecnicos.update({(tecnico, estado): 0 for estado in estados.ESTADOS_SERVICIO})
+    for modelo, (columna, campo) in DIARIO.items():
+        aporte = Sum('costo') if modelo is DetalleSolicitud else Count('pk')
+        for rango in _por_rangos(modelo.objects.order_by(), lote):
+            for fecha, valor in rango.values_list(TruncDate(columna)).annotate(valor=aporte):
+                dias[fecha][campo] += valor or 0
+
+    with transaction.atomic():
+        for modelo in (ResumenEstado, ResumenTecnico, ResumenDiario):
+            modelo.objects.all().delete()
+        ResumenEstado.objects.bulk_create([
+            ResumenEstado(entidad=entidad, estado=estado, total=n)
+            for (entidad, estado), n in por_estado.items()
+        ], batch_size=lote)
+        ResumenTecnico.objects.bulk_create([
+            ResumenTecnico(id_tecnico_id=tecnico, estado=estado, servicios=n)
+            for (tecnico, estado), n in tecnicos.items()
+        ], batch_size=lote)
+        ResumenDiario.objects.bulk_create([
+            ResumenDiario(fecha=fecha, **campos) for fecha, campos in dias.items()
+        ], batch_size=lote)
+    return len(por_estado) + len(tecnicos) + len(dias)
@@ -0,0 +1,239 @@
+from django.db.models import F, Q
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from agencia.cache_catalogo import invalidar_catalogo
+from agencia import resumen
+from agencia.cambios import RUTAS, registrar_bajas_para_tecnicos, registrar_instancia
+from agencia.models import (
+    Marca, Modelo, ServicioTaller, Vehiculo,
+    Solicitud, DetalleSolicitud, Reservacion, ServicioReservado, ProgresoServicio,
+)
+from users.models import Usuario
+
+
+# ==========================================
+# CATÁLOGOS
+# ==========================================
+
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Modelo)
+@receiver(post_save, sender=ServicioTaller)
+@receiver(post_delete, sender=Marca)
+@receiver(post_delete, sender=Modelo)
+@receiver(post_delete, sender=ServicioTaller)
+def invalidar_catalogo_al_cambiar(sender, **kwargs):
+    invalidar_catalogo()
+
+
+# ==========================================
+# VERSIÓN DE FILA
+# ==========================================
+# El detalle de una solicitud muestra sus detalles y su reservación, y el
+# de una reservación el número de servicios: cuando cambian, también cambia
+# la versión (y el ETag) del registro padre.
+
+def _incrementar_version(modelo, pk):
+    modelo.objects.filter(pk=pk).update(version=F('version') + 1)
+
+
+def _borrado_por(modelo, origin):
+    """El borrado viene en cascada desde `modelo` (instancia o queryset)"""
+    return getattr(origin, 'model', type(origin)) is modelo
+
+
+@receiver(post_save, sender=Reservacion)
+@receiver(post_save, sender=DetalleSolicitud)
+def versionar_solicitud(sender, instance, **kwargs):
+    _incrementar_version(Solicitud, instance.id_solicitud_id)
+
+
+@receiver(post_delete, sender=Reservacion)
+@receiver(post_delete, sender=DetalleSolicitud)
+def versionar_solicitud_al_borrar(sender, instance, origin=None, **kwargs):
+    if not _borrado_por(Solicitud, origin):
+        _incrementar_version(Solicitud, instance.id_solicitud_id)
+
+
+# Los detalles también muestran datos de otros registros: el vehículo con
+# su modelo, marca y propietario, el cliente, el técnico, el servicio del
+# taller y la solicitud o reservación padre. Si un save() cambia uno de
+# esos campos, sube la versión de las filas que lo muestran. Las lecturas no
+# pagan nada: el cambio se detecta al guardar.
+# {modelo: [(modelo que lo muestra, rutas hasta el registro, campos mostrados)]}
+MOSTRADO_EN = {
+    Vehiculo: [
+        (Solicitud, ('id_vehiculo',),
+         ('placa', 'id_modelo_id', 'id_usuario_propietario_id', 'ano', 'color')),
+        (Reservacion, ('id_solicitud__id_vehiculo',), ('placa', 'id_modelo_id', 'color')),
+        (ServicioReservado, ('id_reservacion__id_solicitud__id_vehiculo',), ('placa', 'id_modelo_id')),
+    ],
+    Modelo: [
+        (Solicitud, ('id_vehiculo__id_modelo',), ('nombre', 'id_marca_id')),
+        (Reservacion, ('id_solicitud__id_vehiculo__id_modelo',), ('nombre', 'id_marca_id')),
+        (ServicioReservado, ('id_reservacion__id_solicitud__id_vehiculo__id_modelo',), ('nombre', 'id_marca_id')),
+    ],
+    Marca: [
+        (Solicitud, ('id_vehiculo__id_modelo__id_marca',), ('nombre',)),
+        (Reservacion, ('id_solicitud__id_vehiculo__id_modelo__id_marca',), ('nombre',)),
+        (ServicioReservado, ('id_reservacion__id_solicitud__id_vehiculo__id_modelo__id_marca',), ('nombre',)),
+    ],
+    Usuario: [
+        (Solicitud, ('id_usuario', 'id_vehiculo__id_usuario_propietario'), ('nombre', 'email')),
+        (Reservacion, ('id_solicitud__id_usuario',), ('nombre',)),
+        (ServicioReservado, ('id_usuario_taller',), ('nombre',)),
+    ],
+    Solicitud: [
+        (Reservacion, ('id_solicitud',), ('descripcion', 'id_usuario_id', 'id_vehiculo_id')),
+        (ServicioReservado, ('id_reservacion__id_solicitud',), ('id_vehiculo_id',)),
+    ],
+    Reservacion: [
+        (ServicioReservado, ('id_reservacion',), ('fecha',)),
+    ],
+    ServicioTaller: [
+        (ServicioReservado, ('id_servicio',), ('nombre', 'costo_base')),
+    ],
+}
+
+
+@receiver(pre_save, sender=Vehiculo)
+@receiver(pre_save, sender=Modelo)
+@receiver(pre_save, sender=Marca)
+@receiver(pre_save, sender=Usuario)
+@receiver(pre_save, sender=Solicitud)
+@receiver(pre_save, sender=Reservacion)
+@receiver(pre_save, sender=ServicioTaller)
+def detectar_mostrados(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Compara contra la fila guardada, con una lectura por pk y solo de los
+    # campos mostrados que este save() escribe: lo que no se escribe (p. ej.
+    # el last_login del inicio de sesión) sigue igual en la base de datos
+    instance._mostrados_cambiados = set()
+    if raw or instance._state.adding:
+        return
+    campos = {campo for _, _, campos in MOSTRADO_EN[sender] for campo in campos}
+    if update_fields is not None:
+        campos &= {sender._meta.get_field(campo).attname for campo in update_fields}
+    if not campos:
+        return
+    guardados = sender.objects.filter(pk=instance.pk).values(*campos).first()
+    if guardados is not None:
+        instance._mostrados_cambiados = {
+            campo for campo in campos if guardados[campo] != getattr(instance, campo)
+        }
+
+
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_save, sender=Modelo)
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=Solicitud)
+@receiver(post_save, sender=Reservacion)
+@receiver(post_save, sender=ServicioTaller)
+def versionar_dependientes(sender, instance, created, **kwargs):
+    cambiados = getattr(instance, '_mostrados_cambiados', None)
+    if created or not cambiados:
+        return
+    for modelo, rutas, campos in MOSTRADO_EN[sender]:
+        if cambiados.intersection(campos):
+            filtro = Q()
+            for ruta in rutas:
+                filtro |= Q(**{ruta: instance.pk})
+            modelo.objects.filter(filtro).update(version=F('version') + 1)
+
+
+# Altas y bajas de servicios también mueven los acumulados de avance de la
+# reservación (acumular_servicios incrementa la versión). Los cambios de
+# avance o estado los reflejan las vistas (agencia.avance).
+
+def _acumular_en_reservacion(servicio, signo):
+    Reservacion.objects.filter(pk=servicio.id_reservacion_id).acumular_servicios(
+        servicios=signo,
+        avance=signo * servicio.avance_porcentaje,
+        completados=signo * (servicio.estado == 'completado'),
+    )
+
+
+@receiver(post_save, sender=ServicioReservado)
+def versionar_reservacion_al_asignar(sender, instance, created, **kwargs):
+    if created:
+        _acumular_en_reservacion(instance, 1)
+
+
+@receiver(post_delete, sender=ServicioReservado)
+def versionar_reservacion_al_quitar(sender, instance, origin=None, **kwargs):
+    if not _borrado_por(Reservacion, origin):
+        _acumular_en_reservacion(instance, -1)
+
+
+# ==========================================
+# BITÁCORA DE CAMBIOS
+# ==========================================
+# Las escrituras con update() o bulk_create registran explícitamente
+# (agencia.cambios.registrar).
+
+@receiver(post_save, sender=Solicitud)
+@receiver(post_save, sender=Reservacion)
+@receiver(post_save, sender=ServicioReservado)
+@receiver(post_save, sender=ProgresoServicio)
+def registrar_guardado(sender, instance, created, **kwargs):
+    registrar_instancia(instance, 'alta' if created else 'cambio')
+
+
+@receiver(pre_delete, sender=Solicitud)
+@receiver(pre_delete, sender=Reservacion)
+@receiver(pre_delete, sender=ServicioReservado)
+@receiver(pre_delete, sender=ProgresoServicio)
+def registrar_baja(sender, instance, origin=None, **kwargs):
+    # Antes del DELETE para poder leer los dueños. En cascada basta la baja
+    # del registro de origen: la app descarta sus dependientes. Los
+    # técnicos, que no son dueños del origen, reciben la de sus servicios.
+    if any(_borrado_por(modelo, origin) for modelo in RUTAS if modelo is not sender):
+        return
+    registrar_instancia(instance, 'baja')
+    if sender is Reservacion:
+        registrar_bajas_para_tecnicos(ServicioReservado.objects.filter(id_reservacion=instance.pk))
+    elif sender is Solicitud:
+        registrar_bajas_para_tecnicos(
+            ServicioReservado.objects.filter(id_reservacion__id_solicitud=instance.pk)
+        )
+
+
+@receiver(post_save, sender=DetalleSolicitud)
+@receiver(post_delete, sender=DetalleSolicitud)
+def registrar_cambio_de_solicitud(sender, instance, origin=None, **kwargs):
+    # Los detalles viajan dentro de la solicitud: cambiarlos es cambiarla
+    if not _borrado_por(Solicitud, origin):
+        registrar_instancia(instance.id_solicitud, 'cambio')
+
+
+# ==========================================
+# RESUMEN DEL TABLERO
+# ==========================================
+# Los update() por lote y los estados derivados en SQL mueven el resumen
+# explícitamente (agencia.estados, ReservacionQuerySet.acumular_servicios).
+
+@receiver(post_init, sender=Solicitud)
+@receiver(post_init, sender=DetalleSolicitud)
+@receiver(post_init, sender=Reservacion)
+@receiver(post_init, sender=ServicioReservado)
+def recordar_para_resumen(sender, instance, **kwargs):
+    resumen.recordar(instance)
+
+
+@receiver(post_save, sender=Solicitud)
+@receiver(post_save, sender=DetalleSolicitud)
+@receiver(post_save, sender=Reservacion)
+@receiver(post_save, sender=ServicioReservado)
+def resumir_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        resumen.registrar_altas([instance])
+    else:
+        resumen.registrar_guardado(instance, update_fields)
+
+
+@receiver(post_delete, sender=Solicitud)
+@receiver(post_delete, sender=DetalleSolicitud)
+@receiver(post_delete, sender=Reservacion)
+@receiver(post_delete, sender=ServicioReservado)
+def resumir_baja(sender, instance, **kwargs):
+    resumen.registrar_altas([instance], -1)
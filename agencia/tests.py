@@ -1,3 +1,1932 @@
+import asyncio
+import csv
+import io
+import json
+import re
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APITestCase
+
+from agencia.models import (
+    Marca, Modelo, Vehiculo, Solicitud, DetalleSolicitud,
+    Reservacion, ServicioTaller, ServicioReservado, ProgresoServicio,
+    ConflictoVersion, ResumenEstado, ResumenTecnico, ResumenDiario, VersionCatalogo,
+)
+from users.models import Usuario, TipoUsuario
+from users.api.tokens import RefreshTokenConRol
+from agencia import agenda, busqueda, exportacion, resumen
+from agencia.agenda import AgendaTaller
+from agencia.cache_catalogo import version_catalogo
+from agencia.carga import RepartoCarga
+from agencia.eventos import BrokerLocal, broker, formatear_evento
+from agencia.api.pagination import KeysetPagination
+
+
+# ==========================================
+# DATOS DE PRUEBA A ESCALA
+# ==========================================
+
+# Volumen suficiente para que cada listado ocupe varias páginas
+SOLICITUDES_POR_CLIENTE = 60
+DETALLES_POR_SOLICITUD = 2
+SERVICIOS_POR_RESERVACION = 2
+PROGRESOS_POR_SERVICIO = 3
+
+# Tamaños de página con los que se repite cada listado: el número
+# de consultas debe ser el mismo con ambos
+PAGE_SIZES = (5, 50)
+
+
+def crear_datos_a_escala(cls):
+    """Puebla todos los modelos con bulk_create y guarda referencias en cls"""
+    tipos = {
+        cve: TipoUsuario.objects.create(cve=cve, descripcion=cve.title())
+        for cve in ('CLIENTE', 'ASISTENTE', 'TALLER')
+    }
+    cls.cliente = Usuario.objects.create_user(
+        'cliente@test.com', 'Cliente Principal', tipos['CLIENTE'], 'password123'
+    )
+    cls.otro_cliente = Usuario.objects.create_user(
+        'otro@test.com', 'Otro Cliente', tipos['CLIENTE'], 'password123'
+    )
+    cls.asistente = Usuario.objects.create_user(
+        'asistente@test.com', 'Asistente', tipos['ASISTENTE'], 'password123'
+    )
+    cls.tecnico = Usuario.objects.create_user(
+        'tecnico@test.com', 'Técnico Principal', tipos['TALLER'], 'password123'
+    )
+    cls.otro_tecnico = Usuario.objects.create_user(
+        'tecnico2@test.com', 'Otro Técnico', tipos['TALLER'], 'password123'
+    )
+
+    marcas = Marca.objects.bulk_create([Marca(nombre=f'Marca {i}') for i in range(10)])
+    modelos = Modelo.objects.bulk_create([
+        Modelo(id_marca=marca, nombre=f'Modelo {marca.pk}-{j}')
+        for marca in marcas for j in range(8)
+    ])
+    cls.marca = marcas[0]
+    servicios_taller = ServicioTaller.objects.bulk_create([
+        ServicioTaller(nombre=f'Servicio {i}', costo_base=100 * i, duracion_estimada=30 * i)
+        for i in range(1, 13)
+    ])
+    cls.servicio_taller = servicios_taller[0]
+
+    vehiculos = Vehiculo.objects.bulk_create([
+        Vehiculo(
+            placa=f'{propietario.pk}-PLC-{i:04d}',
+            id_modelo=modelos[i % len(modelos)] if i % 7 else None,
+            id_usuario_propietario=propietario,
+            ano=2000 + i % 25,
+            color='Rojo',
+        )
+        for propietario in (cls.cliente, cls.otro_cliente)
+        for i in range(SOLICITUDES_POR_CLIENTE)
+    ])
+    solicitudes = Solicitud.objects.bulk_create([
+        Solicitud(
+            id_vehiculo=vehiculo,
+            id_usuario=vehiculo.id_usuario_propietario,
+            id_estado=1,
+            descripcion=f'Revisión del vehículo {vehiculo.placa}',
+        )
+        for vehiculo in vehiculos
+    ])
+    DetalleSolicitud.objects.bulk_create([
+        DetalleSolicitud(id_solicitud=solicitud, observaciones='Observación', costo=250)
+        for solicitud in solicitudes for _ in range(DETALLES_POR_SOLICITUD)
+    ])
+    # Una de cada cinco solicitudes queda sin reservación
+    reservaciones = Reservacion.objects.bulk_create([
+        Reservacion(id_solicitud=solicitud, estado_global='pendiente', notas='Notas')
+        for i, solicitud in enumerate(solicitudes) if i % 5
+    ])
+    servicios = ServicioReservado.objects.bulk_create([
+        ServicioReservado(
+            id_reservacion=reservacion,
+            id_servicio=servicios_taller[j],
+            id_usuario_taller=cls.tecnico if j == 0 else cls.otro_tecnico,
+        )
+        for reservacion in reservaciones for j in range(SERVICIOS_POR_RESERVACION)
+    ])
+    ProgresoServicio.objects.bulk_create([
+        ProgresoServicio(id_serv_res=servicio, porcentaje=25 * (k + 1), comentario='Avance')
+        for servicio in servicios for k in range(PROGRESOS_POR_SERVICIO)
+    ])
+    ServicioReservado.objects.actualizar_ultimo_progreso()
+    Reservacion.objects.recalcular_avance()
+    resumen.reconstruir()
+
+    cls.reservacion = next(
+        r for r in reservaciones if r.id_solicitud.id_usuario_id == cls.cliente.pk
+    )
+    cls.solicitud = cls.reservacion.id_solicitud
+    cls.vehiculo = cls.solicitud.id_vehiculo
+    cls.servicio = next(
+        s for s in servicios
+        if s.id_reservacion_id == cls.reservacion.pk and s.id_usuario_taller_id == cls.tecnico.pk
+    )
+    cls.progreso = ProgresoServicio.objects.filter(id_serv_res=cls.servicio).first()
+
+
+class PresupuestoConsultasMixin:
+    """
+    Utilidades para afirmar un máximo de consultas SQL por endpoint.
+    La autenticación se hace con un JWT real (con el claim de rol) para que
+    las consultas de autenticación también cuenten en el presupuesto.
+    """
+
+    def autenticar(self, usuario):
+        token = RefreshTokenConRol.for_user(usuario).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def medir(self, metodo, url, data=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = getattr(self.client, metodo)(url, data, format='json')
+        return response, len(consultas)
+
+    def assertPresupuesto(self, usuario, metodo, url, maximo, data=None, status_code=None):
+        self.autenticar(usuario)
+        response, total = self.medir(metodo, url, data)
+        if status_code is not None:
+            self.assertEqual(response.status_code, status_code, response.content[:300])
+        else:
+            self.assertLess(response.status_code, 300, response.content[:300])
+        self.assertLessEqual(
+            total, maximo,
+            f'{metodo.upper()} {url}: {total} consultas, presupuesto {maximo}'
+        )
+        return response
+
+    def assertPresupuestoListado(self, usuario, url, maximo):
+        """El listado cumple el presupuesto y no depende del tamaño de página"""
+        self.autenticar(usuario)
+        totales = []
+        for page_size in PAGE_SIZES:
+            # Se mide la ruta en frío: los catálogos se sirven desde cache
+            cache.clear()
+            with mock.patch.object(PageNumberPagination, 'page_size', page_size), \
+                    mock.patch.object(KeysetPagination, 'page_size', page_size):
+                response, total = self.medir('get', url)
+            self.assertEqual(response.status_code, 200, response.content[:300])
+            self.assertGreater(
+                len(response.data['results']), min(PAGE_SIZES) - 1,
+                f'{url}: la página debe estar llena para que la medición sea válida'
+            )
+            totales.append(total)
+        self.assertLessEqual(
+            max(totales), maximo,
+            f'GET {url}: {max(totales)} consultas, presupuesto {maximo}'
+        )
+        self.assertEqual(
+            len(set(totales)), 1,
+            f'GET {url}: las consultas cambian con el tamaño de página {totales}'
+        )
+
+
+# ==========================================
+# LISTADOS Y DETALLES (LECTURA)
+# ==========================================
+
+class PresupuestoLecturaTests(PresupuestoConsultasMixin, APITestCase):
+    """
+    Presupuesto declarado por endpoint de lectura.
+    Un cambio en un serializer que agregue consultas por fila hace fallar
+    la prueba correspondiente.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def test_catalogos(self):
+        # En frío, más la lectura de la versión del catálogo
+        self.assertPresupuestoListado(self.cliente, '/api/marcas/', 4)
+        self.assertPresupuestoListado(self.cliente, f'/api/marcas/{self.marca.pk}/modelos/', 4)
+        self.assertPresupuestoListado(self.cliente, '/api/servicios-taller/', 4)
+
+    def test_listados_cliente(self):
+        self.assertPresupuestoListado(self.cliente, '/api/cliente/vehiculos/', 3)
+        self.assertPresupuestoListado(self.cliente, '/api/cliente/solicitudes/', 5)
+        self.assertPresupuestoListado(self.cliente, '/api/cliente/reservaciones/', 3)
+
+    def test_detalles_cliente(self):
+        casos = [
+            (f'/api/cliente/vehiculos/{self.vehiculo.pk}/', 2),
+            (f'/api/cliente/solicitudes/{self.solicitud.pk}/', 4),
+            (f'/api/cliente/reservaciones/{self.reservacion.pk}/', 2),
+            (f'/api/cliente/reservaciones/{self.reservacion.pk}/servicios/', 3),
+            (f'/api/cliente/servicios/{self.servicio.pk}/progreso/', 3),
+        ]
+        for url, maximo in casos:
+            with self.subTest(url=url):
+                self.assertPresupuesto(self.cliente, 'get', url, maximo)
+
+    def test_listados_asistente(self):
+        self.assertPresupuestoListado(self.asistente, '/api/asistente/solicitudes/', 4)
+        self.assertPresupuestoListado(self.asistente, '/api/asistente/reservaciones/', 2)
+        self.assertPresupuestoListado(self.asistente, '/api/asistente/servicios-reservados/', 2)
+        self.assertPresupuestoListado(self.asistente, '/api/asistente/vehiculos/', 3)
+
+    def test_usuarios_asistente(self):
+        # Pocos usuarios: basta con el presupuesto, sin comparar páginas
+        self.assertPresupuesto(self.asistente, 'get', '/api/asistente/clientes/', 3)
+        self.assertPresupuesto(self.asistente, 'get', '/api/asistente/tecnicos/', 3)
+
+    def test_detalles_asistente(self):
+        casos = [
+            (f'/api/asistente/solicitudes/{self.solicitud.pk}/', 4),
+            (f'/api/asistente/reservaciones/{self.reservacion.pk}/', 2),
+        ]
+        for url, maximo in casos:
+            with self.subTest(url=url):
+                self.assertPresupuesto(self.asistente, 'get', url, maximo)
+
+    def test_listados_taller(self):
+        self.assertPresupuestoListado(self.tecnico, '/api/taller/mis-servicios/', 2)
+
+    def test_detalles_taller(self):
+        casos = [
+            (f'/api/taller/mis-servicios/{self.servicio.pk}/', 2),
+            (f'/api/taller/servicios/{self.servicio.pk}/progreso/listar/', 3),
+            (f'/api/taller/servicios/{self.servicio.pk}/progreso/{self.progreso.pk}/', 2),
+            (f'/api/taller/reservaciones/{self.reservacion.pk}/', 2),
+            (f'/api/taller/servicios/{self.servicio.pk}/detalle/', 2),
+        ]
+        for url, maximo in casos:
+            with self.subTest(url=url):
+                self.assertPresupuesto(self.tecnico, 'get', url, maximo)
+
+    def test_salida_solicitud_sin_cambios(self):
+        """La reservación vigente sigue siendo la de menor id"""
+        extra = Reservacion.objects.create(id_solicitud=self.solicitud)
+        self.autenticar(self.cliente)
+        response = self.client.get(f'/api/cliente/solicitudes/{self.solicitud.pk}/')
+        self.assertTrue(response.data['tiene_reservacion'])
+        self.assertEqual(response.data['reservacion_info']['id'], self.reservacion.pk)
+        self.assertNotEqual(extra.pk, self.reservacion.pk)
+
+    def test_servicios_count_con_filtro_por_tecnico(self):
+        """El conteo anotado no se limita a los servicios del técnico"""
+        self.autenticar(self.tecnico)
+        response = self.client.get(f'/api/taller/reservaciones/{self.reservacion.pk}/')
+        self.assertEqual(response.data['servicios_count'], SERVICIOS_POR_RESERVACION)
+
+
+# ==========================================
+# ESCRITURAS
+# ==========================================
+
+class PresupuestoEscrituraTests(PresupuestoConsultasMixin, APITestCase):
+    """
+    Presupuesto de las rutas que escriben: constante por petición.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    # Cada escritura agrega su INSERT en la bitácora de cambios y un UPDATE
+    # relativo por tabla del resumen del tablero que toca. Editar lo que
+    # otros detalles muestran lee antes la fila guardada (una consulta por pk)
+    # y, si algo mostrado cambió, sube su versión: un UPDATE por tabla
+
+    def test_cliente(self):
+        vehiculo = self.assertPresupuesto(
+            self.cliente, 'post', '/api/cliente/vehiculos/', 4,
+            {'placa': 'NUEVA-001', 'ano': 2020, 'color': 'Azul'}, status_code=201
+        )
+        nuevo = Vehiculo.objects.get(placa=vehiculo.data['placa'])
+        self.assertPresupuesto(
+            self.cliente, 'patch', f'/api/cliente/vehiculos/{nuevo.pk}/', 6, {'color': 'Verde'}
+        )
+        self.assertPresupuesto(
+            self.cliente, 'post', '/api/cliente/solicitudes/', 6,
+            {'id_vehiculo': nuevo.pk, 'descripcion': 'Ruido en frenos'}, status_code=201
+        )
+        self.assertPresupuesto(
+            self.cliente, 'patch', f'/api/cliente/solicitudes/{self.solicitud.pk}/', 9,
+            {'descripcion': 'Actualizada'}
+        )
+        self.assertPresupuesto(
+            self.cliente, 'put', f'/api/cliente/reservaciones/{self.reservacion.pk}/cancelar/', 7
+        )
+        self.assertPresupuesto(
+            self.cliente, 'delete', f'/api/cliente/vehiculos/{nuevo.pk}/', 11, status_code=204
+        )
+
+    def test_asistente_solicitudes(self):
+        self.assertPresupuesto(
+            self.asistente, 'patch', f'/api/asistente/solicitudes/{self.solicitud.pk}/', 9,
+            {'descripcion': 'Revisada'}
+        )
+        # Primera solicitud en el estado 2: inserta su fila en el resumen
+        self.assertPresupuesto(
+            self.asistente, 'patch', f'/api/asistente/solicitudes/{self.solicitud.pk}/estado/', 11,
+            {'id_estado': 2}
+        )
+        self.assertPresupuesto(
+            self.asistente, 'post', f'/api/asistente/solicitudes/{self.solicitud.pk}/detalle/', 7,
+            {'id_solicitud': self.solicitud.pk, 'observaciones': 'Extra', 'costo': '100.00'},
+            status_code=201
+        )
+
+    def test_asistente_reservaciones(self):
+        sin_reservacion = Solicitud.objects.filter(reservaciones__isnull=True).first()
+        self.assertPresupuesto(
+            self.asistente, 'post', '/api/asistente/reservaciones/', 8,
+            {'id_solicitud': sin_reservacion.pk, 'notas': 'Nueva'}, status_code=201
+        )
+        self.assertPresupuesto(
+            self.asistente, 'patch', f'/api/asistente/reservaciones/{self.reservacion.pk}/', 6,
+            {'notas': 'Editada'}
+        )
+        self.assertPresupuesto(
+            self.asistente, 'patch', f'/api/asistente/reservaciones/{self.reservacion.pk}/estado/', 7,
+            {'estado_global': 'confirmada'}
+        )
+        self.assertPresupuesto(
+            self.asistente, 'delete', f'/api/asistente/reservaciones/{self.reservacion.pk}/', 18,
+            status_code=204
+        )
+
+    def test_asistente_servicios(self):
+        servicios = [
+            {'id_servicio': self.servicio_taller.pk, 'id_usuario_taller': self.tecnico.pk}
+            for _ in range(2)
+        ]
+        url = f'/api/asistente/reservaciones/{self.reservacion.pk}/servicios/'
+        self.assertPresupuesto(self.asistente, 'post', url, 14, {'servicios': servicios}, status_code=201)
+        # Mismo número de consultas para un trabajo de flotilla
+        self.assertPresupuesto(
+            self.asistente, 'post', url, 14, {'servicios': servicios * 30}, status_code=201
+        )
+        # El reparto automático agrega solo la consulta de carga
+        automaticos = [{'id_servicio': self.servicio_taller.pk} for _ in range(2)]
+        for lote in (automaticos, automaticos * 30):
+            self.assertPresupuesto(
+                self.asistente, 'post', url, 14,
+                {'servicios': lote, 'asignacion_automatica': True}, status_code=201
+            )
+        # Bitácora del técnico nuevo y del anterior en un atomic (SAVEPOINT en pruebas)
+        self.assertPresupuesto(
+            self.asistente, 'put', f'/api/asistente/servicios-reservados/{self.servicio.pk}/asignar-tecnico/', 9,
+            {'id_usuario_taller': self.otro_tecnico.pk}
+        )
+
+    def test_taller(self):
+        # Servicio y avance de la reservación en un atomic (SAVEPOINT en pruebas)
+        self.assertPresupuesto(
+            self.tecnico, 'patch', f'/api/taller/mis-servicios/{self.servicio.pk}/estado/', 12,
+            {'estado': 'en_progreso', 'avance_porcentaje': 30}
+        )
+        self.assertPresupuesto(
+            self.tecnico, 'post', f'/api/taller/servicios/{self.servicio.pk}/progreso/', 13,
+            {'id_serv_res': self.servicio.pk, 'porcentaje': 80, 'comentario': 'Casi listo'},
+            status_code=201
+        )
+        self.assertPresupuesto(
+            self.tecnico, 'patch',
+            f'/api/taller/servicios/{self.servicio.pk}/progreso/{self.progreso.pk}/', 6,
+            {'comentario': 'Corregido'}
+        )
+
+
+# ==========================================
+# CACHE DE CATÁLOGOS
+# ==========================================
+
+class CatalogoCacheTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoUsuario.objects.create(cve='CLIENTE', descripcion='Cliente')
+        cls.cliente = Usuario.objects.create_user('cliente@test.com', 'Cliente', tipo, 'password123')
+        cls.marca = Marca.objects.create(nombre='Nissan')
+        cls.modelo = Modelo.objects.create(id_marca=cls.marca, nombre='Versa')
+
+    def setUp(self):
+        cache.clear()
+        self.autenticar(self.cliente)
+
+    def test_respuesta_desde_cache(self):
+        url = f'/api/marcas/{self.marca.pk}/modelos/'
+        primera = self.client.get(url)
+        # La lectura del usuario al autenticar y la de la versión
+        with self.assertNumQueries(2):
+            segunda = self.client.get(url)
+        self.assertEqual(segunda.data, primera.data)
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+    def test_peticion_condicional(self):
+        primera = self.client.get('/api/marcas/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/marcas/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], primera['ETag'])
+
+        response = self.client.get(
+            '/api/marcas/', HTTP_IF_MODIFIED_SINCE=primera['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambios_invalidan_la_version(self):
+        primera = self.client.get('/api/marcas/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Marca.objects.create(nombre='Mazda')
+        response = self.client.get('/api/marcas/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], primera['ETag'])
+        self.assertEqual(response.data['count'], 2)
+
+        url = f'/api/marcas/{self.marca.pk}/modelos/'
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        self.modelo.delete()
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+    def test_version_compartida_entre_procesos(self):
+        # Otro proceso (p. ej. importar_catalogo) cambia la versión en la
+        # base de datos sin tocar la cache de este
+        primera = self.client.get('/api/marcas/')
+        Marca.objects.bulk_create([Marca(nombre='Mazda')])
+        VersionCatalogo.objects.update(version=F('version') + 1)
+        response = self.client.get('/api/marcas/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+
+# ==========================================
+# IMPORTACIÓN DEL CATÁLOGO
+# ==========================================
+
+class ImportarCatalogoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nissan = Marca.objects.create(nombre='Nissan')
+        cls.versa = Modelo.objects.create(id_marca=cls.nissan, nombre='Versa')
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+
+    def importar(self, nombre, contenido, **opciones):
+        ruta = self.directorio / nombre
+        ruta.write_text(contenido, encoding='utf-8')
+        salida = io.StringIO()
+        call_command('importar_catalogo', str(ruta), stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def catalogo(self):
+        return set(Modelo.objects.values_list('id_marca__nombre', 'nombre'))
+
+    def test_csv_sin_repetidos_e_idempotente(self):
+        contenido = (
+            'marca,modelo\n'
+            'Nissan,Versa\n'
+            ' Nissan , Sentra\n'
+            'Nissan,Sentra\n'
+            'Mazda,CX  30\n'
+            'Mazda,\n'
+            'Mazda,Mazda 3\n'
+        )
+        version = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            salida = self.importar('catalogo.csv', contenido, lote=2)
+        self.assertIn('6 filas leídas (1 descartadas', salida)
+        self.assertIn('1 marcas y 3 modelos nuevos', salida)
+        self.assertEqual(self.catalogo(), {
+            ('Nissan', 'Versa'), ('Nissan', 'Sentra'), ('Mazda', 'CX 30'), ('Mazda', 'Mazda 3'),
+        })
+        # bulk_create no envía señales: el comando invalida el catálogo
+        self.assertNotEqual(version_catalogo(), version)
+
+        ids = set(Modelo.objects.values_list('pk', flat=True))
+        version = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            salida = self.importar('catalogo.csv', contenido)
+        self.assertIn('0 marcas y 0 modelos nuevos', salida)
+        self.assertEqual(set(Modelo.objects.values_list('pk', flat=True)), ids)
+        self.assertEqual(version_catalogo(), version)
+
+    def test_los_workers_en_marcha_ven_la_importacion(self):
+        # El comando corre en su propio proceso, sin la cache de los
+        # workers: basta la versión que cambia en la base de datos
+        version = version_catalogo()
+        with mock.patch('agencia.cache_catalogo.caches') as cache_del_comando:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.importar('catalogo.csv', 'marca,modelo\nKia,Rio\n')
+        cache_del_comando.__getitem__.assert_not_called()
+        self.assertGreater(VersionCatalogo.objects.get().version, version)
+
+    def test_json_y_ndjson(self):
+        filas = [{'marca': 'Kia', 'modelo': 'Rio'}, {'marca': 'Kia', 'modelo': 'Soul'}, ['Kia', 'Forte']]
+        self.importar('catalogo.json', json.dumps(filas))
+        self.importar('catalogo.jsonl', '\n'.join(json.dumps(fila) for fila in [
+            {'marca': 'Kia', 'modelo': 'Rio'}, {'marca': 'Nissan', 'modelo': 'March'},
+        ]))
+        self.assertEqual(self.catalogo(), {
+            ('Nissan', 'Versa'), ('Nissan', 'March'), ('Kia', 'Rio'), ('Kia', 'Soul'),
+        })
+
+        with self.assertRaises(CommandError):
+            self.importar('catalogo.csv', 'marca,nombre\nKia,Rio\n')
+        with self.assertRaises(CommandError):
+            self.importar('catalogo.txt', 'Kia,Rio\n')
+
+    def test_consultas_no_dependen_de_las_filas(self):
+        contenido = 'marca,modelo\n' + ''.join(f'Marca {i % 5},Modelo {i}\n' for i in range(300))
+        with CaptureQueriesContext(connection) as consultas:
+            self.importar('catalogo.csv', contenido)
+        self.assertEqual(Modelo.objects.count(), 301)
+        # conteos, marcas (inserción y lectura) y modelos en un lote
+        self.assertLessEqual(len(consultas), 10)
+
+    def test_modelo_unico_por_marca(self):
+        Modelo.objects.create(id_marca=Marca.objects.create(nombre='Mazda'), nombre='Versa')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Modelo.objects.create(id_marca=self.nissan, nombre='Versa')
+
+
+# ==========================================
+# ASIGNACIÓN MASIVA DE SERVICIOS
+# ==========================================
+
+class AsignarServiciosTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def setUp(self):
+        self.autenticar(self.asistente)
+        self.url = f'/api/asistente/reservaciones/{self.reservacion.pk}/servicios/'
+        self.antes = ServicioReservado.objects.count()
+
+    def test_asigna_en_orden_y_versiona_la_reservacion(self):
+        version = Reservacion.objects.get(pk=self.reservacion.pk).version
+        servicios = [
+            {'id_servicio': self.servicio_taller.pk, 'id_usuario_taller': tecnico.pk}
+            for tecnico in (self.tecnico, self.otro_tecnico)
+        ] + [{'id_servicio': self.servicio_taller.pk}]
+        response = self.client.post(self.url, {'servicios': servicios}, format='json')
+        self.assertEqual(response.status_code, 201, response.content[:300])
+        self.assertEqual(
+            [fila['id_usuario_taller'] for fila in response.data],
+            [self.tecnico.pk, self.otro_tecnico.pk, None]
+        )
+        self.assertEqual(ServicioReservado.objects.count(), self.antes + 3)
+        self.assertEqual(Reservacion.objects.get(pk=self.reservacion.pk).version, version + 1)
+
+    def test_referencias_invalidas_no_asignan_nada(self):
+        servicios = [
+            {'id_servicio': self.servicio_taller.pk, 'id_usuario_taller': self.tecnico.pk},
+            {'id_servicio': 999999, 'id_usuario_taller': self.cliente.pk},
+        ]
+        response = self.client.post(self.url, {'servicios': servicios}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id_servicio', response.data['servicios'])
+        self.assertIn('id_usuario_taller', response.data['servicios'])
+        self.assertEqual(ServicioReservado.objects.count(), self.antes)
+
+    def test_lista_vacia(self):
+        response = self.client.post(self.url, {'servicios': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_asignacion_automatica_al_menos_cargado(self):
+        libre = Usuario.objects.create_user(
+            'libre@test.com', 'Técnico Libre', self.tecnico.id_tipo, 'password123'
+        )
+        servicios = [{'id_servicio': self.servicio_taller.pk} for _ in range(3)]
+        servicios.append({'id_servicio': self.servicio_taller.pk, 'id_usuario_taller': self.tecnico.pk})
+        response = self.client.post(
+            self.url, {'servicios': servicios, 'asignacion_automatica': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content[:300])
+        self.assertEqual(
+            [fila['id_usuario_taller'] for fila in response.data],
+            [libre.pk, libre.pk, libre.pk, self.tecnico.pk]
+        )
+
+        response = self.client.put(
+            f'/api/asistente/servicios-reservados/{self.servicio.pk}/asignar-tecnico/',
+            {'asignacion_automatica': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id_usuario_taller'], libre.pk)
+
+    def test_reparto_equilibrado(self):
+        reparto = RepartoCarga([(1, 0), (2, 60), (3, 0)])
+        cargas = {1: 0, 2: 60, 3: 0}
+        for minutos in (90, 60, 30, 30, 30, 30):
+            cargas[reparto.asignar(minutos)] += minutos
+        self.assertEqual(cargas, {1: 120, 2: 120, 3: 90})
+
+    def test_reparto_con_carga_manual(self):
+        reparto = RepartoCarga([(1, 0), (2, 0), (3, 0)])
+        reparto.sumar(1, 60)
+        reparto.sumar(1, 60)
+        reparto.sumar(2, 30)
+        reparto.sumar(99, 30)  # no es técnico del reparto
+        self.assertEqual([reparto.asignar(30) for _ in range(4)], [3, 2, 3, 2])
+        self.assertEqual(reparto.asignar(60), 3)
+        self.assertEqual(reparto.asignar(30), 2)
+        # Los tres empatan en 120: desempata el id
+        self.assertEqual(reparto.asignar(30), 1)
+
+    def test_tecnicos_con_carga(self):
+        self.autenticar(self.asistente)
+        response = self.client.get('/api/asistente/tecnicos/')
+        cargas = {t['id']: (t['carga_minutos'], t['servicios_abiertos']) for t in response.data['results']}
+        abiertos = ServicioReservado.objects.filter(
+            id_usuario_taller=self.tecnico, estado__in=('pendiente', 'en_progreso')
+        )
+        self.assertEqual(cargas[self.tecnico.pk][1], abiertos.count())
+        self.assertEqual(cargas[self.tecnico.pk][0], 30 * abiertos.count())
+        self.assertLess(cargas[self.tecnico.pk][0], cargas[self.otro_tecnico.pk][0])
+
+
+# ==========================================
+# CAMBIOS DE ESTADO POR LOTE
+# ==========================================
+
+class EstadosLoteTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def assertConsultasConstantes(self, usuario, url, maximo, lotes):
+        self.autenticar(usuario)
+        totales = []
+        for datos in lotes:
+            response, total = self.medir('patch', url, datos)
+            self.assertEqual(response.status_code, 200, response.content[:300])
+            totales.append(total)
+        self.assertEqual(len(set(totales)), 1, f'PATCH {url}: {totales}')
+        self.assertLessEqual(totales[0], maximo, f'PATCH {url}: {totales[0]} consultas, presupuesto {maximo}')
+
+    def test_reservaciones_con_resultados_por_id(self):
+        completada, pendiente = Reservacion.objects.order_by('pk')[:2]
+        Reservacion.objects.filter(pk=completada.pk).update(estado_global='completada')
+        self.autenticar(self.asistente)
+        response = self.client.patch('/api/asistente/reservaciones/estado/', {
+            'ids': [pendiente.pk, completada.pk, 999999], 'estado_global': 'confirmada'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['actualizados'], 1)
+        self.assertEqual(
+            [(r['id'], r['ok']) for r in response.data['resultados']],
+            [(pendiente.pk, True), (completada.pk, False), (999999, False)]
+        )
+        version_anterior = pendiente.version
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado_global, 'confirmada')
+        self.assertEqual(pendiente.version, version_anterior + 1)
+        self.assertEqual(pendiente.id_solicitud.version, 2)
+        completada.refresh_from_db()
+        self.assertEqual(completada.estado_global, 'completada')
+
+    def test_consultas_constantes(self):
+        # Incluye la lectura de dueños, el INSERT de la bitácora de cambios y
+        # el UPDATE del resumen del tablero
+        ids = list(Reservacion.objects.values_list('pk', flat=True))
+        self.assertConsultasConstantes(self.asistente, '/api/asistente/reservaciones/estado/', 11, [
+            {'ids': ids[:3], 'estado_global': 'confirmada'},
+            {'ids': ids[3:], 'estado_global': 'confirmada'},
+        ])
+        ids = list(Solicitud.objects.values_list('pk', flat=True))
+        # El estado ya tiene su fila en el resumen (la primera vez se inserta)
+        ResumenEstado.objects.create(entidad='solicitud', estado='2')
+        self.assertConsultasConstantes(self.asistente, '/api/asistente/solicitudes/estado/', 8, [
+            {'ids': ids[:3], 'id_estado': 2},
+            {'ids': ids[3:], 'id_estado': 2},
+        ])
+        ids = list(
+            ServicioReservado.objects.filter(id_usuario_taller=self.tecnico)
+            .values_list('pk', flat=True)
+        )
+        # Más la lectura para eventos en vivo, el avance de las reservaciones
+        # y sus estados derivados en el resumen
+        self.assertConsultasConstantes(self.tecnico, '/api/taller/mis-servicios/estado/', 16, [
+            {'ids': ids[:3], 'estado': 'en_progreso'},
+            {'ids': ids[3:], 'estado': 'en_progreso'},
+        ])
+
+    def test_servicios_solo_del_tecnico(self):
+        ajeno = ServicioReservado.objects.filter(id_usuario_taller=self.otro_tecnico).first()
+        self.autenticar(self.tecnico)
+        response = self.client.patch('/api/taller/mis-servicios/estado/', {
+            'ids': [self.servicio.pk, ajeno.pk], 'estado': 'completado'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['ok'] for r in response.data['resultados']], [True, False])
+        ajeno.refresh_from_db()
+        self.assertEqual(ajeno.estado, 'pendiente')
+
+    def test_estado_desconocido(self):
+        self.autenticar(self.tecnico)
+        response = self.client.patch('/api/taller/mis-servicios/estado/', {
+            'ids': [self.servicio.pk], 'estado': 'archivado'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_transiciones_de_un_servicio(self):
+        url = f'/api/taller/mis-servicios/{self.servicio.pk}/estado/'
+        self.autenticar(self.tecnico)
+        self.assertEqual(self.client.patch(url, {'estado': 'archivado'}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'estado': 'completado'}, format='json').status_code, 200)
+
+        response = self.client.patch(url, {'estado': 'pendiente'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.servicio.refresh_from_db()
+        self.assertEqual(self.servicio.estado, 'completado')
+        # Repetir el estado vigente no es una transición
+        self.assertEqual(self.client.patch(url, {'estado': 'completado'}, format='json').status_code, 200)
+
+
+# ==========================================
+# EVENTOS EN VIVO (SSE)
+# ==========================================
+
+class EventosTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def publicados(self, metodo, url, data):
+        self.autenticar(self.tecnico)
+        with mock.patch.object(broker(), 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, metodo)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content[:300])
+        return [
+            (usuario, clave, json.loads(evento.split('data: ', 1)[1]))
+            for (usuario, clave, evento), _ in publicar.call_args_list
+        ]
+
+    def test_progreso_notifica_al_cliente(self):
+        eventos = self.publicados(
+            'post', f'/api/taller/servicios/{self.servicio.pk}/progreso/',
+            {'id_serv_res': self.servicio.pk, 'porcentaje': 40, 'comentario': 'Frenos'}
+        )
+        self.assertEqual(len(eventos), 1)
+        usuario, clave, datos = eventos[0]
+        self.assertEqual((usuario, clave), (self.cliente.pk, ('servicio', self.servicio.pk)))
+        self.assertEqual(datos['avance_porcentaje'], 40)
+        self.assertEqual(datos['progreso']['comentario'], 'Frenos')
+
+    def test_cambios_de_estado(self):
+        eventos = self.publicados(
+            'patch', f'/api/taller/mis-servicios/{self.servicio.pk}/estado/', {'estado': 'en_progreso'}
+        )
+        self.assertEqual([datos['estado'] for _, _, datos in eventos], ['en_progreso'])
+
+        otro = ServicioReservado.objects.filter(id_usuario_taller=self.tecnico).exclude(
+            pk=self.servicio.pk
+        ).first()
+        eventos = self.publicados(
+            'patch', '/api/taller/mis-servicios/estado/',
+            {'ids': [self.servicio.pk, otro.pk], 'estado': 'completado'}
+        )
+        self.assertEqual(
+            sorted(clave[1] for _, clave, _ in eventos), sorted([self.servicio.pk, otro.pk])
+        )
+
+    def test_stream_requiere_token_de_cliente(self):
+        self.assertEqual(self.client.get('/api/cliente/eventos/').status_code, 401)
+        token = RefreshTokenConRol.for_user(self.tecnico).access_token
+        self.assertEqual(self.client.get(f'/api/cliente/eventos/?token={token}').status_code, 403)
+
+
+class BrokerLocalTests(TestCase):
+
+    async def test_entrega_entre_hilos_y_conserva_lo_mas_reciente(self):
+        broker_local = BrokerLocal()
+        suscripcion = broker_local.suscribir(7)
+        self.assertEqual(await suscripcion.siguientes(0.01), [])
+
+        for evento in ('a1', 'b1', 'a2'):
+            clave = evento[0]
+            await asyncio.to_thread(broker_local.publicar, 7, clave, evento)
+        await asyncio.to_thread(broker_local.publicar, 8, 'a', 'ajeno')
+        self.assertEqual(await suscripcion.siguientes(1), ['b1', 'a2'])
+
+        broker_local.cancelar(suscripcion)
+        self.assertEqual(broker_local.conexiones(), 0)
+
+    async def test_stream(self):
+        tipo = await TipoUsuario.objects.acreate(cve='CLIENTE', descripcion='Cliente')
+        cliente = await Usuario.objects.acreate(email='sse@test.com', nombre='SSE', id_tipo=tipo)
+        token = (await sync_to_async(RefreshTokenConRol.for_user)(cliente)).access_token
+        response = await self.async_client.get(f'/api/cliente/eventos/?token={token}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        contenido = aiter(response.streaming_content)
+        self.assertIn(b': conectado', await anext(contenido))
+        broker().publicar(cliente.pk, ('servicio', 1), formatear_evento('servicio', {'id_serv_res': 1}))
+        self.assertEqual(
+            await anext(contenido), b'event: servicio\ndata: {"id_serv_res": 1}\n\n'
+        )
+
+        # Al desconectarse el cliente, el handler ASGI cancela la tarea
+        espera = asyncio.ensure_future(anext(contenido))
+        await asyncio.sleep(0)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(broker().conexiones(), 0)
+
+    async def abrir_stream(self, email, duracion=None):
+        tipo, _ = await TipoUsuario.objects.aget_or_create(cve='CLIENTE', defaults={'descripcion': 'Cliente'})
+        cliente = await Usuario.objects.acreate(email=email, nombre='SSE', id_tipo=tipo)
+        token = (await sync_to_async(RefreshTokenConRol.for_user)(cliente)).access_token
+        if duracion is not None:
+            token.set_exp(lifetime=duracion)
+        response = await self.async_client.get(f'/api/cliente/eventos/?token={token}')
+        contenido = aiter(response.streaming_content)
+        self.assertIn(b': conectado', await anext(contenido))
+        return cliente, contenido
+
+    async def test_stream_cierra_al_expirar_el_token(self):
+        _, contenido = await self.abrir_stream('expira@test.com', timedelta(seconds=2))
+        with mock.patch('agencia.api.views.async_views.HEARTBEAT_SEGUNDOS', 5):
+            self.assertEqual(await anext(contenido), b': ping\n\n')
+            self.assertIn(b'token_expirado', await anext(contenido))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(contenido)
+        self.assertEqual(broker().conexiones(), 0)
+
+    async def test_stream_cierra_al_revocar_el_token(self):
+        cliente, contenido = await self.abrir_stream('revocado@test.com')
+        with mock.patch('agencia.api.views.async_views.HEARTBEAT_SEGUNDOS', 0.01):
+            self.assertEqual(await anext(contenido), b': ping\n\n')
+            # Desactivarlo revoca sus tokens
+            await Usuario.objects.filter(pk=cliente.pk).aupdate(is_active=False)
+            self.assertIn(b'token_revocado', await anext(contenido))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(contenido)
+        self.assertEqual(broker().conexiones(), 0)
+
+    async def test_stream_lee_al_usuario_solo_cada_tanto(self):
+        cliente, contenido = await self.abrir_stream('inactivo@test.com')
+        with mock.patch('agencia.api.views.async_views.HEARTBEAT_SEGUNDOS', 0.01):
+            # Desactivado en otro worker: la marca de revocación local no
+            # llega y los pings siguen sin leer la base de datos
+            await Usuario.objects.filter(pk=cliente.pk).aupdate(is_active=False)
+            await sync_to_async(cache.clear)()
+            for _ in range(3):
+                self.assertEqual(await anext(contenido), b': ping\n\n')
+            with mock.patch('agencia.api.views.async_views.REVISION_USUARIO_SEGUNDOS', 0):
+                self.assertIn(b'token_revocado', await anext(contenido))
+                with self.assertRaises(StopAsyncIteration):
+                    await anext(contenido)
+        self.assertEqual(broker().conexiones(), 0)
+
+
+# ==========================================
+# AVANCE DE LA RESERVACIÓN
+# ==========================================
+
+class AvanceReservacionTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def setUp(self):
+        self.servicios = list(self.reservacion.servicios_reservados.order_by('pk'))
+        for servicio in self.servicios:
+            if servicio.id_usuario_taller_id != self.tecnico.pk:
+                servicio.id_usuario_taller = self.tecnico
+                servicio.save()
+        self.autenticar(self.tecnico)
+
+    def reservacion_actual(self):
+        return Reservacion.objects.get(pk=self.reservacion.pk)
+
+    def assertIgualAlRecuento(self):
+        incremental = self.reservacion_actual()
+        Reservacion.objects.filter(pk=self.reservacion.pk).recalcular_avance()
+        recontada = self.reservacion_actual()
+        self.assertEqual(
+            (incremental.avance_global, incremental.estado_global),
+            (recontada.avance_global, recontada.estado_global)
+        )
+
+    def test_promedio_y_estado_con_cada_cambio(self):
+        primero, segundo, *resto = self.servicios
+        for servicio in self.servicios:
+            self.client.patch(
+                f'/api/taller/mis-servicios/{servicio.pk}/estado/',
+                {'estado': 'pendiente', 'avance_porcentaje': 0}, format='json'
+            )
+        Reservacion.objects.filter(pk=self.reservacion.pk).update(estado_global='confirmada')
+
+        self.client.post(f'/api/taller/servicios/{primero.pk}/progreso/', {
+            'id_serv_res': primero.pk, 'porcentaje': 60, 'comentario': 'Avance'
+        }, format='json')
+        reservacion = self.reservacion_actual()
+        self.assertEqual(reservacion.avance_global, 60 // len(self.servicios))
+        self.assertEqual(reservacion.estado_global, 'en_progreso')
+        self.assertIgualAlRecuento()
+
+        response = self.client.patch(
+            f'/api/taller/mis-servicios/{segundo.pk}/estado/', {'avance_porcentaje': 'mucho'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.patch('/api/taller/mis-servicios/estado/', {
+            'ids': [s.pk for s in self.servicios], 'estado': 'completado'
+        }, format='json')
+        reservacion = self.reservacion_actual()
+        self.assertEqual((reservacion.avance_global, reservacion.estado_global), (100, 'completada'))
+        self.assertEqual(reservacion.servicios_completados, len(self.servicios))
+
+    def test_progreso_no_reabre_un_servicio_completado(self):
+        for servicio in self.servicios:
+            self.client.post(f'/api/taller/servicios/{servicio.pk}/progreso/', {
+                'id_serv_res': servicio.pk, 'porcentaje': 100
+            }, format='json')
+        progresos = ProgresoServicio.objects.count()
+
+        primero = self.servicios[0]
+        response = self.client.post(f'/api/taller/servicios/{primero.pk}/progreso/', {
+            'id_serv_res': primero.pk, 'porcentaje': 40
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ProgresoServicio.objects.count(), progresos)
+        primero.refresh_from_db()
+        self.assertEqual((primero.estado, primero.avance_porcentaje), ('completado', 100))
+        reservacion = self.reservacion_actual()
+        self.assertEqual((reservacion.avance_global, reservacion.estado_global), (100, 'completada'))
+        self.assertEqual(reservacion.servicios_completados, len(self.servicios))
+
+        # Un comentario sin porcentaje sigue permitido
+        response = self.client.post(f'/api/taller/servicios/{primero.pk}/progreso/', {
+            'id_serv_res': primero.pk, 'comentario': 'Entregado'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_estado_y_servicios_de_la_reservacion_cerrada(self):
+        url = f'/api/asistente/reservaciones/{self.reservacion.pk}/'
+        self.autenticar(self.asistente)
+        response = self.client.patch(f'{url}estado/', {'estado_global': 'xyz'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'{url}estado/', {'estado_global': 'completada'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.patch(f'{url}estado/', {'estado_global': 'cancelada'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.reservacion_actual().estado_global, 'cancelada')
+
+        response = self.client.post(f'{url}servicios/', {
+            'servicios': [{'id_servicio': self.servicio_taller.pk, 'id_usuario_taller': self.tecnico.pk}]
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.reservacion_actual().servicios_total, len(self.servicios))
+
+        # Los acumulados son de solo lectura: no se aceptan ni se devuelven cambiados
+        response = self.client.patch(url, {'avance_global': 90, 'notas': 'Cerrada'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['avance_global'], self.reservacion_actual().avance_global)
+        self.assertNotEqual(response.data['avance_global'], 90)
+
+    def test_guardar_la_reservacion_no_pisa_los_acumulados(self):
+        vieja = self.reservacion_actual()
+        self.client.post(f'/api/taller/servicios/{self.servicios[0].pk}/progreso/', {
+            'id_serv_res': self.servicios[0].pk, 'porcentaje': 100, 'comentario': 'Listo'
+        }, format='json')
+        esperado = self.reservacion_actual().avance_suma
+
+        vieja.notas = 'Editada con datos leídos antes del avance'
+        vieja.save()
+        actual = self.reservacion_actual()
+        self.assertEqual(actual.avance_suma, esperado)
+        self.assertEqual(actual.avance_global, esperado // actual.servicios_total)
+
+    def test_altas_y_bajas_de_servicios(self):
+        self.autenticar(self.asistente)
+        self.client.post(
+            f'/api/asistente/reservaciones/{self.reservacion.pk}/servicios/',
+            {'servicios': [{'id_servicio': self.servicio_taller.pk}] * 2}, format='json'
+        )
+        self.assertEqual(self.reservacion_actual().servicios_total, len(self.servicios) + 2)
+        self.servicios[0].delete()
+        self.assertEqual(self.reservacion_actual().servicios_total, len(self.servicios) + 1)
+        self.assertIgualAlRecuento()
+
+    def test_progreso_sin_porcentaje_solo_anota(self):
+        servicio = self.servicios[0]
+        avance = ServicioReservado.objects.get(pk=servicio.pk).avance_porcentaje
+        response = self.client.post(f'/api/taller/servicios/{servicio.pk}/progreso/', {
+            'id_serv_res': servicio.pk, 'porcentaje': None, 'comentario': 'Esperando refacción'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        servicio.refresh_from_db()
+        self.assertEqual(servicio.avance_porcentaje, avance)
+        self.assertEqual(servicio.ultimo_progreso_id, response.data['id'])
+
+    def test_update_solo_de_las_columnas_recibidas(self):
+        servicio = self.servicios[0]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(
+                f'/api/taller/mis-servicios/{servicio.pk}/estado/', {'avance_porcentaje': 40}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        update, = [
+            c['sql'] for c in consultas
+            if c['sql'].startswith('UPDATE "agencia_servicioreservado"')
+        ]
+        self.assertIn('"avance_porcentaje"', update)
+        self.assertNotIn('"observaciones"', update)
+        self.assertNotIn('"estado"', update)
+
+    def test_avance_monotono(self):
+        servicio = self.servicios[0]
+        url = f'/api/taller/servicios/{servicio.pk}/progreso/'
+        self.client.patch(
+            f'/api/taller/mis-servicios/{servicio.pk}/estado/', {'avance_porcentaje': 60}, format='json'
+        )
+        progresos = ProgresoServicio.objects.filter(id_serv_res=servicio).count()
+        with mock.patch('agencia.progreso.MONOTONO', True):
+            response = self.client.post(url, {'id_serv_res': servicio.pk, 'porcentaje': 40}, format='json')
+            self.assertEqual(response.status_code, 409)
+            response = self.client.patch(
+                f'/api/taller/mis-servicios/{servicio.pk}/estado/', {'avance_porcentaje': 30}, format='json'
+            )
+            self.assertEqual(response.status_code, 409)
+            response = self.client.post(url, {'id_serv_res': servicio.pk, 'porcentaje': 80}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        servicio.refresh_from_db()
+        self.assertEqual(servicio.avance_porcentaje, 80)
+        self.assertEqual(ProgresoServicio.objects.filter(id_serv_res=servicio).count(), progresos + 1)
+        self.assertIgualAlRecuento()
+
+
+# ==========================================
+# TABLERO DEL ASISTENTE
+# ==========================================
+
+def instantanea_resumen():
+    """Contenido de las tablas de resumen sin las filas en cero"""
+    return (
+        {(e, s): n for e, s, n in ResumenEstado.objects.values_list('entidad', 'estado', 'total') if n},
+        {(t, s): n for t, s, n in ResumenTecnico.objects.values_list('id_tecnico', 'estado', 'servicios') if n},
+        {
+            fila[0]: fila[1:]
+            for fila in ResumenDiario.objects.values_list('fecha', 'solicitudes', 'reservaciones', 'ingresos')
+            if any(fila[1:])
+        },
+    )
+
+
+class TableroTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def test_escrituras_mantienen_el_resumen(self):
+        self.autenticar(self.asistente)
+        sin_reservacion = Solicitud.objects.filter(reservaciones__isnull=True).first()
+        self.client.post('/api/asistente/reservaciones/', {
+            'id_solicitud': sin_reservacion.pk, 'notas': 'Nueva'
+        }, format='json')
+        nueva = Reservacion.objects.get(id_solicitud=sin_reservacion)
+        self.client.post(f'/api/asistente/reservaciones/{nueva.pk}/servicios/', {
+            'servicios': [{'id_servicio': self.servicio_taller.pk}] * 3, 'asignacion_automatica': True
+        }, format='json')
+        self.client.patch(f'/api/asistente/solicitudes/{self.solicitud.pk}/estado/', {'id_estado': 3}, format='json')
+        self.client.post(f'/api/asistente/solicitudes/{self.solicitud.pk}/detalle/', {
+            'id_solicitud': self.solicitud.pk, 'costo': '150.50'
+        }, format='json')
+        self.client.put(
+            f'/api/asistente/servicios-reservados/{self.servicio.pk}/asignar-tecnico/',
+            {'id_usuario_taller': self.otro_tecnico.pk}, format='json'
+        )
+        self.client.patch('/api/asistente/reservaciones/estado/', {
+            'ids': list(Reservacion.objects.exclude(pk=self.reservacion.pk).values_list('pk', flat=True)[:5]),
+            'estado_global': 'confirmada'
+        }, format='json')
+        otra = Reservacion.objects.exclude(pk__in=[self.reservacion.pk, nueva.pk]).last()
+        de_otra = list(otra.servicios_reservados.values_list('pk', flat=True))
+        for pk in de_otra:
+            self.client.put(
+                f'/api/asistente/servicios-reservados/{pk}/asignar-tecnico/',
+                {'id_usuario_taller': self.tecnico.pk}, format='json'
+            )
+
+        self.autenticar(self.tecnico)
+        servicios = list(
+            ServicioReservado.objects.filter(id_usuario_taller=self.tecnico).exclude(pk__in=de_otra)
+            .values_list('pk', flat=True)
+        )
+        self.client.patch('/api/taller/mis-servicios/estado/', {'ids': servicios[:4], 'estado': 'en_progreso'}, format='json')
+        self.client.post(
+            f'/api/taller/servicios/{de_otra[0]}/progreso/', {'id_serv_res': de_otra[0], 'porcentaje': 100}, format='json'
+        )
+        # Completar todos los servicios de una reservación la cierra
+        self.client.patch('/api/taller/mis-servicios/estado/', {'ids': de_otra, 'estado': 'completado'}, format='json')
+
+        self.autenticar(self.cliente)
+        self.client.put(f'/api/cliente/reservaciones/{self.reservacion.pk}/cancelar/')
+        Reservacion.objects.get(pk=nueva.pk).delete()
+
+        incremental = instantanea_resumen()
+        call_command('reconstruir_resumen', lote=7, stdout=io.StringIO())
+        self.assertEqual(incremental, instantanea_resumen())
+        self.assertIn(('reservacion', 'completada'), incremental[0])
+
+    def test_tablero_con_consultas_constantes(self):
+        url = '/api/asistente/tablero/?dias=7'
+        antes = self.assertPresupuesto(self.asistente, 'get', url, 4).data
+        self.assertEqual(sum(antes['reservaciones_por_estado'].values()), Reservacion.objects.count())
+        self.assertEqual(
+            sum(antes['servicios_por_estado'].values()), ServicioReservado.objects.count()
+        )
+        self.assertEqual(
+            {t['id']: t['abiertos'] for t in antes['tecnicos']},
+            {
+                tecnico.pk: ServicioReservado.objects.filter(
+                    id_usuario_taller=tecnico, estado__in=['pendiente', 'en_progreso']
+                ).count()
+                for tecnico in (self.tecnico, self.otro_tecnico)
+            }
+        )
+        hoy, = antes['diario']
+        self.assertEqual(hoy['solicitudes'], Solicitud.objects.count())
+        self.assertEqual(antes['ingresos'], sum(d.costo for d in DetalleSolicitud.objects.all()))
+
+        # Más historial no cambia el costo de la lectura
+        ayer = timezone.now() - timedelta(days=1)
+        Solicitud.objects.filter(pk__in=Solicitud.objects.values('pk')[:20]).update(fecha_creacion=ayer)
+        resumen.reconstruir()
+        despues = self.assertPresupuesto(self.asistente, 'get', url, 4).data
+        self.assertEqual(len(despues['diario']), 2)
+        self.assertEqual(sum(d['solicitudes'] for d in despues['diario']), Solicitud.objects.count())
+
+    def test_solo_asistente(self):
+        self.autenticar(self.tecnico)
+        self.assertEqual(self.client.get('/api/asistente/tablero/').status_code, 403)
+        self.autenticar(self.asistente)
+        self.assertEqual(self.client.get('/api/asistente/tablero/?dias=0').status_code, 400)
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+
+@skipUnless(connection.vendor == 'sqlite', 'El índice de búsqueda usa FTS5 de SQLite')
+class BusquedaTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def buscar(self, q, maximo=3, **params):
+        return self.assertPresupuesto(
+            self.asistente, 'get', '/api/asistente/buscar/', maximo, {'q': q, **params}
+        ).data
+
+    def encontrados(self, q, **params):
+        return {(hit['tipo'], hit['id']) for hit in self.buscar(q, **params)['results']}
+
+    def test_prefijos_sin_acentos_y_por_relevancia(self):
+        placa = self.vehiculo.placa
+        datos = self.buscar(f'revision {placa[:-1]}')
+        self.assertIn(('solicitud', self.solicitud.pk), {(h['tipo'], h['id']) for h in datos['results']})
+        self.assertEqual({h['tipo'] for h in datos['results']}, {'solicitud'})
+        self.assertIn('[Revisión]', datos['results'][0]['fragmento'])
+
+        # La placa en el título pesa más que en la descripción de la solicitud
+        resultados = self.buscar(placa)['results']
+        self.assertEqual(resultados[0], {**resultados[0], 'tipo': 'vehiculo', 'id': self.vehiculo.pk})
+        self.assertEqual(
+            [h['relevancia'] for h in resultados], sorted((h['relevancia'] for h in resultados), reverse=True)
+        )
+
+        self.assertEqual(self.encontrados('cliente principal'), {('cliente', self.cliente.pk)})
+        self.assertEqual(self.encontrados('técnico'), set())
+
+    def test_indice_sigue_las_escrituras(self):
+        self.autenticar(self.cliente)
+        self.client.post('/api/cliente/solicitudes/', {
+            'id_vehiculo': self.vehiculo.pk, 'descripcion': 'Ruido en la suspensión'
+        }, format='json')
+        nueva = Solicitud.objects.latest('pk')
+        self.assertEqual(self.encontrados('suspension'), {('solicitud', nueva.pk)})
+
+        self.autenticar(self.asistente)
+        self.client.post(f'/api/asistente/solicitudes/{nueva.pk}/detalle/', {
+            'id_solicitud': nueva.pk, 'observaciones': 'Balatas gastadas', 'costo': '80.00'
+        }, format='json')
+        self.assertEqual(self.encontrados('ruido balatas'), {('solicitud', nueva.pk)})
+
+        # update() y bulk_create también actualizan el índice
+        Vehiculo.objects.filter(pk=self.vehiculo.pk).update(placa='XYZ-987')
+        self.assertEqual(self.encontrados('xyz 987'), {('vehiculo', self.vehiculo.pk)})
+        DetalleSolicitud.objects.filter(id_solicitud=nueva).delete()
+        self.assertEqual(self.encontrados('balatas'), set())
+        Usuario.objects.filter(pk=self.otro_cliente.pk).update(nombre='Renombrado')
+        self.assertEqual(self.encontrados('renombrado'), {('cliente', self.otro_cliente.pk)})
+
+        nueva.delete()
+        self.assertEqual(self.encontrados('suspension'), set())
+
+    def test_paginas_filtro_y_permisos(self):
+        primera = self.buscar('revision', tipo='solicitud')
+        self.assertEqual(len(primera['results']), 20)
+        self.assertIn('page=2', primera['next'])
+        segunda = self.buscar('revision', tipo='solicitud', page=2)
+        self.assertFalse(
+            {h['id'] for h in primera['results']} & {h['id'] for h in segunda['results']}
+        )
+        self.assertIsNone(self.buscar('revision', tipo='vehiculo', maximo=2)['next'])
+        self.assertFalse(primera['truncado'])
+
+        self.assertEqual(self.client.get('/api/asistente/buscar/', {'q': '¿?'}).status_code, 400)
+        self.autenticar(self.tecnico)
+        self.assertEqual(self.client.get('/api/asistente/buscar/', {'q': 'revision'}).status_code, 403)
+
+    def test_recorte_de_candidatos(self):
+        todas, truncado = busqueda.buscar('revision', 'solicitud', limite=busqueda.CANDIDATOS)
+        self.assertFalse(truncado)
+        with mock.patch('agencia.busqueda.CANDIDATOS', len(todas) - 1):
+            self.assertTrue(self.buscar('revision', tipo='solicitud')['truncado'])
+            # Solo se ordenan las más recientes: la más antigua queda fuera
+            recortadas, _ = busqueda.buscar('revision', 'solicitud', limite=len(todas))
+            self.assertEqual(
+                {h['id'] for h in recortadas}, {h['id'] for h in todas} - {min(h['id'] for h in todas)}
+            )
+        with mock.patch('agencia.busqueda.CANDIDATOS', len(todas)):
+            self.assertFalse(self.buscar('revision', tipo='solicitud')['truncado'])
+
+
+# ==========================================
+# PLACAS
+# ==========================================
+
+class PlacaTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def test_placa_unica_sin_importar_formato(self):
+        self.autenticar(self.cliente)
+        response = self.client.post('/api/cliente/vehiculos/', {'placa': 'abc 123'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content[:300])
+        nuevo = Vehiculo.objects.get(placa='abc 123')
+        self.assertEqual(nuevo.placa_normalizada, 'ABC123')
+
+        for placa in ('ABC-123', 'a.b.c/123', 'Ñ-1', '--'):
+            response = self.client.post('/api/cliente/vehiculos/', {'placa': placa}, format='json')
+            self.assertEqual(response.status_code, 400, placa)
+        response = self.client.patch(
+            f'/api/cliente/vehiculos/{self.vehiculo.pk}/', {'placa': 'Abc-123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/cliente/vehiculos/{nuevo.pk}/', {'placa': 'ABC-123'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content[:300])
+
+        # La base de datos la calcula y la exige también sin serializer
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vehiculo.objects.bulk_create([Vehiculo(placa='abc.123', id_usuario_propietario=self.cliente)])
+
+    def test_autocompletar_en_una_consulta(self):
+        abiertos = Vehiculo.objects.filter(id_usuario_propietario=self.cliente).order_by('placa_normalizada')
+        con_reservacion, sin_reservacion = abiertos[1], abiertos[0]
+        Reservacion.objects.filter(id_solicitud__id_vehiculo=con_reservacion).update(estado_global='completada')
+        self.assertFalse(sin_reservacion.solicitudes.filter(reservaciones__isnull=False).exists())
+
+        resultados = self.assertPresupuesto(
+            self.asistente, 'get', '/api/asistente/vehiculos/placa/', 2,
+            {'q': f'{self.cliente.pk} plc-00', 'n': 5}
+        ).data
+        self.assertEqual([v['id'] for v in resultados], [v.pk for v in abiertos[:5]])
+        por_id = {v['id']: v for v in resultados}
+        self.assertEqual(por_id[sin_reservacion.pk]['propietario_email'], self.cliente.email)
+        self.assertEqual(
+            por_id[sin_reservacion.pk]['solicitud_abierta']['id'], sin_reservacion.solicitudes.get().pk
+        )
+        self.assertIsNone(por_id[con_reservacion.pk]['solicitud_abierta'])
+
+        self.autenticar(self.asistente)
+        self.assertEqual(self.client.get('/api/asistente/vehiculos/placa/', {'q': '--'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/asistente/vehiculos/placa/', {'q': 'zz'}).data, [])
+
+
+# ==========================================
+# EXPORTACIÓN
+# ==========================================
+
+class ExportacionTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def exportar(self, entidad, **params):
+        """Contenido completo y consultas, contando las del envío"""
+        self.autenticar(self.asistente)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(f'/api/asistente/exportar/{entidad}/', params)
+            self.assertEqual(response.status_code, 200)
+            contenido = b''.join(response.streaming_content).decode()
+        return response, contenido, len(consultas)
+
+    def test_todas_las_filas_en_una_consulta(self):
+        modelos = {
+            'solicitudes': Solicitud, 'detalles': DetalleSolicitud,
+            'reservaciones': Reservacion, 'servicios': ServicioReservado,
+        }
+        # Lotes pequeños: la respuesta sale en varios fragmentos
+        # La lectura del usuario al autenticar y una consulta para todas las filas
+        with mock.patch('agencia.exportacion.LOTE', 7):
+            for entidad, modelo in modelos.items():
+                response, contenido, consultas = self.exportar(entidad)
+                self.assertEqual(consultas, 2, entidad)
+                self.assertTrue(response.streaming)
+                self.assertIn(f'{entidad}.csv', response['Content-Disposition'])
+                encabezado, *filas = list(csv.reader(io.StringIO(contenido)))
+                self.assertEqual(encabezado[0], 'id')
+                self.assertEqual(len(filas), modelo.objects.count(), entidad)
+
+                response, contenido, consultas = self.exportar(entidad, formato='ndjson')
+                self.assertEqual(consultas, 2, entidad)
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                registros = [json.loads(linea) for linea in contenido.splitlines()]
+                self.assertEqual(
+                    sorted(r['id'] for r in registros), sorted(modelo.objects.values_list('pk', flat=True))
+                )
+
+        registro = next(r for r in registros if r['id'] == self.servicio.pk)
+        self.assertEqual(registro['tecnico'], self.tecnico.nombre)
+        self.assertEqual(Decimal(registro['costo_base']), self.servicio_taller.costo_base)
+
+    def test_rango_de_fechas(self):
+        hace_un_mes = timezone.now() - timedelta(days=30)
+        viejas = list(Solicitud.objects.order_by('pk').values_list('pk', flat=True)[:12])
+        Solicitud.objects.filter(pk__in=viejas).update(fecha_creacion=hace_un_mes)
+        dia = timezone.localdate(hace_un_mes)
+
+        response, contenido, _ = self.exportar('solicitudes', desde=dia, hasta=dia, formato='ndjson')
+        self.assertEqual([json.loads(linea)['id'] for linea in contenido.splitlines()], viejas)
+        self.assertIn(f'solicitudes-{dia}-{dia}.ndjson', response['Content-Disposition'])
+        _, contenido, _ = self.exportar('solicitudes', desde=dia + timedelta(days=1), formato='ndjson')
+        self.assertEqual(len(contenido.splitlines()), Solicitud.objects.count() - len(viejas))
+
+        self.assertEqual(self.client.get(
+            '/api/asistente/exportar/solicitudes/', {'desde': dia, 'hasta': dia - timedelta(days=1)}
+        ).status_code, 400)
+        self.assertEqual(self.client.get('/api/asistente/exportar/usuarios/').status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/asistente/exportar/detalles/', HTTP_ACCEPT='text/csv').status_code, 200
+        )
+        self.autenticar(self.tecnico)
+        self.assertEqual(self.client.get('/api/asistente/exportar/solicitudes/').status_code, 403)
+
+    def test_csv_sin_formulas(self):
+        textos = ['=HYPERLINK("http://x")', '+1+1', '-2+3', '@SUM(A1)', 'Cambio de aceite']
+        DetalleSolicitud.objects.bulk_create([
+            DetalleSolicitud(id_solicitud=self.solicitud, observaciones=texto, costo=Decimal('-5.00'))
+            for texto in textos
+        ])
+        _, contenido, _ = self.exportar('detalles')
+        encabezado, *filas = list(csv.reader(io.StringIO(contenido)))
+        columna = encabezado.index('observaciones')
+        exportados = {fila[columna]: fila[encabezado.index('costo')] for fila in filas}
+        for texto in textos[:-1]:
+            self.assertEqual(exportados[f"'{texto}"], '-5.00')
+        self.assertIn('Cambio de aceite', exportados)
+
+        # NDJSON no lo abre una hoja de cálculo: los textos salen tal cual
+        _, contenido, _ = self.exportar('detalles', formato='ndjson')
+        observaciones = [json.loads(linea)['observaciones'] for linea in contenido.splitlines()]
+        self.assertIn('=HYPERLINK("http://x")', observaciones)
+
+    async def test_en_hilo_propio_bajo_asgi(self):
+        contenido = [linea async for linea in exportacion.en_hilo_propio(iter(['a\n', 'b\n']))]
+        self.assertEqual(contenido, ['a\n', 'b\n'])
+
+        # Si el cliente se va, el hilo deja de generar y cierra el generador
+        cerrado = threading.Event()
+
+        def sin_fin():
+            try:
+                while True:
+                    yield 'x'
+            finally:
+                cerrado.set()
+
+        stream = exportacion.en_hilo_propio(sin_fin())
+        self.assertEqual(await anext(stream), 'x')
+        await stream.aclose()
+        self.assertTrue(await asyncio.to_thread(cerrado.wait, 5))
+
+
+# ==========================================
+# SINCRONIZACIÓN INCREMENTAL
+# ==========================================
+
+class CambiosTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def cambios(self, usuario, ruta, cursor):
+        self.autenticar(usuario)
+        response = self.client.get(f'/api/{ruta}/cambios/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 200, response.content[:300])
+        return response.data
+
+    def cursor_actual(self, usuario, ruta):
+        self.autenticar(usuario)
+        return self.client.get(f'/api/{ruta}/cambios/').data['cursor']
+
+    def test_cambios_y_bajas_del_cliente(self):
+        cursor = self.cursor_actual(self.cliente, 'cliente')
+        otra = Reservacion.objects.filter(
+            id_solicitud__id_usuario=self.cliente
+        ).exclude(pk=self.reservacion.pk).first()
+
+        self.autenticar(self.asistente)
+        self.client.patch('/api/asistente/reservaciones/estado/', {
+            'ids': [self.reservacion.pk], 'estado_global': 'confirmada'
+        }, format='json')
+        self.client.delete(f'/api/asistente/reservaciones/{otra.pk}/')
+        self.autenticar(self.tecnico)
+        self.client.post(f'/api/taller/servicios/{self.servicio.pk}/progreso/', {
+            'id_serv_res': self.servicio.pk, 'porcentaje': 60, 'comentario': 'Avance'
+        }, format='json')
+
+        datos = self.cambios(self.cliente, 'cliente', cursor)
+        self.assertFalse(datos['mas'])
+        # El avance del técnico la lleva a en_progreso
+        self.assertEqual(
+            [(r['id'], r['estado_global']) for r in datos['reservaciones']],
+            [(self.reservacion.pk, 'en_progreso')]
+        )
+        self.assertEqual([s['avance_porcentaje'] for s in datos['servicios']], [60])
+        self.assertEqual([p['comentario'] for p in datos['progresos']], ['Avance'])
+        # La baja en cascada se informa solo por el registro de origen
+        self.assertEqual(datos['bajas'], {'reservaciones': [otra.pk]})
+        self.assertNotIn('solicitudes', datos)
+
+        # Reanudar sin cambios: solo el cursor, en dos consultas
+        sin_cambios = self.assertPresupuesto(
+            self.cliente, 'get', f'/api/cliente/cambios/?cursor={datos["cursor"]}', 3
+        )
+        self.assertEqual(sin_cambios.data, {'cursor': datos['cursor'], 'mas': False})
+
+    def test_reasignacion_para_el_tecnico(self):
+        cursor = self.cursor_actual(self.tecnico, 'taller')
+        self.autenticar(self.asistente)
+        self.client.put(
+            f'/api/asistente/servicios-reservados/{self.servicio.pk}/asignar-tecnico/',
+            {'id_usuario_taller': self.otro_tecnico.pk}, format='json'
+        )
+        datos = self.cambios(self.tecnico, 'taller', cursor)
+        self.assertEqual(datos['bajas'], {'servicios': [self.servicio.pk]})
+        datos = self.cambios(self.otro_tecnico, 'taller', cursor)
+        self.assertEqual([s['id'] for s in datos['servicios']], [self.servicio.pk])
+
+    def test_baja_en_cascada_para_el_tecnico(self):
+        cursor = self.cursor_actual(self.tecnico, 'taller')
+        servicios = {
+            tecnico: sorted(self.reservacion.servicios_reservados.filter(
+                id_usuario_taller=tecnico
+            ).values_list('pk', flat=True))
+            for tecnico in (self.tecnico, self.otro_tecnico)
+        }
+        self.autenticar(self.asistente)
+        self.client.delete(f'/api/asistente/reservaciones/{self.reservacion.pk}/')
+
+        for tecnico, ids in servicios.items():
+            datos = self.cambios(tecnico, 'taller', cursor)
+            self.assertEqual(datos['bajas'], {'servicios': ids})
+        # El cliente solo recibe la del origen
+        datos = self.cambios(self.cliente, 'cliente', cursor)
+        self.assertEqual(datos['bajas'], {'reservaciones': [self.reservacion.pk]})
+
+    def test_detalle_cambia_la_solicitud(self):
+        cursor = self.cursor_actual(self.cliente, 'cliente')
+        self.autenticar(self.asistente)
+        self.client.post(f'/api/asistente/solicitudes/{self.solicitud.pk}/detalle/', {
+            'id_solicitud': self.solicitud.pk, 'observaciones': 'Balatas', 'costo': '350.00'
+        }, format='json')
+
+        datos = self.cambios(self.cliente, 'cliente', cursor)
+        self.assertEqual([s['id'] for s in datos['solicitudes']], [self.solicitud.pk])
+        self.assertIn(
+            'Balatas', [d['observaciones'] for d in datos['solicitudes'][0]['detalles']]
+        )
+
+        cursor = datos['cursor']
+        DetalleSolicitud.objects.filter(id_solicitud=self.solicitud).first().delete()
+        datos = self.cambios(self.cliente, 'cliente', cursor)
+        self.assertEqual([s['id'] for s in datos['solicitudes']], [self.solicitud.pk])
+
+    def test_paginas_y_cursor_purgado(self):
+        cursor = self.cursor_actual(self.tecnico, 'taller')
+        ids = list(
+            ServicioReservado.objects.filter(id_usuario_taller=self.tecnico).values_list('pk', flat=True)
+        )
+        self.autenticar(self.tecnico)
+        self.client.patch('/api/taller/mis-servicios/estado/', {
+            'ids': ids, 'estado': 'en_progreso'
+        }, format='json')
+        with mock.patch('agencia.cambios.LIMITE', 5):
+            primera = self.cambios(self.tecnico, 'taller', cursor)
+        self.assertTrue(primera['mas'])
+        self.assertEqual(len(primera['servicios']), 5)
+
+        call_command('purgar_cambios', dias=-1, stdout=io.StringIO())
+        self.autenticar(self.tecnico)
+        self.assertEqual(self.client.get(f'/api/taller/cambios/?cursor={cursor}').status_code, 410)
+        self.assertEqual(self.client.get('/api/taller/cambios/?cursor=abc').status_code, 404)
+
+
+# ==========================================
+# AGENDA DEL TALLER
+# ==========================================
+
+def a_las(dia, hora, minuto=0):
+    return timezone.make_aware(datetime.combine(dia, time(hora, minuto)))
+
+
+class AgendaTallerTests(TestCase):
+    """Motor de horarios libres sobre datos armados en memoria"""
+
+    lunes = date(2030, 1, 7)
+
+    def agenda(self, ocupaciones=(), reservaciones=(), bahias=6):
+        return AgendaTaller(
+            a_las(self.lunes, 0), a_las(self.lunes, 0) + timedelta(days=7),
+            [1, 2], ocupaciones, reservaciones, bahias=bahias
+        )
+
+    def test_huecos_por_tecnico(self):
+        agenda = self.agenda(ocupaciones=[
+            (1, a_las(self.lunes, 8), a_las(self.lunes, 10)),
+            (2, a_las(self.lunes, 8), a_las(self.lunes, 9)),
+        ])
+        huecos = agenda.huecos_libres(60, n=3)
+        self.assertEqual(
+            [(h['inicio'], h['tecnicos']) for h in huecos],
+            [
+                (a_las(self.lunes, 9), [2]),
+                (a_las(self.lunes, 9, 30), [2]),
+                (a_las(self.lunes, 10), [1, 2]),
+            ]
+        )
+        self.assertEqual(huecos[0]['fin'], a_las(self.lunes, 10))
+        self.assertEqual(agenda.huecos_libres(60, n=1, tecnicos=[1])[0]['inicio'], a_las(self.lunes, 10))
+
+    def test_bahias_y_horario(self):
+        agenda = self.agenda(reservaciones=[(a_las(self.lunes, 8), a_las(self.lunes, 12))], bahias=1)
+        self.assertFalse(agenda.hay_capacidad(a_las(self.lunes, 11), 60))
+        self.assertTrue(agenda.hay_capacidad(a_las(self.lunes, 12), 60))
+        self.assertEqual(agenda.huecos_libres(60, n=1)[0]['inicio'], a_las(self.lunes, 12))
+        # Fuera de jornada o en domingo
+        self.assertFalse(agenda.hay_capacidad(a_las(self.lunes, 17, 30), 60))
+        self.assertFalse(agenda.hay_capacidad(a_las(self.lunes + timedelta(days=6), 10), 60))
+
+    def test_trabajo_que_no_cabe_en_la_jornada_pasa_al_dia_siguiente(self):
+        agenda = self.agenda(ocupaciones=[
+            (tecnico, a_las(self.lunes, 8), a_las(self.lunes, 10)) for tecnico in (1, 2)
+        ])
+        hueco = agenda.huecos_libres(9 * 60, n=1)[0]
+        self.assertEqual(hueco['inicio'], a_las(self.lunes + timedelta(days=1), 8))
+
+
+class DisponibilidadTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+        hoy = timezone.localdate()
+        cls.lunes = hoy + timedelta(days=7 - hoy.weekday())
+
+    def test_endpoint_disponibilidad(self):
+        ServicioTaller.objects.filter(pk=self.servicio_taller.pk).update(duracion_estimada=90)
+        response = self.assertPresupuesto(
+            self.asistente, 'get',
+            f'/api/asistente/disponibilidad/?servicios={self.servicio_taller.pk}&n=3', 5
+        )
+        self.assertEqual(response.data['duracion_minutos'], 90)
+        self.assertEqual(len(response.data['huecos']), 3)
+        self.assertIn(self.tecnico.pk, response.data['huecos'][0]['tecnicos'])
+
+    def test_reservacion_sin_capacidad(self):
+        inicio = a_las(self.lunes, 10)
+        Reservacion.objects.bulk_create([
+            Reservacion(id_solicitud=self.solicitud, fecha=inicio) for _ in range(agenda.BAHIAS)
+        ])
+        sin_reservacion = Solicitud.objects.filter(reservaciones__isnull=True).first()
+        self.autenticar(self.asistente)
+        response = self.client.post('/api/asistente/reservaciones/', {
+            'id_solicitud': sin_reservacion.pk, 'fecha': inicio.isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['sugerencias'][0], a_las(self.lunes, 11).isoformat()
+        )
+
+        response = self.client.post('/api/asistente/reservaciones/', {
+            'id_solicitud': sin_reservacion.pk, 'fecha': a_las(self.lunes, 11).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content[:300])
+
+    def test_reservacion_con_fin_antes_del_inicio(self):
+        sin_reservacion = Solicitud.objects.filter(reservaciones__isnull=True).first()
+        self.autenticar(self.asistente)
+        for fin in (a_las(self.lunes, 9), a_las(self.lunes, 10)):
+            response = self.client.post('/api/asistente/reservaciones/', {
+                'id_solicitud': sin_reservacion.pk,
+                'fecha_inicio': a_las(self.lunes, 10).isoformat(),
+                'fecha_fin': fin.isoformat(),
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('fecha_fin', response.data)
+
+
+# ==========================================
+# VERSIÓN DE FILA Y PETICIONES CONDICIONALES
+# ==========================================
+
+class VersionFilaTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def test_get_condicional(self):
+        url = f'/api/cliente/reservaciones/{self.reservacion.pk}/'
+        self.autenticar(self.cliente)
+        etag = self.client.get(url)['ETag']
+        # El usuario (autenticación) y la versión
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Asignar un servicio cambia servicios_count: el ETag también
+        ServicioReservado.objects.create(
+            id_reservacion=self.reservacion, id_servicio=self.servicio_taller
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_editar_lo_mostrado_cambia_el_etag(self):
+        urls = {
+            'solicitud': f'/api/cliente/solicitudes/{self.solicitud.pk}/',
+            'reservacion': f'/api/cliente/reservaciones/{self.reservacion.pk}/',
+        }
+        self.autenticar(self.cliente)
+
+        def etags():
+            return {
+                'solicitud': self.client.get(urls['solicitud'])['ETag'],
+                'reservacion': self.client.get(urls['reservacion'])['ETag'],
+                'servicio': ServicioReservado.objects.get(pk=self.servicio.pk).version,
+            }
+
+        antes = etags()
+        # Guardar sin cambiar nada de lo mostrado (el last_login del inicio
+        # de sesión) no invalida
+        self.cliente.last_login = timezone.now()
+        self.cliente.save(update_fields=['last_login'])
+        self.assertEqual(etags(), antes)
+        # Ni un save() completo que deja lo mostrado como estaba: el get, la
+        # lectura de lo guardado, su UPDATE y el de la versión del catálogo
+        with self.assertNumQueries(4):
+            Marca.objects.get(modelos=self.vehiculo.id_modelo_id).save()
+        self.assertEqual(etags(), antes)
+
+        vehiculo = Vehiculo.objects.get(pk=self.vehiculo.pk)
+        vehiculo.placa = 'EDITADA-1'
+        vehiculo.id_modelo = Modelo.objects.exclude(pk=vehiculo.id_modelo_id).first()
+        vehiculo.save()
+        despues = etags()
+        self.assertTrue(all(despues[clave] != antes[clave] for clave in antes))
+
+        # La marca del modelo del vehículo, a tres saltos
+        marca = Marca.objects.get(modelos=vehiculo.id_modelo_id)
+        marca.nombre = 'Marca editada'
+        marca.save()
+        antes, despues = despues, etags()
+        self.assertTrue(all(despues[clave] != antes[clave] for clave in antes))
+
+        # El nombre del técnico solo aparece en el servicio
+        tecnico = Usuario.objects.get(pk=self.tecnico.pk)
+        tecnico.nombre = 'Técnico renombrado'
+        tecnico.save()
+        antes, despues = despues, etags()
+        self.assertEqual(despues['solicitud'], antes['solicitud'])
+        self.assertNotEqual(despues['servicio'], antes['servicio'])
+
+    def test_if_match_rechaza_actualizacion_perdida(self):
+        url = f'/api/cliente/solicitudes/{self.solicitud.pk}/'
+        self.autenticar(self.cliente)
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.patch(
+            url, {'descripcion': 'Primera'}, format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Segundo cliente con la versión que ya no está vigente
+        response = self.client.patch(
+            url, {'descripcion': 'Segunda'}, format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+        self.solicitud.refresh_from_db()
+        self.assertEqual(self.solicitud.descripcion, 'Primera')
+
+    def test_if_match_en_cambio_de_estado(self):
+        url = f'/api/taller/mis-servicios/{self.servicio.pk}/'
+        self.autenticar(self.tecnico)
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(
+            f'{url}estado/', {'estado': 'en_progreso'}, format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url)['ETag'], response['ETag'])
+
+    def test_update_condicionado_a_la_version(self):
+        primera = Reservacion.objects.get(pk=self.reservacion.pk)
+        segunda = Reservacion.objects.get(pk=self.reservacion.pk)
+        primera.notas = 'Primera'
+        primera.save()
+        self.assertEqual(primera.version, segunda.version + 1)
+
+        # La fila ya cambió: el UPDATE con la versión leída no afecta nada
+        segunda.notas = 'Segunda'
+        segunda.version_esperada = segunda.version
+        with self.assertRaises(ConflictoVersion):
+            segunda.save()
+        primera.refresh_from_db()
+        self.assertEqual(primera.notas, 'Primera')
+
+
+# ==========================================
+# PAGINACIÓN POR CURSOR
+# ==========================================
+
+class KeysetPaginationTests(PresupuestoConsultasMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+        # Empates en la fecha para ejercitar el desempate por id
+        Solicitud.objects.filter(pk__lte=30).update(fecha_creacion=timezone.now())
+        Reservacion.objects.filter(pk__gt=20).update(fecha=timezone.now())
+
+    def recorrer(self, url):
+        ids = []
+        while url:
+            with mock.patch.object(KeysetPagination, 'page_size', 7):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(fila['id'] for fila in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_recorrido_completo_solicitudes(self):
+        self.autenticar(self.asistente)
+        esperado = list(
+            Solicitud.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.recorrer('/api/asistente/solicitudes/'), esperado)
+
+    def test_recorrido_con_fechas_nulas(self):
+        self.autenticar(self.asistente)
+        ids = self.recorrer('/api/asistente/reservaciones/')
+        self.assertEqual(len(ids), Reservacion.objects.count())
+        self.assertEqual(len(set(ids)), len(ids))
+        # Primero las que tienen fecha, luego las nulas; dentro de cada grupo por id desc
+        con_fecha = Reservacion.objects.filter(fecha__isnull=False).count()
+        self.assertEqual(ids[con_fecha:], sorted(ids[con_fecha:], reverse=True))
+
+    def test_paginacion_por_numero_opcional(self):
+        self.autenticar(self.tecnico)
+        response = self.client.get('/api/taller/mis-servicios/?page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['count'],
+            ServicioReservado.objects.filter(id_usuario_taller=self.tecnico).count()
+        )
+
+    def test_cursor_invalido(self):
+        self.autenticar(self.asistente)
+        response = self.client.get('/api/asistente/solicitudes/?cursor=basura')
+        self.assertEqual(response.status_code, 404)
+
+    def test_ordering_solo_con_page(self):
+        self.autenticar(self.asistente)
+        siguiente = self.client.get('/api/asistente/solicitudes/').data['next']
+        for url in ('/api/asistente/solicitudes/?ordering=id', f'{siguiente}&ordering=id'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ordering', response.data)
+        response = self.client.get('/api/asistente/solicitudes/?page=1&ordering=id')
+        self.assertEqual(response.status_code, 200)
+        ids = [fila['id'] for fila in response.data['results']]
+        self.assertEqual(ids, sorted(ids))
+
+
+# ==========================================
+# PLANES DE CONSULTA
+# ==========================================
+
+# Recorrido completo de una tabla sin índice u ordenamiento en memoria
+PLAN_PROHIBIDO = re.compile(r'^SCAN (\w+)$|USE TEMP B-TREE')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es propio de SQLite')
+class PlanesConsultaTests(PresupuestoConsultasMixin, APITestCase):
+    """
+    Cada SELECT de los listados y detalles frecuentes debe resolverse con
+    índices: ni recorridos completos ni ordenamientos en un B-tree temporal.
+    """
+
+    # El listado del cliente ordena sólo sus propias reservaciones (join por
+    # solicitud), un conjunto acotado que no vale la pena desnormalizar
+    ORDEN_EN_MEMORIA_PERMITIDO = {'/api/cliente/reservaciones/'}
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_datos_a_escala(cls)
+
+    def planes(self, usuario, url):
+        self.autenticar(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:300])
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                if not consulta['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {consulta['sql']}")
+                yield consulta['sql'], [fila[-1] for fila in cursor.fetchall()]
+
+    def assertUsaIndices(self, usuario, url):
+        for sql, plan in self.planes(usuario, url):
+            for paso in plan:
+                if 'TEMP B-TREE' in paso and url in self.ORDEN_EN_MEMORIA_PERMITIDO:
+                    continue
+                self.assertIsNone(
+                    PLAN_PROHIBIDO.search(paso),
+                    f'GET {url}: {paso}\n{sql}\n' + '\n'.join(plan)
+                )
+
+    def test_listados_por_fecha(self):
+        self.assertUsaIndices(self.asistente, '/api/asistente/solicitudes/')
+        self.assertUsaIndices(self.asistente, '/api/asistente/reservaciones/')
+        self.assertUsaIndices(self.asistente, '/api/asistente/servicios-reservados/')
+        self.assertUsaIndices(self.tecnico, '/api/taller/mis-servicios/')
+
+    def test_listados_cliente(self):
+        self.assertUsaIndices(self.cliente, '/api/cliente/solicitudes/')
+        self.assertUsaIndices(self.cliente, '/api/cliente/reservaciones/')
+        self.assertUsaIndices(self.cliente, '/api/cliente/vehiculos/')
+
+    def test_progreso_y_detalles(self):
+        self.assertUsaIndices(
+            self.cliente, f'/api/cliente/reservaciones/{self.reservacion.pk}/servicios/'
+        )
+        self.assertUsaIndices(self.cliente, f'/api/cliente/servicios/{self.servicio.pk}/progreso/')
+        self.assertUsaIndices(
+            self.tecnico, f'/api/taller/servicios/{self.servicio.pk}/progreso/listar/'
+        )
+        self.assertUsaIndices(self.tecnico, f'/api/taller/reservaciones/{self.reservacion.pk}/')
+
+    def test_bitacora_de_cambios(self):
+        self.assertUsaIndices(self.cliente, '/api/cliente/cambios/?cursor=0')
+        self.assertUsaIndices(self.tecnico, '/api/taller/cambios/?cursor=0')
 
-# Create your tests here.
+    def test_autocompletar_placa(self):
+        self.assertUsaIndices(self.asistente, f'/api/asistente/vehiculos/placa/?q={self.cliente.pk}-plc')
@@ -5,6 +5,16 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Bajo ASGI las vistas síncronas comparten un solo hilo, así que los clientes
+deben autenticarse con /api/auth/login/async/: el hash de la contraseña se
+verifica en un pool acotado (LOGIN_HASH_WORKERS / LOGIN_HASH_CAPACIDAD) y el
+resto de la API no se bloquea durante los picos de login.
+
+El seguimiento en vivo de los clientes (/api/cliente/eventos/) es una vista
+async con Server-Sent Events: cada conexión abierta es una corrutina en
+espera, sin hilo propio, así que un worker sostiene miles de clientes.
+Bajo WSGI cada stream ocuparía un hilo completo.
 """
 
 import os
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from datetime import timedelta
+from datetime import time, timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -90,6 +90,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 🆕 Escrituras concurrentes: IMMEDIATE toma el candado de escritura
+        # al abrir la transacción (sin "database is locked" a mitad de ella),
+        # WAL deja leer mientras otro escribe y timeout es la espera máxima
+        # por el candado, en segundos
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
@@ -157,8 +166,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # ==========================================
 
 REST_FRAMEWORK = {
+    # 🆕 Las vistas de solo lectura de cliente y taller usan además
+    # users.api.authentication.JWTSinConsultaAuthentication (ver REVOCACION_CACHE)
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.api.authentication.JWTUsuarioAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -206,6 +217,100 @@ SIMPLE_JWT = {
 }
 
 
+# ==========================================
+# LOGIN ASÍNCRONO (ASGI)
+# ==========================================
+
+# 🆕 Pool dedicado para verificar contraseñas en /api/auth/login/async/
+LOGIN_HASH_WORKERS = 4       # Hilos que calculan hashes en paralelo
+LOGIN_HASH_CAPACIDAD = 32    # En curso + en espera; por encima se responde 503
+
+
+# ==========================================
+# AGENDA DEL TALLER
+# ==========================================
+
+# 🆕 Capacidad y horario que usa agencia.agenda para buscar horarios libres
+TALLER_BAHIAS = 6                          # Vehículos atendidos a la vez
+TALLER_APERTURA = time(8, 0)
+TALLER_CIERRE = time(18, 0)
+TALLER_DIAS_HABILES = (0, 1, 2, 3, 4, 5)   # Lunes a sábado
+AGENDA_PASO_MINUTOS = 30                   # Granularidad de los horarios ofrecidos
+AGENDA_DURACION_DEFAULT = 60               # Minutos si el servicio no tiene duración
+AGENDA_VENTANA_DIAS = 14                   # Días hacia adelante que se cargan
+
+
+# ==========================================
+# EVENTOS EN VIVO (SSE)
+# ==========================================
+
+# 🆕 Stream /api/cliente/eventos/ (agencia.eventos). El broker local entrega
+# solo dentro del proceso; con varios workers se reemplaza por uno compartido
+EVENTOS_BROKER = 'agencia.eventos.BrokerLocal'
+EVENTOS_HEARTBEAT_SEGUNDOS = 15    # Comentario ": ping" en conexiones inactivas
+EVENTOS_REVISION_USUARIO_SEGUNDOS = 300  # Sin cache compartida: cada cuánto se lee is_active
+EVENTOS_PENDIENTES_MAX = 100       # Servicios con evento pendiente por conexión
+
+
+# ==========================================
+# AVANCE DE SERVICIOS
+# ==========================================
+
+# 🆕 Rechazar (409) progresos con porcentaje menor al avance guardado.
+# Sin esto gana el último en escribir (benchmark_progreso verifica ambos modos)
+PROGRESO_MONOTONO = False
+
+
+# ==========================================
+# SINCRONIZACIÓN INCREMENTAL
+# ==========================================
+
+# 🆕 Bitácora de cambios para /api/cliente/cambios/ y /api/taller/cambios/
+CAMBIOS_LIMITE = 500              # Registros por respuesta; con más, "mas": true
+CAMBIOS_RETENCION_DIAS = 30       # purgar_cambios borra lo anterior (cursor → 410)
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+
+# 🆕 /api/asistente/buscar/ sobre el índice FTS5 (agencia.busqueda)
+BUSQUEDA_TERMINOS_MAX = 8         # Palabras de la consulta que se usan
+BUSQUEDA_CANDIDATOS = 2000        # Coincidencias más recientes que se ordenan por relevancia
+
+
+# ==========================================
+# EXPORTACIÓN
+# ==========================================
+
+# 🆕 /api/asistente/exportar/<entidad>/ (agencia.exportacion)
+EXPORTACION_LOTE = 2000           # Filas por lectura del cursor y por fragmento enviado
+
+
+# ==========================================
+# CACHE
+# ==========================================
+
+# 🆕 Cache local por proceso. La autenticación sin consulta
+# (JWTSinConsultaAuthentication) solo evita leer el usuario si la cache de
+# revocaciones (REVOCACION_CACHE, default: 'default') es compartida; con
+# esta, cada petición sigue comprobando is_active en la base de datos.
+# Los catálogos guardan aquí sus respuestas bajo la versión, que se lee de
+# la base de datos (agencia.cache_catalogo), así que pueden ser locales.
+# 🔧 En producción con varios workers usar un backend compartido:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # ==========================================
 # CORS CONFIGURATION (si usas frontend separado)
 # ==========================================
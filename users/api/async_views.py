@@ -0,0 +1,69 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from users.hashing import ejecutor_hash, ColaLlena
+from users.models import Usuario
+from .serializers import LoginSerializer, UsuarioSerializer
+from .tokens import RefreshTokenConRol
+
+
+# ==========================================
+# AUTENTICACIÓN (ASGI)
+# ==========================================
+
+def _emitir_tokens(user):
+    refresh = RefreshTokenConRol.for_user(user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+        'user': UsuarioSerializer(user).data,
+    }
+
+
+@csrf_exempt
+@require_POST
+async def login_async(request):
+    """
+    POST /api/auth/login/async/
+    Body: {"email": "user@example.com", "password": "12345678"}
+    Misma respuesta que /api/auth/login/. El hash se verifica en un pool
+    acotado (users.hashing); si está lleno responde 503 con Retry-After.
+    """
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    serializer = LoginSerializer(data=datos)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    email = serializer.validated_data['email']
+    password = serializer.validated_data['password']
+
+    try:
+        user = await Usuario.objects.select_related('id_tipo').aget(email=email)
+    except Usuario.DoesNotExist:
+        return JsonResponse({'error': 'Credenciales inválidas'}, status=401)
+
+    try:
+        valido = await ejecutor_hash.verificar(password, user.password)
+    except ColaLlena:
+        response = JsonResponse(
+            {'error': 'Servicio de autenticación saturado, intenta de nuevo'},
+            status=503
+        )
+        response['Retry-After'] = '1'
+        return response
+
+    if not valido:
+        return JsonResponse({'error': 'Credenciales inválidas'}, status=401)
+
+    if not user.is_active:
+        return JsonResponse({'error': 'Usuario inactivo'}, status=401)
+
+    return JsonResponse(await sync_to_async(_emitir_tokens)(user), status=200)
@@ -0,0 +1,134 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from users.models import Usuario
+from users.revocacion import compartida, token_revocado
+from .tokens import ROL_CLAIM
+
+
+class UsuarioToken:
+    """
+    Usuario ligero construido con los claims del access token.
+    Expone id/pk y rol sin consultar la base de datos; cualquier otro
+    atributo carga (una sola vez) el Usuario real y se delega en él.
+    """
+    __slots__ = ('id', 'rol', '_usuario')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, usuario_id, rol=None):
+        # simplejwt guarda el id como texto en el claim
+        object.__setattr__(self, 'id', Usuario._meta.pk.to_python(usuario_id))
+        object.__setattr__(self, 'rol', rol)
+        object.__setattr__(self, '_usuario', None)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def usuario(self):
+        """Instancia real de Usuario (se consulta en el primer acceso)"""
+        if self._usuario is None:
+            object.__setattr__(
+                self, '_usuario',
+                Usuario.objects.select_related('id_tipo').get(pk=self.id)
+            )
+        return self._usuario
+
+    def __getattr__(self, nombre):
+        # Solo se invoca para atributos que el token no tiene
+        return getattr(self.usuario, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre in UsuarioToken.__slots__:
+            raise AttributeError(f'{nombre} es de solo lectura')
+        setattr(self.usuario, nombre, valor)
+
+    def __eq__(self, otro):
+        if isinstance(otro, (UsuarioToken, Usuario)):
+            return self.pk == otro.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return str(self.usuario)
+
+
+class JWTUsuarioAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que lee el usuario junto con su TipoUsuario en la
+    misma consulta: los permisos usan el rol vigente de la fila y no el del
+    claim, que no cambia hasta que el token expira.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no contiene identificación de usuario')
+
+        try:
+            usuario = Usuario.objects.select_related('id_tipo').get(
+                **{jwt_settings.USER_ID_FIELD: usuario_id}
+            )
+        except Usuario.DoesNotExist:
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(usuario.password):
+            raise AuthenticationFailed('La contraseña del usuario cambió', code='password_changed')
+        return usuario
+
+
+class JWTSinConsultaAuthentication(JWTUsuarioAuthentication):
+    """
+    Autenticación JWT sin consultar la tabla de usuarios en cada petición,
+    para las vistas de solo lectura que la declaran. Las desactivaciones y
+    eliminaciones y los cambios de rol se respetan con la marca de
+    revocación (ver users.revocacion); si su cache no es compartida entre
+    procesos, se lee el usuario en la base de datos como
+    JWTUsuarioAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if not compartida():
+            return super().get_user(validated_token)
+
+        try:
+            usuario_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no contiene identificación de usuario')
+
+        if token_revocado(usuario_id, validated_token):
+            raise AuthenticationFailed('Token revocado', code='token_revocado')
+
+        return UsuarioToken(usuario_id, validated_token.get(ROL_CLAIM))
+
+
+class JWTQueryStringAuthentication(JWTSinConsultaAuthentication):
+    """
+    Además del encabezado acepta el access token en ?token=...: EventSource
+    no permite enviar Authorization. Solo para streams de lectura, porque
+    la URL puede quedar en bitácoras de proxies.
+    """
+    parametro = 'token'
+
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is not None:
+            return resultado
+        crudo = request.GET.get(self.parametro)
+        if not crudo:
+            return None
+        validado = self.get_validated_token(crudo.encode())
+        return self.get_user(validado), validado
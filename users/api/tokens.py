@@ -0,0 +1,104 @@
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken, BlacklistedToken
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from users.lista_negra import lista_negra
+from users.models import Usuario
+
+
+# Claim firmado con la clave (cve) del TipoUsuario
+ROL_CLAIM = 'rol'
+
+
+class RefreshTokenConRol(RefreshToken):
+    """
+    Refresh token que incluye el rol del usuario.
+    El access token derivado copia el claim, así que los permisos por rol
+    se resuelven con el token validado sin consultar TipoUsuario.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[ROL_CLAIM] = user.id_tipo.cve
+        return token
+
+    def check_blacklist(self):
+        """Consulta primero la lista negra local y luego la base de datos"""
+        jti = self.payload[jwt_settings.JTI_CLAIM]
+        if lista_negra.contiene(jti):
+            raise TokenError('El token está en la lista negra')
+        try:
+            super().check_blacklist()
+        except TokenError:
+            lista_negra.agregar(jti, self.payload['exp'])
+            raise
+
+    def blacklist(self):
+        resultado = super().blacklist()
+        jti, exp = self.payload[jwt_settings.JTI_CLAIM], self.payload['exp']
+        transaction.on_commit(lambda: lista_negra.agregar(jti, exp))
+        return resultado
+
+    def rotar(self):
+        """
+        Revoca este token y lo convierte en uno nuevo (jti, exp e iat
+        nuevos) en una sola transacción. Si otra petición ya rotó el mismo
+        token, la restricción única de BlacklistedToken lo detecta.
+        """
+        jti = self.payload[jwt_settings.JTI_CLAIM]
+        exp = self.payload['exp']
+        usuario_id = self.payload.get(jwt_settings.USER_ID_CLAIM)
+        try:
+            with transaction.atomic():
+                if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                    anterior, _ = OutstandingToken.objects.get_or_create(
+                        jti=jti,
+                        defaults={
+                            'user_id': usuario_id,
+                            'token': str(self),
+                            'created_at': datetime_from_epoch(self.payload['iat']),
+                            'expires_at': datetime_from_epoch(exp),
+                        },
+                    )
+                    BlacklistedToken.objects.create(token=anterior)
+                    transaction.on_commit(lambda: lista_negra.agregar(jti, exp))
+
+                self.set_jti()
+                self.set_exp()
+                self.set_iat()
+                OutstandingToken.objects.create(
+                    user_id=usuario_id,
+                    jti=self.payload[jwt_settings.JTI_CLAIM],
+                    token=str(self),
+                    created_at=self.current_time,
+                    expires_at=datetime_from_epoch(self.payload['exp']),
+                )
+        except IntegrityError:
+            raise TokenError('El token ya fue utilizado')
+        return self
+
+
+def rol_del_usuario(usuario, token):
+    """
+    Rol vigente: el TipoUsuario si la fila del usuario ya se leyó con él
+    (JWTUsuarioAuthentication); si no, el claim del token, que la marca de
+    revocación invalida cuando el rol cambia. Para tokens emitidos antes de
+    incluir el claim (o sin JWT), el TipoUsuario del usuario.
+    """
+    if isinstance(usuario, Usuario) and Usuario.id_tipo.is_cached(usuario):
+        return usuario.id_tipo.cve
+    rol = token.get(ROL_CLAIM) if hasattr(token, 'get') else None
+    if rol:
+        return rol
+    return usuario.id_tipo.cve
+
+
+def rol_del_request(request):
+    """Rol del usuario autenticado (ver rol_del_usuario)"""
+    return rol_del_usuario(request.user, getattr(request, 'auth', None))
@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     # Autenticación
     LoginView,
+    LoginMetricasView,
     LogoutView,
     RefreshTokenView,
     MeView,
@@ -15,6 +16,7 @@ from .views import (
     UsuarioListView,
     UsuarioDetailView,
 )
+from .async_views import login_async
 
 app_name = 'users'
 
@@ -23,6 +25,8 @@ urlpatterns = [
     # AUTENTICACIÓN
     # ==========================================
     path('auth/login/', LoginView.as_view(), name='login'),
+    path('auth/login/async/', login_async, name='login-async'),
+    path('auth/login/metricas/', LoginMetricasView.as_view(), name='login-metricas'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('auth/refresh/', RefreshTokenView.as_view(), name='refresh'),
     path('auth/me/', MeView.as_view(), name='me'),
@@ -1,9 +1,11 @@
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import authenticate
+from users.hashing import ejecutor_hash
 from users.models import Usuario, TipoUsuario
 from .serializers import (
     UsuarioSerializer, UsuarioUpdateSerializer,
@@ -11,6 +13,7 @@ from .serializers import (
     CambiarPasswordSerializer, TokenSerializer
 )
 from .permissions import IsOwnerOrAdmin
+from .tokens import RefreshTokenConRol, ROL_CLAIM
 
 
 # ==========================================
@@ -32,7 +35,7 @@ class LoginView(APIView):
         password = serializer.validated_data['password']
         
         try:
-            user = Usuario.objects.get(email=email)
+            user = Usuario.objects.select_related('id_tipo').get(email=email)
             
             # ✅ Verificar password correctamente
             if not user.check_password(password):
@@ -48,8 +51,8 @@ class LoginView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
-            # Generar tokens JWT
-            refresh = RefreshToken.for_user(user)
+            # Generar tokens JWT (incluyen el rol del usuario)
+            refresh = RefreshTokenConRol.for_user(user)
             
             return Response({
                 'access': str(refresh.access_token),
@@ -64,6 +67,17 @@ class LoginView(APIView):
             )
 
 
+class LoginMetricasView(APIView):
+    """
+    GET /api/auth/login/metricas/
+    Latencia de verificación de hashes y profundidad de la cola del login async
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    def get(self, request):
+        return Response(ejecutor_hash.metricas())
+
+
 class LogoutView(APIView):
     """
     POST /api/auth/logout/
@@ -79,7 +93,7 @@ class LogoutView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            token = RefreshToken(refresh_token)
+            token = RefreshTokenConRol(refresh_token)
             token.blacklist()
             
             return Response(
@@ -97,6 +111,7 @@ class RefreshTokenView(APIView):
     """
     POST /api/auth/refresh/
     Body: {"refresh": "token"}
+    Respuesta: {"access": "...", "refresh": "..."} (el refresh usado queda revocado)
     """
     permission_classes = [AllowAny]
     
@@ -110,15 +125,37 @@ class RefreshTokenView(APIView):
             )
         
         try:
-            refresh = RefreshToken(refresh_token)
-            return Response({
-                'access': str(refresh.access_token)
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
+            refresh = RefreshTokenConRol(refresh_token)
+        except TokenError:
             return Response(
                 {'error': 'Token inválido o expirado'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
+        
+        # Una sola consulta: el usuario sigue activo y su rol vigente
+        rol = Usuario.objects.filter(
+            pk=refresh[jwt_settings.USER_ID_CLAIM], is_active=True
+        ).values_list('id_tipo__cve', flat=True).first()
+        if rol is None:
+            return Response(
+                {'error': 'Usuario inactivo'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        refresh[ROL_CLAIM] = rol
+        
+        data = {'access': str(refresh.access_token)}
+        
+        # Rotación: revocar el token usado y emitir uno nuevo en una transacción
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            try:
+                data['refresh'] = str(refresh.rotar())
+            except TokenError:
+                return Response(
+                    {'error': 'Token inválido o expirado'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+        
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class MeView(APIView):
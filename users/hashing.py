@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+
+
+class ColaLlena(Exception):
+    """No hay lugar en el ejecutor de hashes: la petición se rechaza"""
+
+
+class EjecutorHash:
+    """
+    Verificación de contraseñas en un pool de hilos dedicado y acotado.
+    Como máximo `capacidad` verificaciones pueden estar en curso o en espera;
+    por encima de eso se rechaza de inmediato en lugar de encolar, para que
+    un pico de logins no deje sin hilos al resto de la API.
+    """
+
+    def __init__(self, workers, capacidad, muestras=1000):
+        self.workers = workers
+        self.capacidad = capacidad
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='hash-login'
+        )
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._verificaciones = 0
+        self._rechazadas = 0
+        self._latencias = deque(maxlen=muestras)
+
+    async def verificar(self, password, encoded):
+        with self._lock:
+            if self._pendientes >= self.capacidad:
+                self._rechazadas += 1
+                raise ColaLlena()
+            self._pendientes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._verificar, password, encoded)
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def _verificar(self, password, encoded):
+        inicio = time.perf_counter()
+        # Sin setter: el rehash de contraseñas no se hace en este pool
+        valido = check_password(password, encoded)
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self._verificaciones += 1
+            self._latencias.append(duracion)
+        return valido
+
+    def metricas(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            pendientes = self._pendientes
+            verificaciones = self._verificaciones
+            rechazadas = self._rechazadas
+
+        def percentil(p):
+            if not latencias:
+                return None
+            indice = min(len(latencias) - 1, int(len(latencias) * p))
+            return round(latencias[indice] * 1000, 2)
+
+        return {
+            'workers': self.workers,
+            'capacidad': self.capacidad,
+            'en_curso': min(pendientes, self.workers),
+            'en_cola': max(pendientes - self.workers, 0),
+            'verificaciones': verificaciones,
+            'rechazadas': rechazadas,
+            'latencia_ms': {
+                'p50': percentil(0.50),
+                'p95': percentil(0.95),
+                'max': percentil(1.0),
+            },
+        }
+
+
+ejecutor_hash = EjecutorHash(
+    workers=getattr(settings, 'LOGIN_HASH_WORKERS', 4),
+    capacidad=getattr(settings, 'LOGIN_HASH_CAPACIDAD', 32),
+)
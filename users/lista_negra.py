@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class ListaNegraLocal:
+    """
+    Cache en memoria del proceso con los jti de refresh tokens ya
+    revocados. Cada entrada vence junto con el token (claim exp), así que
+    nunca responde por un token que ya expiró por sí mismo.
+    Solo guarda positivos: un jti ausente se sigue verificando en la
+    base de datos.
+    """
+
+    def __init__(self, maximo=10000):
+        self.maximo = maximo
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def agregar(self, jti, exp):
+        with self._lock:
+            if len(self._entradas) >= self.maximo:
+                self._purgar_vencidos()
+                if len(self._entradas) >= self.maximo:
+                    # Descartar la entrada más antigua (orden de inserción)
+                    self._entradas.pop(next(iter(self._entradas)))
+            self._entradas[jti] = exp
+
+    def contiene(self, jti):
+        exp = self._entradas.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            with self._lock:
+                self._entradas.pop(jti, None)
+            return False
+        return True
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def _purgar_vencidos(self):
+        ahora = time.time()
+        for jti in [jti for jti, exp in self._entradas.items() if exp <= ahora]:
+            del self._entradas[jti]
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+lista_negra = ListaNegraLocal()
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken, BlacklistedToken
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina por lotes los tokens vencidos de token_blacklist '
+        '(outstanding y blacklisted) sin bloquear las tablas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Tokens eliminados por transacción (default: 1000)'
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0.0,
+            help='Segundos de espera entre lotes para ceder escrituras'
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        pausa = options['pausa']
+        limite = timezone.now()
+
+        total = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=limite)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            # Transacciones cortas: cada lote libera los bloqueos al terminar
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+            if pausa:
+                time.sleep(pausa)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} tokens vencidos eliminados'))
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
+from users.revocacion import revocar_tokens
+
 
 # ==========================================
 # PRIMERO: TipoUsuario (debe ir antes)
@@ -18,7 +20,21 @@ class TipoUsuario(models.Model):
 # SEGUNDO: UsuarioManager
 # ==========================================
 
-class UsuarioManager(BaseUserManager):
+class UsuarioQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() no envía post_save: las desactivaciones y los cambios de
+        # rol masivos también revocan los access tokens vigentes (ver
+        # users.signals)
+        if kwargs.get('is_active') is False or 'id_tipo' in kwargs or 'id_tipo_id' in kwargs:
+            ids = list(self.values_list('pk', flat=True))
+            actualizados = super().update(**kwargs)
+            if ids:
+                revocar_tokens(*ids)
+            return actualizados
+        return super().update(**kwargs)
+
+
+class UsuarioManager(BaseUserManager.from_queryset(UsuarioQuerySet)):
     def create_user(self, email, nombre, id_tipo, password=None, **extra_fields):
         if not email:
             raise ValueError('El email es obligatorio')
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Alias de cache donde se registran las revocaciones. En despliegues con
+# varios procesos debe apuntar a un backend compartido (Redis/Memcached).
+CACHE_ALIAS = getattr(settings, 'REVOCACION_CACHE', 'default')
+
+PREFIJO = 'revocacion:usuario:'
+
+# Backends que guardan la marca en la memoria del proceso: los demás
+# workers no la ven y un reinicio la pierde
+BACKENDS_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _duracion_access_token():
+    return int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+
+
+def compartida():
+    """
+    True si la marca de revocación la ven todos los procesos. Si no, no
+    basta para rechazar a un usuario desactivado y hay que consultar la
+    base de datos.
+    """
+    return settings.CACHES[CACHE_ALIAS]['BACKEND'] not in BACKENDS_LOCALES
+
+
+def revocar_tokens(*usuario_ids):
+    """
+    Invalida todos los access tokens de los usuarios emitidos hasta ahora.
+    La marca solo necesita vivir lo que dura un access token.
+    """
+    ahora = int(time.time())
+    caches[CACHE_ALIAS].set_many(
+        {f'{PREFIJO}{usuario_id}': ahora for usuario_id in usuario_ids},
+        timeout=_duracion_access_token()
+    )
+
+
+def token_revocado(usuario_id, token):
+    """Consulta local (sin base de datos) contra la marca de revocación"""
+    revocado_en = caches[CACHE_ALIAS].get(f'{PREFIJO}{usuario_id}')
+    if revocado_en is None:
+        return False
+    emitido_en = token.get('iat')
+    return emitido_en is None or emitido_en <= revocado_en
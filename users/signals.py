@@ -0,0 +1,27 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import Usuario
+from users.revocacion import revocar_tokens
+
+
+@receiver(pre_save, sender=Usuario)
+def recordar_rol_guardado(sender, instance, update_fields=None, **kwargs):
+    # El rol viaja firmado en el token: si cambia, los tokens emitidos con
+    # el anterior dejan de valer. Una lectura por pk, solo si se escribe id_tipo
+    instance._rol_cambiado = False
+    if instance._state.adding or (update_fields is not None and 'id_tipo' not in update_fields):
+        return
+    guardado = Usuario.objects.filter(pk=instance.pk).values_list('id_tipo', flat=True).first()
+    instance._rol_cambiado = guardado is not None and guardado != instance.id_tipo_id
+
+
+@receiver(post_save, sender=Usuario)
+def revocar_si_pierde_el_acceso(sender, instance, created, **kwargs):
+    if not created and (not instance.is_active or getattr(instance, '_rol_cambiado', False)):
+        revocar_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def revocar_al_eliminar(sender, instance, **kwargs):
+    revocar_tokens(instance.pk)
@@ -1,3 +1,305 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.test import TestCase
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken, BlacklistedToken
+)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from users.models import Usuario, TipoUsuario
+from users.api.authentication import JWTSinConsultaAuthentication, UsuarioToken
+from users.api.tokens import ROL_CLAIM, RefreshTokenConRol
+from users.hashing import ejecutor_hash
+from users.lista_negra import lista_negra
+
+
+# Usuarios por tipo: suficientes para varias páginas del listado
+USUARIOS_POR_TIPO = 20
+PAGE_SIZES = (5, 50)
+
+
+class PresupuestoUsuariosTests(APITestCase):
+    """
+    Máximo de consultas SQL declarado para cada ruta de users/api/urls.py
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        tipos = [
+            TipoUsuario.objects.create(cve=cve, descripcion=cve.title())
+            for cve in ('CLIENTE', 'ASISTENTE', 'TALLER')
+        ]
+        Usuario.objects.bulk_create([
+            Usuario(
+                email=f'usuario{tipo.pk}-{i}@test.com',
+                nombre=f'Usuario {i}',
+                id_tipo=tipo,
+                password='!',
+            )
+            for tipo in tipos for i in range(USUARIOS_POR_TIPO)
+        ])
+        cls.usuario = Usuario.objects.create_user(
+            'cliente@test.com', 'Cliente', tipos[0], 'password123'
+        )
+
+    def autenticar(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuario)}'
+        )
+
+    def medir(self, metodo, url, data=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = getattr(self.client, metodo)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content[:300])
+        return response, len(consultas)
+
+    def assertPresupuesto(self, metodo, url, maximo, data=None):
+        response, total = self.medir(metodo, url, data)
+        self.assertLessEqual(
+            total, maximo, f'{metodo.upper()} {url}: {total} consultas, presupuesto {maximo}'
+        )
+        return response
+
+    def test_autenticacion(self):
+        login = self.assertPresupuesto(
+            'post', '/api/auth/login/', 2,
+            {'email': 'cliente@test.com', 'password': 'password123'}
+        )
+        # Verificación, usuario/rol y rotación (savepoint + 3 escrituras)
+        self.assertPresupuesto('post', '/api/auth/refresh/', 7, {'refresh': login.data['refresh']})
+        self.autenticar()
+        self.assertPresupuesto('get', '/api/auth/me/', 2)
+        refresh = str(RefreshToken.for_user(self.usuario))
+        self.assertPresupuesto('post', '/api/auth/logout/', 8, {'refresh': refresh})
+
+    def test_perfil(self):
+        self.autenticar()
+        self.assertPresupuesto('get', '/api/usuarios/perfil/', 2)
+        # Más la lectura del rol guardado y la de los campos que otros detalles
+        # muestran, por si el cambio los incluye
+        self.assertPresupuesto('patch', '/api/usuarios/perfil/', 4, {'telefono': '5551234567'})
+        self.assertPresupuesto('patch', '/api/usuarios/perfil/password/', 1, {
+            'password_actual': 'password123',
+            'password_nuevo': 'password456',
+            'password_confirmacion': 'password456',
+        })
+
+    def test_catalogos(self):
+        self.autenticar()
+        self.assertPresupuesto('get', '/api/tipos-usuarios/', 3)
+        self.assertPresupuesto('get', f'/api/usuarios/{self.usuario.pk}/', 2)
+
+        totales = []
+        for page_size in PAGE_SIZES:
+            with mock.patch.object(PageNumberPagination, 'page_size', page_size):
+                _, total = self.medir('get', '/api/usuarios/')
+            totales.append(total)
+        self.assertLessEqual(max(totales), 3)
+        self.assertEqual(len(set(totales)), 1, f'/api/usuarios/: {totales}')
+
+    def test_rol_en_tokens(self):
+        login = self.client.post(
+            '/api/auth/login/',
+            {'email': 'cliente@test.com', 'password': 'password123'},
+            format='json'
+        )
+        self.assertEqual(AccessToken(login.data['access'])[ROL_CLAIM], 'CLIENTE')
+
+        refresco = self.client.post(
+            '/api/auth/refresh/', {'refresh': login.data['refresh']}, format='json'
+        )
+        self.assertEqual(AccessToken(refresco.data['access'])[ROL_CLAIM], 'CLIENTE')
+
+        # Un refresh token emitido sin el claim también obtiene el rol
+        anterior = str(RefreshToken.for_user(self.usuario))
+        refresco = self.client.post('/api/auth/refresh/', {'refresh': anterior}, format='json')
+        self.assertEqual(AccessToken(refresco.data['access'])[ROL_CLAIM], 'CLIENTE')
+
+
+class AutenticacionSinConsultaTests(APITestCase):
+    """
+    JWTSinConsultaAuthentication: usuario ligero con carga diferida
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoUsuario.objects.create(cve='CLIENTE', descripcion='Cliente')
+        cls.usuario = Usuario.objects.create_user(
+            'cliente@test.com', 'Cliente', tipo, 'password123'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.token = AccessToken.for_user(self.usuario)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def autenticar(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return JWTSinConsultaAuthentication().authenticate(request)[0]
+
+    def test_actualizar_perfil(self):
+        response = self.client.patch(
+            '/api/usuarios/perfil/', {'telefono': '5550000000'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.telefono, '5550000000')
+
+    def test_usuario_desactivado_no_autentica(self):
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+    def test_usuario_ligero_con_cache_compartida(self):
+        with mock.patch('users.api.authentication.compartida', return_value=True):
+            with self.assertNumQueries(0):
+                usuario = self.autenticar()
+            self.assertIsInstance(usuario, UsuarioToken)
+            self.assertEqual(usuario.pk, self.usuario.pk)
+            with self.assertNumQueries(1):
+                self.assertEqual(usuario.nombre, 'Cliente')
+                self.assertEqual(usuario.email, 'cliente@test.com')
+
+            # update() no envía post_save pero también revoca
+            Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+            with self.assertRaises(AuthenticationFailed):
+                self.autenticar()
+
+    def test_cache_local_consulta_el_usuario(self):
+        # Con una cache por proceso la marca no llega a los demás workers:
+        # se comprueba is_active en la base de datos
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=True)
+        with self.assertNumQueries(1):
+            usuario = self.autenticar()
+        self.assertIsInstance(usuario, Usuario)
+        self.assertEqual(self.client.get('/api/cliente/reservaciones/').status_code, 200)
+
+    def test_cambio_de_rol_invalida_el_claim(self):
+        token = RefreshTokenConRol.for_user(self.usuario).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/cliente/reservaciones/').status_code, 200)
+        self.usuario.id_tipo = TipoUsuario.objects.create(cve='ASISTENTE', descripcion='Asistente')
+        self.usuario.save()
+
+        # Con la fila leída manda el rol vigente, no el del token
+        self.assertEqual(self.client.get('/api/cliente/reservaciones/').status_code, 403)
+        # Sin leerla, el token con el rol anterior quedó revocado
+        with mock.patch('users.api.authentication.compartida', return_value=True):
+            self.assertEqual(self.client.get('/api/cliente/reservaciones/').status_code, 401)
+
+
+class RotacionTokensTests(APITestCase):
+    """
+    Rotación de refresh tokens, lista negra local y purga por lotes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoUsuario.objects.create(cve='TALLER', descripcion='Taller')
+        cls.usuario = Usuario.objects.create_user(
+            'tecnico@test.com', 'Técnico', tipo, 'password123'
+        )
+
+    def setUp(self):
+        lista_negra.limpiar()
+
+    def refrescar(self, refresh):
+        return self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+
+    def test_rotacion_revoca_el_token_usado(self):
+        login = self.client.post(
+            '/api/auth/login/',
+            {'email': 'tecnico@test.com', 'password': 'password123'},
+            format='json'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            rotado = self.refrescar(login.data['refresh'])
+        self.assertEqual(rotado.status_code, 200)
+        self.assertNotEqual(rotado.data['refresh'], login.data['refresh'])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+        # Reutilizar el token anterior: rechazado desde la lista negra local
+        self.assertEqual(len(lista_negra), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refrescar(login.data['refresh']).status_code, 401)
+
+        # El token nuevo sigue siendo válido
+        self.assertEqual(self.refrescar(rotado.data['refresh']).status_code, 200)
+
+    def test_usuario_inactivo_no_refresca(self):
+        refresh = str(RefreshToken.for_user(self.usuario))
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertEqual(self.refrescar(refresh).status_code, 401)
+
+    def test_purgar_tokens_vencidos(self):
+        vencido = timezone.now() - timedelta(days=1)
+        vigente = timezone.now() + timedelta(days=1)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                user=self.usuario, jti=f'jti-{i}', token='t',
+                expires_at=vencido if i % 2 else vigente
+            )
+            for i in range(10)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=t) for t in tokens[:4]])
+
+        call_command('purgar_tokens', lote=2, stdout=StringIO())
+
+        self.assertEqual(OutstandingToken.objects.count(), 5)
+        self.assertFalse(OutstandingToken.objects.filter(expires_at__lte=timezone.now()).exists())
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+
+class LoginAsyncTests(TestCase):
+    """
+    /api/auth/login/async/ con el pool acotado de verificación de hashes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoUsuario.objects.create(cve='TALLER', descripcion='Taller')
+        cls.usuario = Usuario.objects.create_user(
+            'tecnico@test.com', 'Técnico', tipo, 'password123'
+        )
+
+    async def login(self, password):
+        return await self.async_client.post(
+            '/api/auth/login/async/',
+            {'email': 'tecnico@test.com', 'password': password},
+            content_type='application/json'
+        )
+
+    async def test_login_correcto(self):
+        response = await self.login('password123')
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(AccessToken(datos['access'])[ROL_CLAIM], 'TALLER')
+        self.assertEqual(datos['user']['email'], 'tecnico@test.com')
+
+    async def test_password_incorrecto(self):
+        response = await self.login('incorrecto')
+        self.assertEqual(response.status_code, 401)
 
-# Create your tests here.
+    async def test_cola_llena_responde_503(self):
+        rechazadas = ejecutor_hash.metricas()['rechazadas']
+        with mock.patch.object(ejecutor_hash, 'capacidad', 0):
+            response = await self.login('password123')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(ejecutor_hash.metricas()['rechazadas'], rechazadas + 1)